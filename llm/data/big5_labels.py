@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Big5 리포트/답변 파서
+ChatML 항목에서 사용자 답변, 특성 수준, 페르소나 이름 추출
+"""
+
+import re
+from typing import Dict, Optional
+
+BIG5_TRAITS = ["openness", "conscientiousness", "extraversion", "agreeableness", "neuroticism"]
+
+# 골든 리포트에 등장하는 수준 표기 (높은 순)
+TRAIT_LEVELS = ["매우 높음", "높음", "중간-높음", "중간", "중간-낮음", "낮음", "매우 낮음"]
+
+# 같은 의미의 다른 표기
+LEVEL_ALIASES = {
+    "낮음-중간": "중간-낮음",
+    "높음-중간": "중간-높음",
+}
+
+UNLABELED = "미분류"
+
+# 답변 속 빈도/강도 표현 → TRAIT_LEVELS 순위 (0 = 매우 높음)
+LEVEL_CUES = {
+    "매우": 1, "항상": 1, "철저하게": 1, "잦은": 1,
+    "대부분": 2,
+    "적당히": 3, "어느 정도": 3, "보통": 3, "보통인": 3,
+    "조금": 4, "가끔": 4,
+    "드물게": 5, "드문": 5,
+}
+
+USER_ANSWER_PATTERN = re.compile(r"^\s*\d+\.\s*(\w+)\s*:\s*'(.*)'\s*$", re.M)
+TRAIT_HEADER_PATTERN = re.compile(r"^###\s*(.+?)\s*\((\w+)\)\s*:\s*(.+?)\s*$", re.M)
+PERSONA_PATTERN = re.compile(r"당신은[^\n']*'([^'\n]+)'")
+SCENARIO_TYPE_PATTERN = re.compile(r"당신은 (\S+) 유형의 성격")
+LEVEL_CUE_PATTERN = re.compile(r"(?<!\S)(" + "|".join(sorted(LEVEL_CUES, key=len, reverse=True)) + r")(?!\S)")
+
+
+def normalize_level(text: str) -> Optional[str]:
+    """수준 표기를 표준 수준으로 정규화 (알 수 없으면 None)"""
+    level = re.sub(r"\s*\(.*?\)\s*", "", text).strip()
+    level = LEVEL_ALIASES.get(level, level)
+    return level if level in TRAIT_LEVELS else None
+
+
+def infer_level(answer: str) -> Optional[str]:
+    """답변의 빈도/강도 표현 평균으로 수준 추정 (표현이 없으면 None)
+
+    답변이 묘사하는 행동의 방향(극성)은 보지 않으므로 골든 라벨과 자주 어긋난다.
+    학습 리포트에는 쓰지 말고 카탈로그 조회에서 명시적으로 요청할 때만 사용.
+    """
+    ranks = [LEVEL_CUES[cue] for cue in LEVEL_CUE_PATTERN.findall(answer)]
+    if not ranks:
+        return None
+    return TRAIT_LEVELS[int(sum(ranks) / len(ranks) + 0.5)]
+
+
+def parse_user_answers(user_content: str) -> Dict[str, str]:
+    """'1. Openness: '...'' 형식의 사용자 입력을 특성별 답변으로 변환"""
+    answers = {}
+    for match in USER_ANSWER_PATTERN.finditer(user_content):
+        trait = match.group(1).lower()
+        if trait in BIG5_TRAITS:
+            answers[trait] = match.group(2)
+    return answers
+
+
+def parse_trait_levels(report: str) -> Dict[str, Optional[str]]:
+    """'### 개방성 (Openness): 매우 높음' 헤더에서 특성별 수준 추출"""
+    levels = {}
+    for match in TRAIT_HEADER_PATTERN.finditer(report):
+        trait = match.group(2).lower()
+        if trait in BIG5_TRAITS:
+            levels[trait] = normalize_level(match.group(3))
+    return levels
+
+
+def parse_persona(report: str) -> Optional[str]:
+    """종합 의견의 "당신은 '...'입니다"에서 페르소나 이름 추출"""
+    match = PERSONA_PATTERN.search(report)
+    return match.group(1) if match else None
+
+
+def parse_scenario_type(report: str) -> Optional[str]:
+    """종합 의견의 "당신은 ... 유형의 성격"에서 시나리오 유형 추출"""
+    match = SCENARIO_TYPE_PATTERN.search(report)
+    return match.group(1) if match else None
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Big5 데이터셋 증분 빌드 파이프라인
+단계별 소스 모듈 해시, 입력 체크섬, 시나리오 수, 출력 체크섬을 매니페스트에 기록하고
+입력이 바뀐 단계만 다시 실행 (llm/data 생성기용 make)
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import List, Dict, Any, Callable, Iterable, Optional
+
+from jsonl_io import file_checksum, iter_jsonl_files, save_with_stats
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUILD_DIR = os.path.join(DATA_DIR, "build")
+MANIFEST_NAME = "manifest.json"
+DATASET_NAME = "big5_psychology"
+
+
+class Stage:
+    """빌드 단계 하나
+
+    sources: 결과에 영향을 주는 소스 모듈 파일 (llm/data 기준 상대 경로)
+    inputs: 선행 단계 이름 또는 정적 입력 파일 (llm/data 기준 상대 경로)
+    build: 입력 파일 경로 목록을 받아 ChatML 항목을 반환하는 함수
+    """
+
+    def __init__(self, name: str, output: str, sources: List[str], build: Callable[[List[str]], Iterable[Dict[str, Any]]],
+                 inputs: Optional[List[str]] = None):
+        self.name = name
+        self.output = output
+        self.sources = sources
+        self.build = build
+        self.inputs = inputs or []
+
+
+def _build_complete_100(_: List[str]) -> Iterable[Dict[str, Any]]:
+    from complete_100_datasets import create_complete_100_datasets
+    return create_complete_100_datasets()
+
+
+def _build_final_100(_: List[str]) -> Iterable[Dict[str, Any]]:
+    from final_100_datasets import generate_remaining_scenarios, generate_reports
+    return generate_reports(generate_remaining_scenarios())
+
+
+def _build_merged(input_files: List[str]) -> Iterable[Dict[str, Any]]:
+    # eval_suite가 평가하는 held-out 항목은 학습 데이터셋에서 제외
+    from heldout import exclude_heldout
+    return exclude_heldout(iter_jsonl_files(input_files))
+
+
+STAGES = [
+    Stage("complete_100", "big5_complete_100.jsonl",
+          sources=["complete_100_datasets.py"], build=_build_complete_100),
+    Stage("final_100", "big5_final_100.jsonl",
+          sources=["final_100_datasets.py", "big5_labels.py"], build=_build_final_100),
+    Stage("merged", "big5_psychology.jsonl",
+          sources=["jsonl_io.py", "heldout.py"], build=_build_merged,
+          inputs=["big5_dataset_100.jsonl", "complete_100", "final_100"]),
+]
+
+
+class BuildPipeline:
+    """매니페스트 기반 증분 빌드"""
+
+    def __init__(self, stages: List[Stage] = STAGES, build_dir: str = DEFAULT_BUILD_DIR):
+        self.stages = {stage.name: stage for stage in stages}
+        self.order = [stage.name for stage in stages]
+        self.build_dir = build_dir
+        self.manifest_path = os.path.join(build_dir, MANIFEST_NAME)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {"stages": {}}
+
+    def _save_manifest(self) -> None:
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write('\n')
+
+    def output_path(self, stage_name: str) -> str:
+        return os.path.join(self.build_dir, self.stages[stage_name].output)
+
+    def _input_path(self, name: str) -> str:
+        if name in self.stages:
+            return self.output_path(name)
+        return os.path.join(DATA_DIR, name)
+
+    def fingerprint(self, stage: Stage) -> Dict[str, Any]:
+        """단계 입력 지문 (소스 모듈 해시 + 입력 체크섬)"""
+        return {
+            "sources": {source: file_checksum(os.path.join(DATA_DIR, source)) for source in stage.sources},
+            "inputs": {name: file_checksum(self._input_path(name)) for name in stage.inputs},
+        }
+
+    def is_stale(self, stage: Stage, fingerprint: Dict[str, Any]) -> bool:
+        """입력이 바뀌었거나 출력이 없거나 변조된 경우 재실행 필요"""
+        record = self.manifest["stages"].get(stage.name)
+        output = self.output_path(stage.name)
+        if record is None or not os.path.exists(output):
+            return True
+        if record["sources"] != fingerprint["sources"] or record["inputs"] != fingerprint["inputs"]:
+            return True
+        return record["output_checksum"] != file_checksum(output)
+
+    def run(self, force: bool = False) -> Dict[str, Any]:
+        """모든 단계를 순서대로 확인하고 필요한 단계만 실행"""
+
+        os.makedirs(self.build_dir, exist_ok=True)
+
+        for name in self.order:
+            stage = self.stages[name]
+            fingerprint = self.fingerprint(stage)
+
+            if not force and not self.is_stale(stage, fingerprint):
+                record = self.manifest["stages"][name]
+                print(f"⏭️  {name}: 최신 상태 ({record['scenario_count']}개 항목)")
+                continue
+
+            print(f"🔨 {name}: 빌드 중...")
+            start_time = time.time()
+            input_files = [self._input_path(input_name) for input_name in stage.inputs]
+            output = self.output_path(name)
+            stats = save_with_stats(output, stage.build(input_files))
+
+            self.manifest["stages"][name] = {
+                "sources": fingerprint["sources"],
+                "inputs": fingerprint["inputs"],
+                "output": stage.output,
+                "scenario_count": stats.total_items,
+                "output_checksum": file_checksum(output),
+            }
+            self._save_manifest()
+            print(f"✅ {name}: {stats.total_items}개 항목 ({time.time() - start_time:.2f}초)")
+
+        return self.manifest
+
+    def write_dataset_info(self, stage_name: str = "merged", dataset_name: str = DATASET_NAME) -> str:
+        """LLaMA-Factory dataset_info.json 항목 작성 (실행 시각과 무관한 고정 내용)"""
+
+        info_path = os.path.join(self.build_dir, "dataset_info.json")
+        dataset_info = {
+            dataset_name: {
+                "file_name": self.stages[stage_name].output,
+                "formatting": "sharegpt",
+                "columns": {
+                    "messages": "messages"
+                },
+                "tags": {
+                    "role_tag": "role",
+                    "content_tag": "content",
+                    "user_tag": "user",
+                    "assistant_tag": "assistant",
+                    "system_tag": "system"
+                }
+            }
+        }
+        with open(info_path, 'w', encoding='utf-8') as f:
+            json.dump(dataset_info, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        return info_path
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="Big5 데이터셋 증분 빌드")
+    parser.add_argument("--build-dir", default=DEFAULT_BUILD_DIR)
+    parser.add_argument("--force", action="store_true", help="모든 단계 강제 재실행")
+    args = parser.parse_args()
+
+    print("🚀 Big5 데이터셋 빌드 시작...")
+
+    pipeline = BuildPipeline(build_dir=args.build_dir)
+    manifest = pipeline.run(force=args.force)
+    info_path = pipeline.write_dataset_info()
+
+    merged = manifest["stages"]["merged"]
+    print(f"\n📁 최종 데이터셋: {pipeline.output_path('merged')}")
+    print(f"📊 최종 데이터셋 크기: {merged['scenario_count']}개 항목")
+    print(f"🔐 체크섬: {merged['output_checksum'][:16]}...")
+    print(f"📋 dataset_info: {info_path}")
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,10 @@ Big5 100개 완전 데이터셋 생성기
 다양한 직업군, 인생 전환기, 연령대를 포함한 시나리오 생성
 """
 
-import json
 import datetime
 
+from jsonl_io import save_with_stats
+
 def create_complete_100_datasets():
     """100개 완전 데이터셋 생성"""
 
@@ -340,19 +341,13 @@ def main():
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"/Volumes/eungu/projects/haru-on/llm/data/big5_complete_100_{timestamp}.jsonl"
 
-    with open(filename, 'w', encoding='utf-8') as f:
-        for item in dataset:
-            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+    stats = save_with_stats(filename, dataset)
 
     print(f"✅ 데이터셋 생성 완료: {filename}")
-    print(f"📊 총 데이터셋 크기: {len(dataset)}개 항목")
+    print(f"📊 총 데이터셋 크기: {stats.total_items}개 항목")
 
     # 데이터셋 분석
-    total_chars = sum(len(item["messages"][2]["content"]) for item in dataset)
-    avg_chars = total_chars / len(dataset)
-
-    print(f"📏 평균 리포트 길이: {avg_chars:.0f}자")
-    print(f"📝 전체 텍스트 크기: {total_chars:,}자")
+    stats.print_summary()
 
     print("\n🎯 데이터셋 특징:")
     print("✅ 다양한 직업군 (의사, 교사, 예술가, 개발자, 마케터 등)")
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Big5 균형 커리큘럼 샘플러
+라벨 카탈로그의 특성 수준 조합(high/mid/low × 5, 리포트 헤더에서 읽은 라벨만)별 층으로 나눠
+에폭마다 모든 항목을 한 번씩 넣고, 남는 에폭 자리(--oversample)는 드문 조합 층에 더 배정
+층 안에서는 시나리오 유형을 번갈아, 에폭 안에서는 층을 고르게 섞어 배치
+선택적으로 토큰 길이 커리큘럼(초반 에폭은 짧은 샘플이 앞쪽) 적용 후 학습용 JSONL + 색인 저장
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+from collections import Counter
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from big5_labels import BIG5_TRAITS
+from dedup_index import record_text
+from heldout import is_heldout
+from jsonl_io import JsonlWriter
+from label_catalog import DEFAULT_CATALOG, LEVEL_GROUPS, LabelCatalog
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT_DIR = os.path.join(DATA_DIR, "build", "curriculum")
+DATASET_NAME = "big5_psychology_curriculum"
+EPOCHS = 5  # qwen2_big5_qlora.yaml num_train_epochs
+OVERSAMPLE = 0.5  # 에폭마다 전체 항목 수의 이 비율만큼 드문 층에 추가 배정
+MAX_REPEATS = 3  # 한 에폭에서 같은 항목을 넣는 최대 횟수 (작은 층 과적합 방지)
+TARGET_EXPOSURES = 5  # 층마다 학습 전체에서 보고 싶은 최소 횟수
+UNLABELED_STRATUM = "unlabeled"
+
+GROUP_CODES = {"high": "H", "mid": "M", "low": "L"}
+LEVEL_CODES = {level: GROUP_CODES[group] for group, levels in LEVEL_GROUPS.items() for level in levels}
+
+
+def combination_key(levels: Dict[str, str]) -> str:
+    """특성 수준 → 5글자 조합 키 (O C E A N 순), 라벨 없는 특성이 하나라도 있으면 UNLABELED_STRATUM"""
+    codes = [LEVEL_CODES.get(levels.get(trait)) for trait in BIG5_TRAITS]
+    return UNLABELED_STRATUM if None in codes else "".join(codes)
+
+
+def scenario_key(row: Dict[str, Any]) -> str:
+    return row.get("scenario_type") or row.get("persona") or "-"
+
+
+def stratum_extras(counts: Dict[str, int], extra: int, max_repeats: int = MAX_REPEATS) -> Dict[str, int]:
+    """추가 자리 최대 extra개를 라벨 있는 층 중 작은 층부터 채우기 (water-filling)
+
+    층별 (개수 + 추가)가 가능한 한 같은 수준이 되도록 하고, 남는 자리는 가장 작은 층부터 하나씩.
+    층마다 추가분은 (max_repeats - 1) × 개수까지라 자리가 남을 수 있다.
+    UNLABELED_STRATUM은 추가 배정하지 않는다.
+    """
+    keys = sorted((key for key in counts if key != UNLABELED_STRATUM), key=lambda key: (counts[key], key))
+    caps = {key: (max_repeats - 1) * counts[key] for key in keys}
+    extras = {key: 0 for key in counts}
+    if extra <= 0 or not keys:
+        return extras
+
+    def fill(level: int) -> int:
+        return sum(min(caps[key], max(0, level - counts[key])) for key in keys)
+
+    level, top = counts[keys[0]], max(counts[key] + caps[key] for key in keys)
+    while level < top and fill(level + 1) <= extra:
+        level += 1
+    for key in keys:
+        extras[key] = min(caps[key], max(0, level - counts[key]))
+    leftover = extra - sum(extras.values())
+    for key in keys:
+        if leftover <= 0:
+            break
+        if extras[key] < caps[key]:
+            extras[key] += 1
+            leftover -= 1
+    return extras
+
+
+def interleave_scenarios(indices: List[int], rows: List[Dict[str, Any]], rng: np.random.Generator) -> List[int]:
+    """층 안 순서: 시나리오 유형별로 섞은 뒤 유형을 돌아가며 하나씩"""
+    by_type: Dict[str, List[int]] = {}
+    for index in indices:
+        by_type.setdefault(scenario_key(rows[index]), []).append(index)
+    queues = [list(rng.permutation(group)) for group in by_type.values()]
+    rng.shuffle(queues)
+    order = []
+    while queues:
+        order.extend(int(queue.pop(0)) for queue in queues)
+        queues = [queue for queue in queues if queue]
+    return order
+
+
+def competence(epoch: int, epochs: int, start: float) -> float:
+    """길이 커리큘럼 진행도 (제곱근 일정, 전체 에폭의 절반에서 1.0)"""
+    ramp = max(1, epochs // 2)
+    return min(1.0, math.sqrt(start ** 2 + (1 - start ** 2) * epoch / ramp))
+
+
+class CurriculumSampler:
+    """층화 에폭 순서 생성
+
+    rows: 카탈로그 조회 결과 (levels, scenario_type, persona)
+    lengths: 샘플별 길이 (길이 커리큘럼용, 없으면 커리큘럼 없음)
+    epoch_size: 에폭당 샘플 수 상한 (항목 수 이상, 기본은 항목 수 × (1 + OVERSAMPLE)) —
+                max_repeats 때문에 다 못 채우면 실제 에폭은 더 짧다
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]], lengths: Optional[np.ndarray] = None,
+                 epoch_size: Optional[int] = None, seed: int = 42,
+                 curriculum_start: Optional[float] = None, oversample: float = OVERSAMPLE,
+                 max_repeats: int = MAX_REPEATS):
+        self.rows = rows
+        self.lengths = lengths
+        epoch_size = max(len(rows), epoch_size or int(round(len(rows) * (1 + oversample))))
+        self.seed = seed
+        self.curriculum_start = curriculum_start
+
+        self.strata: Dict[str, List[int]] = {}
+        for index, row in enumerate(rows):
+            self.strata.setdefault(combination_key(row["levels"]), []).append(index)
+        self.counts = {key: len(indices) for key, indices in sorted(self.strata.items())}
+        self.extras = stratum_extras(self.counts, epoch_size - len(rows), max_repeats)
+        self.quotas = {key: self.counts[key] + self.extras[key] for key in self.counts}
+        self.epoch_size = sum(self.quotas.values())
+
+        # 길이 백분위 (0 = 가장 짧음)
+        if lengths is not None:
+            ranks = np.argsort(np.argsort(lengths, kind="stable"), kind="stable")
+            self.percentiles = (ranks + 1) / len(ranks)
+        else:
+            self.percentiles = None
+
+    def epoch(self, epoch: int, epochs: int = EPOCHS) -> List[int]:
+        """에폭 하나의 샘플 순서 — 모든 항목 1회 + 드문 층 추가분 (같은 seed/epoch면 항상 같음)"""
+        rng = np.random.default_rng([self.seed, epoch])
+        weight = 1.0
+        if self.percentiles is not None and self.curriculum_start is not None:
+            weight = competence(epoch, epochs, self.curriculum_start)
+
+        slots = []
+        for key, indices in self.strata.items():
+            order = interleave_scenarios(indices, self.rows, rng)
+            picks = order + [order[j % len(order)] for j in range(self.extras[key])]
+            # 층마다 에폭 전체에 고르게 퍼지도록 (j + u) / quota 위치에 배치
+            offset = rng.random()
+            for j, index in enumerate(picks):
+                position = (j + offset) / len(picks)
+                if weight < 1.0:
+                    # 초반 에폭은 짧은 샘플이 앞쪽으로 (진행도 1.0이면 층화 위치만)
+                    position = weight * position + (1 - weight) * self.percentiles[index]
+                slots.append((position, rng.random(), index))
+        slots.sort()
+        return [index for _, _, index in slots]
+
+    def epochs(self, epochs: int = EPOCHS) -> List[List[int]]:
+        return [self.epoch(epoch, epochs) for epoch in range(epochs)]
+
+
+def coverage_report(counts: Dict[str, int], orderings: List[List[int]], rows: List[Dict[str, Any]],
+                    target: int = TARGET_EXPOSURES) -> Dict[str, Any]:
+    """원래 분포(에폭마다 전체 1회) 대비 라벨 있는 층별 노출 수, 목표 노출까지 필요한 에폭 수, 항목 커버리지"""
+    labeled = {key: count for key, count in counts.items() if key != UNLABELED_STRATUM}
+    sampled = Counter(combination_key(rows[index]["levels"]) for ordering in orderings for index in ordering)
+    per_epoch = {key: sampled[key] / len(orderings) for key in labeled}
+    unique_per_epoch = [len(set(ordering)) for ordering in orderings]
+    report = {
+        "items": len(rows),
+        "strata": len(labeled),
+        "unlabeled_items": counts.get(UNLABELED_STRATUM, 0),
+        "unique_items_covered": len({index for ordering in orderings for index in ordering}),
+        "min_unique_items_per_epoch": min(unique_per_epoch) if unique_per_epoch else 0,
+        "target_exposures": target,
+        "natural": labeled,
+        "balanced_per_epoch": {key: round(value, 2) for key, value in per_epoch.items()},
+    }
+    if labeled:
+        rarest = min(labeled, key=lambda key: (per_epoch[key], key))
+        report.update({
+            "rarest": rarest,
+            "natural_min_per_epoch": min(labeled.values()),
+            "balanced_min_per_epoch": min(per_epoch.values()),
+            "natural_epochs_to_target": math.ceil(target / min(labeled.values())),
+            "balanced_epochs_to_target": math.ceil(target / min(per_epoch.values())),
+        })
+    return report
+
+
+def sample_lengths(items: List[Dict[str, Any]], tokenizer_name: Optional[str] = None) -> np.ndarray:
+    """토크나이저가 있으면 ChatML 토큰 수, 없으면 문자 수"""
+    if tokenizer_name:
+        from transformers import AutoTokenizer
+        from token_cache import render_chatml
+
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_name, trust_remote_code=True)
+        return np.array([len(tokenizer(render_chatml(item["messages"]), add_special_tokens=False)["input_ids"])
+                         for item in items])
+    return np.array([sum(len(message["content"]) for message in item["messages"]) for item in items])
+
+
+def load_rows(catalog: LabelCatalog, files: List[str], dedup: bool = True) -> tuple:
+    """카탈로그 행 + 원본 항목 (held-out 항목 제외, dedup이면 사용자/어시스턴트 내용이 같은 항목은 처음 것만)"""
+    catalog.update(files, prune=False)
+    rows, items, seen = [], [], set()
+    all_rows = catalog.query(files=files)
+    for row, item in zip(all_rows, catalog.load(all_rows)):
+        if is_heldout(item):
+            continue
+        if dedup:
+            digest = hashlib.sha256(record_text(item).encode("utf-8")).hexdigest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+        rows.append(row)
+        items.append(item)
+    return rows, items
+
+
+def write_curriculum(sampler: CurriculumSampler, items: List[Dict[str, Any]], output_dir: str,
+                     epochs: int = EPOCHS, target: int = TARGET_EXPOSURES) -> Dict[str, Any]:
+    """에폭 순서를 이어 붙인 학습용 JSONL + 색인/리포트 + dataset_info.json 저장
+
+    학습 시에는 JSONL 한 번이 epochs 에폭에 해당하므로 num_train_epochs: 1, disable_shuffling: true
+    """
+    orderings = sampler.epochs(epochs)
+    os.makedirs(output_dir, exist_ok=True)
+    jsonl_path = os.path.join(output_dir, f"{DATASET_NAME}.jsonl")
+    with JsonlWriter(jsonl_path) as writer:
+        writer.write_many(items[index] for ordering in orderings for index in ordering)
+
+    report = coverage_report(sampler.counts, orderings, sampler.rows, target)
+    index = {
+        "jsonl": jsonl_path,
+        "epochs": epochs,
+        "epoch_size": sampler.epoch_size,
+        "seed": sampler.seed,
+        "curriculum_start": sampler.curriculum_start,
+        "quotas": sampler.quotas,
+        "extras": sampler.extras,
+        "records": [{"file": os.path.basename(row["file"]), "line": row["line"],
+                     "stratum": combination_key(row["levels"]), "scenario": scenario_key(row)}
+                    for row in sampler.rows],
+        "orderings": orderings,
+        "coverage": report,
+    }
+    with open(os.path.join(output_dir, "curriculum_index.json"), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+    dataset_info = {
+        DATASET_NAME: {
+            "file_name": os.path.basename(jsonl_path),
+            "formatting": "sharegpt",
+            "columns": {
+                "messages": "messages"
+            },
+            "tags": {
+                "role_tag": "role",
+                "content_tag": "content",
+                "user_tag": "user",
+                "assistant_tag": "assistant",
+                "system_tag": "system"
+            }
+        }
+    }
+    with open(os.path.join(output_dir, "dataset_info.json"), 'w', encoding='utf-8') as f:
+        json.dump(dataset_info, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    return index
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="Big5 균형 커리큘럼 샘플러")
+    parser.add_argument("files", nargs="*", help="학습 JSONL (기본: llm/data/*.jsonl)")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--oversample", type=float, default=OVERSAMPLE,
+                        help="에폭마다 전체 항목 수의 이 비율만큼 드문 조합 층에 추가 배정")
+    parser.add_argument("--epoch-size", type=int, default=None, help="에폭당 샘플 수 (--oversample 대신, 항목 수 이상)")
+    parser.add_argument("--max-repeats", type=int, default=MAX_REPEATS, help="한 에폭에서 같은 항목의 최대 횟수")
+    parser.add_argument("--curriculum", type=float, default=None, metavar="START",
+                        help="길이 커리큘럼: 첫 에폭은 길이 순서 비중 1-START, 전체 에폭 절반에서 층화 순서만")
+    parser.add_argument("--tokenizer", default=None, help="길이를 토큰 수로 (없으면 문자 수)")
+    parser.add_argument("--target-exposures", type=int, default=TARGET_EXPOSURES)
+    parser.add_argument("--no-dedup", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(DATA_DIR, "*.jsonl")))
+    print("🚀 Big5 균형 커리큘럼 샘플링 시작...")
+    with LabelCatalog(args.catalog) as catalog:
+        rows, items = load_rows(catalog, files, dedup=not args.no_dedup)
+    lengths = sample_lengths(items, args.tokenizer) if args.curriculum is not None else None
+
+    sampler = CurriculumSampler(rows, lengths, args.epoch_size, args.seed, args.curriculum, args.oversample,
+                                args.max_repeats)
+    index = write_curriculum(sampler, items, args.output_dir, args.epochs, args.target_exposures)
+    report = index["coverage"]
+
+    print(f"📊 샘플 {len(rows)}개 (라벨 없는 특성이 있는 항목 {report['unlabeled_items']}개는 한 층), "
+          f"특성 조합 층 {report['strata']}개, 에폭당 {sampler.epoch_size}개 × {args.epochs}에폭")
+    print(f"  항목 커버리지: 에폭마다 최소 {report['min_unique_items_per_epoch']}/{len(rows)}개, "
+          f"전체 {report['unique_items_covered']}/{len(rows)}개")
+    if "rarest" in report:
+        print(f"  가장 드문 층 {report['rarest']}: 에폭당 {report['natural_min_per_epoch']}회 → "
+              f"{report['balanced_min_per_epoch']:.1f}회")
+        print(f"  모든 층을 {args.target_exposures}회 보기까지: 원래 분포 {report['natural_epochs_to_target']}에폭 → "
+              f"균형 {report['balanced_epochs_to_target']}에폭")
+    print(f"📁 {index['jsonl']}")
+    print(f"📋 QLoRA 설정: dataset_dir: {args.output_dir} / dataset: {DATASET_NAME}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Big5 데이터셋 컬럼형 유효성 검증기
+항목을 배치 단위 NumPy 컬럼으로 적재한 뒤 검사를 벡터 연산으로 수행하고
+전체 오류 테이블을 CSV로 기록
+"""
+
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from jsonl_io import iter_jsonl_files, iter_line_batches, loads
+
+CUTOFF_LEN = 2048  # qwen2_big5_qlora.yaml cutoff_len
+DEFAULT_BATCH_SIZE = 65536
+
+EXPECTED_ROLES = ["system", "user", "assistant"]
+ROLE_CODES = {role: code for code, role in enumerate(EXPECTED_ROLES)}
+
+REQUIRED_SECTIONS = [
+    "### 개방성",
+    "### 성실성",
+    "### 외향성",
+    "### 우호성",
+    "### 신경성",
+    "## 종합 의견",
+]
+FORBIDDEN_PATTERNS = ["진단"]
+
+# Qwen ChatML 템플릿 토큰 (<|im_start|>role\n ... <|im_end|>\n × 3)
+CHATML_OVERHEAD_TOKENS = 15
+
+ERROR_COLUMNS = ["index", "check", "message", "detail"]
+
+
+def estimate_tokens(text: str) -> int:
+    """토크나이저 없이 쓰는 토큰 수 추정치 (한글/비ASCII 1자 ≈ 1토큰, ASCII 4자 ≈ 1토큰)"""
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return len(text) - ascii_chars + (ascii_chars + 3) // 4
+
+
+class ColumnBatch:
+    """검증용 컬럼 배치 (항목당 한 행)"""
+
+    def __init__(self, items: List[Dict[str, Any]], start_index: int,
+                 count_tokens: Callable[[List[str]], List[int]]):
+        size = len(items)
+        self.index = np.arange(start_index, start_index + size)
+        self.has_messages = np.zeros(size, dtype=bool)
+        self.message_count = np.zeros(size, dtype=np.int32)
+        self.roles = np.full((size, 3), -1, dtype=np.int8)
+        self.content_chars = np.zeros((size, 3), dtype=np.int32)  # 공백 제거 후 길이, 없으면 -1
+        self.sections = np.zeros((size, len(REQUIRED_SECTIONS)), dtype=bool)
+        self.forbidden = np.zeros((size, len(FORBIDDEN_PATTERNS)), dtype=bool)
+        self.raw_roles: List[Any] = [None] * size
+
+        texts = []
+        for row, item in enumerate(items):
+            messages = item.get("messages") if isinstance(item, dict) else None
+            if not isinstance(messages, list):
+                texts.append("")
+                continue
+            self.has_messages[row] = True
+            self.message_count[row] = len(messages)
+            self.raw_roles[row] = [msg.get("role") for msg in messages]
+
+            contents = []
+            for col, msg in enumerate(messages[:3]):
+                self.roles[row, col] = ROLE_CODES.get(msg.get("role"), -1)
+                content = msg.get("content")
+                if isinstance(content, str):
+                    self.content_chars[row, col] = len(content.strip())
+                    contents.append(content)
+                else:
+                    self.content_chars[row, col] = -1
+            texts.append("\n".join(contents))
+
+            if len(messages) >= 3 and isinstance(messages[2].get("content"), str):
+                report = messages[2]["content"]
+                self.sections[row] = [section in report for section in REQUIRED_SECTIONS]
+                self.forbidden[row] = [pattern in report for pattern in FORBIDDEN_PATTERNS]
+
+        self.tokens = np.asarray(count_tokens(texts), dtype=np.int32) + CHATML_OVERHEAD_TOKENS
+
+
+class DatasetValidator:
+    """배치 벡터화 검증기"""
+
+    def __init__(self, cutoff_len: int = CUTOFF_LEN, batch_size: int = DEFAULT_BATCH_SIZE,
+                 tokenizer: Optional[Any] = None):
+        self.cutoff_len = cutoff_len
+        self.batch_size = batch_size
+        self.total_items = 0
+        self.error_counts: Dict[str, int] = {}
+        self.invalid_items = 0
+        self.max_tokens = 0
+
+        if tokenizer is not None:
+            # HF fast 토크나이저 배치 인코딩 (정확한 토큰 수)
+            self.count_tokens = lambda texts: [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+        else:
+            self.count_tokens = lambda texts: [estimate_tokens(text) for text in texts]
+
+    def _check_batch(self, batch: ColumnBatch) -> Iterator[List[Any]]:
+        """배치 전체에 검사를 한 번에 적용하고 오류 행 반환"""
+
+        structural = batch.has_messages & (batch.message_count == 3)
+
+        # 구조 오류
+        for i in np.flatnonzero(~batch.has_messages):
+            yield [int(batch.index[i]), "structure", "", "'messages' 필드 없음"]
+        for i in np.flatnonzero(batch.has_messages & (batch.message_count != 3)):
+            yield [int(batch.index[i]), "message_count", "", f"메시지 수가 3개가 아님 ({batch.message_count[i]}개)"]
+
+        # 역할 순서
+        expected = np.arange(3, dtype=np.int8)
+        bad_roles = structural & np.any(batch.roles != expected, axis=1)
+        for i in np.flatnonzero(bad_roles):
+            yield [int(batch.index[i]), "role_order", "", f"역할 순서가 올바르지 않음 ({batch.raw_roles[i]})"]
+
+        # 내용 누락/빈 내용
+        rows, cols = np.nonzero(structural[:, None] & (batch.content_chars <= 0))
+        for i, j in zip(rows, cols):
+            detail = "'content' 필드 없음" if batch.content_chars[i, j] < 0 else "내용이 비어있음"
+            yield [int(batch.index[i]), "empty_content", int(j) + 1, detail]
+
+        # 토큰 길이 초과
+        for i in np.flatnonzero(batch.has_messages & (batch.tokens > self.cutoff_len)):
+            yield [int(batch.index[i]), "token_overflow", "", f"{batch.tokens[i]} > {self.cutoff_len}"]
+
+        # 필수 섹션 헤더
+        rows, cols = np.nonzero(structural[:, None] & ~batch.sections)
+        for i, j in zip(rows, cols):
+            yield [int(batch.index[i]), "missing_section", 3, REQUIRED_SECTIONS[j]]
+
+        # 금지 표현
+        rows, cols = np.nonzero(batch.forbidden)
+        for i, j in zip(rows, cols):
+            yield [int(batch.index[i]), "forbidden_wording", 3, FORBIDDEN_PATTERNS[j]]
+
+    def validate(self, items: Iterable[Dict[str, Any]]) -> Iterator[List[Any]]:
+        """항목을 배치로 묶어 검증하고 오류 행을 순서대로 반환"""
+
+        batch_items: List[Dict[str, Any]] = []
+        for item in items:
+            batch_items.append(item)
+            if len(batch_items) >= self.batch_size:
+                yield from self._validate_batch(batch_items)
+                batch_items = []
+        if batch_items:
+            yield from self._validate_batch(batch_items)
+
+    def _validate_batch(self, batch_items: List[Dict[str, Any]]) -> Iterator[List[Any]]:
+        batch = ColumnBatch(batch_items, self.total_items, self.count_tokens)
+        # 검사 종류별로 모인 행을 항목 순서로 정렬 (배치 크기와 무관한 출력)
+        rows = sorted(self._check_batch(batch), key=lambda row: row[0])
+        max_tokens = int(batch.tokens[batch.has_messages].max()) if batch.has_messages.any() else 0
+        self._merge(len(batch_items), max_tokens, rows)
+        yield from rows
+
+    def _merge(self, size: int, max_tokens: int, rows: List[List[Any]]) -> None:
+        """배치 결과를 전체 집계에 반영"""
+        self.total_items += size
+        self.max_tokens = max(self.max_tokens, max_tokens)
+        for row in rows:
+            self.error_counts[row[1]] = self.error_counts.get(row[1], 0) + 1
+        self.invalid_items += len({row[0] for row in rows})
+
+    def validate_files(self, filenames: List[str], workers: int = 1) -> Iterator[List[Any]]:
+        """파일을 검증 (workers > 1이면 배치를 프로세스 풀에서 파싱/검사, 결과 순서는 동일)"""
+
+        if workers <= 1:
+            yield from self.validate(iter_jsonl_files(filenames))
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = []
+            start_index = 0
+            for lines in iter_line_batches(filenames, self.batch_size):
+                pending.append(executor.submit(_validate_lines, lines, start_index, self.cutoff_len))
+                start_index += len(lines)
+                if len(pending) >= workers * 2:
+                    yield from self._merge_result(pending.pop(0).result())
+            for future in pending:
+                yield from self._merge_result(future.result())
+
+    def _merge_result(self, result: Tuple[int, int, List[List[Any]]]) -> Iterator[List[Any]]:
+        size, max_tokens, rows = result
+        self._merge(size, max_tokens, rows)
+        yield from rows
+
+    def print_summary(self) -> None:
+        """검사별 오류 집계 출력"""
+        print(f"📊 검증 항목: {self.total_items:,}개 (오류 항목 {self.invalid_items:,}개)")
+        print(f"🔤 최대 토큰 수: {self.max_tokens:,} (cutoff_len {self.cutoff_len})")
+        for check, count in sorted(self.error_counts.items()):
+            print(f"  - {check}: {count:,}건")
+
+
+def _validate_lines(lines: List[str], start_index: int, cutoff_len: int) -> Tuple[int, int, List[List[Any]]]:
+    """워커 프로세스: 원본 줄 배치를 파싱해 검증 (토큰 수는 추정치)"""
+    validator = DatasetValidator(cutoff_len=cutoff_len, batch_size=len(lines))
+    validator.total_items = start_index
+    rows = list(validator.validate(loads(line) for line in lines))
+    return len(lines), validator.max_tokens, rows
+
+
+def write_error_table(errors: Iterable[List[Any]], error_table: Optional[str] = None) -> None:
+    """오류 행을 CSV로 저장 (error_table이 None이면 소비만)"""
+
+    if error_table is None:
+        for _ in errors:
+            pass
+        return
+
+    with open(error_table, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(ERROR_COLUMNS)
+        writer.writerows(errors)
+
+
+def validate_to_table(items: Iterable[Dict[str, Any]], error_table: Optional[str] = None,
+                      validator: Optional[DatasetValidator] = None) -> DatasetValidator:
+    """항목을 검증하고 전체 오류 테이블을 CSV로 저장"""
+    validator = validator or DatasetValidator()
+    write_error_table(validator.validate(items), error_table)
+    return validator
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="Big5 데이터셋 컬럼형 유효성 검증")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--errors", default="validation_errors.csv", help="오류 테이블 CSV 경로")
+    parser.add_argument("--cutoff-len", type=int, default=CUTOFF_LEN)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--tokenizer", default=None, help="정확한 토큰 수 계산용 토크나이저 (예: Qwen/Qwen2-1.5B)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="토크나이저 미사용 시 병렬 워커 수")
+    args = parser.parse_args()
+
+    tokenizer = None
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer, trust_remote_code=True)
+
+    print("🔍 데이터셋 유효성 검증 중...")
+    start_time = time.time()
+
+    validator = DatasetValidator(cutoff_len=args.cutoff_len, batch_size=args.batch_size, tokenizer=tokenizer)
+    workers = 1 if tokenizer is not None else args.workers
+    write_error_table(validator.validate_files(args.files, workers), args.errors)
+
+    elapsed = time.time() - start_time
+    validator.print_summary()
+    print(f"⏱️  소요 시간: {elapsed:.2f}초 ({validator.total_items / elapsed if elapsed else 0:,.0f} records/sec)")
+    print(f"📁 오류 테이블: {args.errors}")
+
+    if validator.invalid_items:
+        print("❌ 데이터셋 유효성 검증 실패")
+    else:
+        print("✅ 데이터셋 유효성 검증 통과!")
+
+if __name__ == "__main__":
+    main()
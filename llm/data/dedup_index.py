@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Big5 데이터셋 중복 제거 색인
+정확 일치 해시 색인 + MinHash/LSH 유사 중복 색인 (SQLite 파일로 영속화)
+"""
+
+import hashlib
+import re
+import sqlite3
+import zlib
+from array import array
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set
+
+EXACT = "exact"
+NEAR = "near"
+UNIQUE = "unique"
+
+MAX_HASH = 0xFFFFFFFF
+
+
+def record_text(item: Dict[str, Any]) -> str:
+    """중복 판단 대상 텍스트 (공통 시스템 프롬프트 제외, 사용자 + 어시스턴트)"""
+    contents = [msg["content"] for msg in item["messages"] if msg["role"] in ("user", "assistant")]
+    return re.sub(r"\s+", " ", "\n".join(contents)).strip()
+
+
+def shingle_hashes(text: str, size: int) -> Set[int]:
+    """문자 n-gram 해시 집합 (한국어는 어절보다 문자 단위가 안정적)
+
+    UTF-32로 한 번만 인코딩해 n-gram마다 고정 폭 바이트 슬라이스를 CRC32로 해시한다.
+    """
+    data = text.encode("utf-32-le")
+    width = size * 4
+    if len(data) <= width:
+        return {zlib.crc32(data)}
+    return {zlib.crc32(data[i:i + width]) for i in range(0, len(data) - width + 4, 4)}
+
+
+def minhash_signature(text: str, num_perm: int, shingle_size: int) -> array:
+    """단일 해시 분할 MinHash (One Permutation Hashing) 시그니처
+
+    n-gram마다 해시를 한 번만 계산해 num_perm개 구간으로 나누고 구간별 최솟값을 취한다.
+    빈 구간은 오른쪽 이웃 구간 값으로 채운다 (densification).
+    """
+    bins = [MAX_HASH] * num_perm
+    for value in shingle_hashes(text, shingle_size):
+        index = value % num_perm
+        if value < bins[index]:
+            bins[index] = value
+
+    if MAX_HASH in bins and any(value != MAX_HASH for value in bins):
+        for i in range(num_perm):
+            if bins[i] == MAX_HASH:
+                offset = 1
+                while bins[(i + offset) % num_perm] == MAX_HASH:
+                    offset += 1
+                bins[i] = bins[(i + offset) % num_perm]
+    return array("I", bins)
+
+
+def estimate_similarity(a: array, b: array) -> float:
+    """두 시그니처의 자카드 유사도 추정치"""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+class DedupIndex:
+    """정확/유사 중복 색인
+
+    path를 지정하면 색인이 파일에 유지되므로 다음 병합에서는 새 항목만 확인하면 된다.
+    """
+
+    def __init__(self, path: str = ":memory:", num_perm: int = 128, bands: int = 16,
+                 threshold: float = 0.8, shingle_size: int = 5):
+        if num_perm % bands:
+            raise ValueError("num_perm은 bands로 나누어 떨어져야 합니다.")
+
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.stats = {"checked": 0, UNIQUE: 0, EXACT: 0, NEAR: 0}
+
+        self.conn = sqlite3.connect(path)
+        self._create_tables()
+        self.size = self.conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def _create_tables(self) -> None:
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS exact (hash TEXT PRIMARY KEY, record_id INTEGER);
+            CREATE TABLE IF NOT EXISTS signatures (record_id INTEGER PRIMARY KEY, source TEXT, signature BLOB);
+            CREATE TABLE IF NOT EXISTS bands (band INTEGER, bucket TEXT, record_id INTEGER);
+            CREATE INDEX IF NOT EXISTS bands_lookup ON bands (band, bucket);
+        """)
+
+        # 기존 색인과 파라미터가 다르면 LSH 버킷이 호환되지 않음
+        params = f"crc32-oph:{self.num_perm}:{self.bands}:{self.shingle_size}"
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'params'").fetchone()
+        if row is None:
+            self.conn.execute("INSERT INTO meta VALUES ('params', ?)", (params,))
+        elif row[0] != params:
+            raise ValueError(f"색인 파라미터 불일치: 파일 {row[0]} / 요청 {params}")
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _band_keys(self, signature: array) -> List[str]:
+        return [
+            hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8).hexdigest()
+            for band in range(self.bands)
+        ]
+
+    def check(self, item: Dict[str, Any], source: Optional[str] = None, add: bool = True) -> str:
+        """항목의 중복 상태 확인 (UNIQUE면 색인에 추가)"""
+
+        self.stats["checked"] += 1
+        text = record_text(item)
+
+        exact_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if self.conn.execute("SELECT 1 FROM exact WHERE hash = ?", (exact_hash,)).fetchone():
+            self.stats[EXACT] += 1
+            return EXACT
+
+        signature = minhash_signature(text, self.num_perm, self.shingle_size)
+        band_keys = self._band_keys(signature)
+
+        # 같은 LSH 버킷에 들어간 후보만 시그니처 비교 (전체 쌍 비교 없음)
+        candidates = set()
+        for band, bucket in enumerate(band_keys):
+            for (record_id,) in self.conn.execute(
+                    "SELECT record_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket)):
+                candidates.add(record_id)
+        candidates = list(candidates)
+        for start in range(0, len(candidates), 500):
+            chunk = candidates[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for (blob,) in self.conn.execute(
+                    f"SELECT signature FROM signatures WHERE record_id IN ({placeholders})", chunk):
+                if estimate_similarity(signature, array("I", blob)) >= self.threshold:
+                    self.stats[NEAR] += 1
+                    return NEAR
+
+        if add:
+            record_id = self.size
+            self.size += 1
+            self.conn.execute("INSERT INTO exact VALUES (?, ?)", (exact_hash, record_id))
+            self.conn.execute("INSERT INTO signatures VALUES (?, ?, ?)",
+                              (record_id, source, signature.tobytes()))
+            self.conn.executemany("INSERT INTO bands VALUES (?, ?, ?)",
+                                  [(band, bucket, record_id) for band, bucket in enumerate(band_keys)])
+        self.stats[UNIQUE] += 1
+        return UNIQUE
+
+    def filter(self, items: Iterable[Dict[str, Any]], source: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """중복이 아닌 항목만 통과"""
+        for item in items:
+            if self.check(item, source) == UNIQUE:
+                yield item
+
+    def print_stats(self) -> None:
+        """중복 제거 통계 출력"""
+        checked = self.stats["checked"]
+        removed = self.stats[EXACT] + self.stats[NEAR]
+        print("🧹 중복 제거 통계:")
+        print(f"  검사 항목: {checked}개")
+        print(f"  정확 중복: {self.stats[EXACT]}개")
+        print(f"  유사 중복 (유사도 ≥ {self.threshold}): {self.stats[NEAR]}개")
+        print(f"  통과 항목: {self.stats[UNIQUE]}개")
+        if checked:
+            print(f"  제거 비율: {removed / checked:.1%}")
+        print(f"  색인 크기: {len(self)}개 항목")
+
+    def close(self) -> None:
+        """색인 저장 후 닫기"""
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self) -> "DedupIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
@@ -4,9 +4,11 @@ Big5 100개 최종 데이터셋 생성기
 다양한 직업, 생활 상황, 인생 전환기를 포함한 총 100개 시나리오
 """
 
-import json
 import datetime
 
+from big5_labels import UNLABELED
+from jsonl_io import save_with_stats
+
 def generate_remaining_scenarios():
     """나머지 시나리오 생성 (총 100개 중 78개 추가)"""
 
@@ -300,52 +302,54 @@ def generate_remaining_scenarios():
 
     return all_scenarios
 
+SYSTEM_PROMPT = "당신은 Big5 심리학 모델을 기반으로 사용자의 답변을 분석하는 전문 심리 분석가입니다. 사용자의 5가지 답변을 바탕으로, 각 특성(개방성, 성실성, 외향성, 우호성, 신경성)을 분석하고 긍정적이며 통찰력 있는 종합 리포트를 작성해주세요. 절대 의학적 진단을 내리지 마세요."
+
+TRAIT_HEADERS = [
+    ("openness", "개방성 (Openness)"),
+    ("conscientiousness", "성실성 (Conscientiousness)"),
+    ("extraversion", "외향성 (Extraversion)"),
+    ("agreeableness", "우호성 (Agreeableness)"),
+    ("neuroticism", "신경성 (Neuroticism)"),
+]
+
+def build_report_item(scenario):
+    """시나리오 하나를 ChatML 항목으로 변환 (병렬 엔진과 공용)"""
+
+    answers = scenario["user_answers"]
+    trait_levels = scenario.get("trait_levels", {})
+
+    user_input = "\n".join([
+        f"{i+1}. {trait.title()}: '{answer}'"
+        for i, (trait, answer) in enumerate(answers.items())
+    ])
+
+    # 간단한 리포트 생성 (실제로는 LLM으로 생성)
+    sections = []
+    for trait, header in TRAIT_HEADERS:
+        answer = answers[trait]
+        level = trait_levels.get(trait)
+        if not level or level == UNLABELED:
+            # 라벨이 없으면 수준을 지어내지 않고 헤더만 (parse_trait_levels에서 라벨 없음으로 읽힘)
+            sections.append(f"### {header}\n{answer}")
+        else:
+            sections.append(f"### {header}: {level}\n{answer}")
+
+    golden_report = "## Big5 심리 분석 리포트\n\n당신의 답변을 바탕으로 분석한 성격 특성은 다음과 같습니다.\n\n"
+    golden_report += "\n\n".join(sections)
+    golden_report += f"\n\n## 종합 의견\n\n당신은 {scenario['type']} 유형의 성격을 가지고 있습니다. 각 특성들의 균형이 잘 잡혀 있으며, 긍정적인 태도와 성장 가능성을 보여줍니다. 자신의 강점을 잘 활용하고 발전시켜 나간다면 더욱 풍요로운 삶을 살아갈 수 있을 것입니다."
+
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_input},
+            {"role": "assistant", "content": golden_report}
+        ]
+    }
+
 def generate_reports(scenarios):
     """시나리오에 대한 리포트 생성"""
 
-    system_prompt = "당신은 Big5 심리학 모델을 기반으로 사용자의 답변을 분석하는 전문 심리 분석가입니다. 사용자의 5가지 답변을 바탕으로, 각 특성(개방성, 성실성, 외향성, 우호성, 신경성)을 분석하고 긍정적이며 통찰력 있는 종합 리포트를 작성해주세요. 절대 의학적 진단을 내리지 마세요."
-
-    reports = []
-
-    for scenario in scenarios:
-        user_input = "\n".join([
-            f"{i+1}. {trait.title()}: '{answer}'"
-            for i, (trait, answer) in enumerate(scenario["user_answers"].items())
-        ])
-
-        # 간단한 리포트 생성 (실제로는 LLM으로 생성)
-        golden_report = f"""## Big5 심리 분석 리포트
-
-당신의 답변을 바탕으로 분석한 성격 특성은 다음과 같습니다.
-
-### 개방성 (Openness): {scenario['user_answers']['openness'].split('.')[0].split()[-1]}
-{scenario['user_answers']['openness']}
-
-### 성실성 (Conscientiousness): {scenario['user_answers']['conscientiousness'].split('.')[0].split()[-1]}
-{scenario['user_answers']['conscientiousness']}
-
-### 외향성 (Extraversion): {scenario['user_answers']['extraversion'].split('.')[0].split()[-1]}
-{scenario['user_answers']['extraversion']}
-
-### 우호성 (Agreeableness): {scenario['user_answers']['agreeableness'].split('.')[0].split()[-1]}
-{scenario['user_answers']['agreeableness']}
-
-### 신경성 (Neuroticism): {scenario['user_answers']['neuroticism'].split('.')[0].split()[-1]}
-{scenario['user_answers']['neuroticism']}
-
-## 종합 의견
-
-당신은 {scenario['type']} 유형의 성격을 가지고 있습니다. 각 특성들의 균형이 잘 잡혀 있으며, 긍정적인 태도와 성장 가능성을 보여줍니다. 자신의 강점을 잘 활용하고 발전시켜 나간다면 더욱 풍요로운 삶을 살아갈 수 있을 것입니다."""
-
-        reports.append({
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_input},
-                {"role": "assistant", "content": golden_report}
-            ]
-        })
-
-    return reports
+    return [build_report_item(scenario) for scenario in scenarios]
 
 def main():
     """메인 실행 함수"""
@@ -363,19 +367,13 @@ def main():
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"/Volumes/eungu/projects/haru-on/llm/data/big5_final_100_{timestamp}.jsonl"
 
-    with open(filename, 'w', encoding='utf-8') as f:
-        for item in dataset:
-            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+    stats = save_with_stats(filename, dataset)
 
     print(f"✅ 데이터셋 저장 완료: {filename}")
-    print(f"📊 총 데이터셋 크기: {len(dataset)}개 항목")
+    print(f"📊 총 데이터셋 크기: {stats.total_items}개 항목")
 
     # 데이터셋 분석
-    total_chars = sum(len(item["messages"][2]["content"]) for item in dataset)
-    avg_chars = total_chars / len(dataset)
-
-    print(f"📏 평균 리포트 길이: {avg_chars:.0f}자")
-    print(f"📝 전체 텍스트 크기: {total_chars:,}자")
+    stats.print_summary()
 
     print("\n🎯 데이터셋 특징:")
     print("✅ 다양한 연령대 (청소년 ~ 노년층)")
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Big5 held-out 분할
+사용자 답변 해시 구간으로 평가용 항목을 고정 (파일 순서/추가와 무관하게 같은 답변은 항상 같은 쪽)
+학습 데이터셋(build_dataset merged, curriculum_sampler)은 이 항목을 빼고,
+평가(eval_suite, trait_head)는 이 항목만 사용
+"""
+
+import hashlib
+from typing import Dict, Any, Iterable, Iterator
+
+HELDOUT_FRACTION = 0.1
+
+
+def item_key(item: Dict[str, Any]) -> str:
+    """사용자 답변 기준 항목 ID (여러 파일에 같은 답변이 있어도 같은 키)"""
+    return hashlib.sha256(item["messages"][1]["content"].encode("utf-8")).hexdigest()[:12]
+
+
+def is_heldout_key(key: str, fraction: float = HELDOUT_FRACTION) -> bool:
+    return int(key, 16) % 10000 < fraction * 10000
+
+
+def is_heldout(item: Dict[str, Any], fraction: float = HELDOUT_FRACTION) -> bool:
+    messages = item.get("messages") or []
+    return len(messages) == 3 and is_heldout_key(item_key(item), fraction)
+
+
+def exclude_heldout(items: Iterable[Dict[str, Any]], fraction: float = HELDOUT_FRACTION) -> Iterator[Dict[str, Any]]:
+    """학습용: held-out 항목을 뺀 나머지"""
+    return (item for item in items if not is_heldout(item, fraction))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Big5 데이터셋 JSONL 입출력 공용 모듈
+제너레이터 기반 읽기, 버퍼링 배치 쓰기, 단일 패스 통계
+"""
+
+import hashlib
+import json
+import os
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+
+try:
+    # 설치되어 있으면 더 빠른 파서 사용 (읽기 전용, 쓰기 형식은 그대로)
+    from orjson import loads
+except ImportError:
+    loads = json.loads
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def file_checksum(filename: str) -> str:
+    """파일 SHA-256 체크섬"""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_jsonl(filename: str) -> Iterator[Dict[str, Any]]:
+    """JSONL 파일을 한 줄씩 읽어 항목을 순차적으로 반환"""
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield loads(line)
+
+
+def iter_jsonl_files(filenames: Iterable[str], skip_missing: bool = False) -> Iterator[Dict[str, Any]]:
+    """여러 JSONL 파일을 순서대로 이어서 읽기"""
+    for filename in filenames:
+        if skip_missing and not os.path.exists(filename):
+            print(f"⚠️ 데이터셋 파일을 찾을 수 없습니다: {filename}")
+            continue
+        yield from iter_jsonl(filename)
+
+
+def iter_line_batches(filenames: Iterable[str], batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[str]]:
+    """파싱하지 않은 JSONL 줄을 batch_size 단위로 반환 (워커 프로세스에서 파싱할 때 사용)"""
+    batch: List[str] = []
+    for filename in filenames:
+        with open(filename, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    batch.append(line)
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+    if batch:
+        yield batch
+
+
+class JsonlWriter:
+    """버퍼링 배치 JSONL 작성기"""
+
+    def __init__(self, filename: str, batch_size: int = DEFAULT_BATCH_SIZE, append: bool = False):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.count = 0
+        self._buffer: List[str] = []
+        self._file = open(filename, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, item: Dict[str, Any]) -> None:
+        """항목 하나 추가 (배치 크기에 도달하면 디스크에 기록)"""
+        self._buffer.append(json.dumps(item, ensure_ascii=False) + '\n')
+        self.count += 1
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, items: Iterable[Dict[str, Any]]) -> int:
+        """여러 항목 추가 후 추가된 개수 반환"""
+        before = self.count
+        for item in items:
+            self.write(item)
+        return self.count - before
+
+    def flush(self) -> None:
+        """버퍼 내용을 파일에 기록"""
+        if self._buffer:
+            self._file.write(''.join(self._buffer))
+            self._buffer = []
+        self._file.flush()
+
+    def close(self) -> None:
+        """남은 버퍼를 기록하고 파일 닫기"""
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self) -> "JsonlWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def write_jsonl(filename: str, items: Iterable[Dict[str, Any]], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """항목들을 JSONL 파일로 저장하고 저장된 개수 반환"""
+    with JsonlWriter(filename, batch_size=batch_size) as writer:
+        return writer.write_many(items)
+
+
+class DatasetStats:
+    """ChatML 데이터셋 단일 패스 통계"""
+
+    def __init__(self, sample_size: int = 0):
+        self.total_items = 0
+        self.total_chars = 0
+        self.sample_size = sample_size
+        self.samples: List[Dict[str, int]] = []
+
+    def update(self, item: Dict[str, Any]) -> None:
+        """항목 하나를 통계에 반영"""
+        messages = item["messages"]
+        self.total_items += 1
+        self.total_chars += len(messages[2]["content"])
+        if len(self.samples) < self.sample_size:
+            self.samples.append({
+                "user_chars": len(messages[1]["content"]),
+                "report_chars": len(messages[2]["content"]),
+            })
+
+    def track(self, items: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """항목을 그대로 흘려보내면서 통계 집계 (쓰기와 한 번에 처리)"""
+        for item in items:
+            self.update(item)
+            yield item
+
+    @property
+    def avg_chars(self) -> float:
+        return self.total_chars / self.total_items if self.total_items else 0.0
+
+    def print_summary(self) -> None:
+        """리포트 길이 통계 출력"""
+        print(f"📏 평균 리포트 길이: {self.avg_chars:.0f}자")
+        print(f"📝 전체 텍스트 크기: {self.total_chars:,}자")
+
+    def print_samples(self) -> None:
+        """수집된 샘플 항목 길이 출력"""
+        print("\n📋 샘플 데이터:")
+        for i, sample in enumerate(self.samples):
+            print(f"  항목 {i+1}:")
+            print(f"    사용자 입력 길이: {sample['user_chars']}자")
+            print(f"    분석 리포트 길이: {sample['report_chars']}자")
+            print()
+
+
+def compute_stats(filename: str, sample_size: int = 0) -> DatasetStats:
+    """파일을 한 번만 읽어 항목 수와 리포트 길이 통계 계산"""
+    stats = DatasetStats(sample_size=sample_size)
+    for item in iter_jsonl(filename):
+        stats.update(item)
+    return stats
+
+
+def save_with_stats(filename: str, items: Iterable[Dict[str, Any]],
+                    limit: Optional[int] = None, sample_size: int = 0) -> DatasetStats:
+    """항목을 저장하면서 같은 패스에서 통계 집계"""
+    stats = DatasetStats(sample_size=sample_size)
+    with JsonlWriter(filename) as writer:
+        for item in stats.track(items):
+            writer.write(item)
+            if limit is not None and stats.total_items >= limit:
+                break
+    return stats
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Big5 라벨 카탈로그
+모든 JSONL 항목에서 특성별 수준, 페르소나, 시나리오 유형을 추출해 SQLite 색인으로 저장
+(리포트 헤더에서 읽은 수준만 기본 사용, 답변에서 추정한 수준은 표시해 두고 요청할 때만 포함)
+샘플링/균형 맞추기/평가 분할에서 JSONL을 다시 읽지 않고 조건 조회 (파일 체크섬 기준 증분 갱신)
+"""
+
+import argparse
+import glob
+import json
+import os
+import sqlite3
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Union
+
+from big5_labels import (BIG5_TRAITS, TRAIT_LEVELS, infer_level, normalize_level, parse_persona,
+                         parse_scenario_type, parse_trait_levels, parse_user_answers)
+from jsonl_io import file_checksum
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CATALOG = os.path.join(DATA_DIR, "build", "label_catalog.sqlite")
+
+# 조회용 수준 묶음 ("high" = 높음 쪽 전부)
+LEVEL_GROUPS = {
+    "high": ["매우 높음", "높음", "중간-높음"],
+    "mid": ["중간"],
+    "low": ["중간-낮음", "낮음", "매우 낮음"],
+}
+
+LevelSpec = Union[str, Iterable[str]]
+
+
+def expand_levels(spec: LevelSpec) -> List[str]:
+    """'high' / '매우 높음' / ['높음', 'low'] → 표준 수준 목록"""
+    names = [spec] if isinstance(spec, str) else list(spec)
+    levels = []
+    for name in names:
+        if name in LEVEL_GROUPS:
+            levels.extend(LEVEL_GROUPS[name])
+        elif normalize_level(name):
+            levels.append(normalize_level(name))
+        else:
+            raise ValueError(f"알 수 없는 수준: {name} (사용 가능: {', '.join(list(LEVEL_GROUPS) + TRAIT_LEVELS)})")
+    return levels
+
+
+def extract_labels(item: Dict[str, Any]) -> Dict[str, Any]:
+    """ChatML 항목 → 특성별 (수준, 추정 여부), 페르소나, 시나리오 유형
+
+    리포트 헤더의 수준을 읽을 수 없으면 답변의 빈도/강도 표현으로 추정해 inferred로 표시한다
+    (극성을 보지 않는 추정이라 조회 시 include_inferred=True일 때만 사용).
+    """
+    messages = item["messages"]
+    report = messages[2]["content"]
+    answers = parse_user_answers(messages[1]["content"])
+    levels = parse_trait_levels(report)
+
+    traits = {}
+    for trait in BIG5_TRAITS:
+        level, inferred = levels.get(trait), False
+        if level is None and trait in answers:
+            level, inferred = infer_level(answers[trait]), True
+        traits[trait] = (level, inferred)
+    return {"traits": traits, "persona": parse_persona(report), "scenario_type": parse_scenario_type(report)}
+
+
+def iter_lines_with_offsets(filename: str) -> Iterator[tuple]:
+    """(줄 번호, 바이트 오프셋, 줄 바이트) — 빈 줄 제외"""
+    offset = 0
+    with open(filename, 'rb') as f:
+        for line_no, line in enumerate(f, 1):
+            if line.strip():
+                yield line_no, offset, line
+            offset += len(line)
+
+
+class LabelCatalog:
+    """특성 수준 색인
+
+    records: 파일 위치(바이트 오프셋)와 페르소나/시나리오 유형
+    labels: (record_id, trait) → 수준, 순위(0 = 매우 높음), 추정 여부 — (trait, level) 색인
+    """
+
+    def __init__(self, path: str = DEFAULT_CATALOG):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, checksum TEXT, records INTEGER);
+            CREATE TABLE IF NOT EXISTS records (
+                id INTEGER PRIMARY KEY, file TEXT, line INTEGER, offset INTEGER, length INTEGER,
+                persona TEXT, scenario_type TEXT);
+            CREATE TABLE IF NOT EXISTS labels (
+                record_id INTEGER, trait TEXT, level TEXT, rank INTEGER, inferred INTEGER,
+                PRIMARY KEY (record_id, trait)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS records_file ON records (file);
+            CREATE INDEX IF NOT EXISTS records_persona ON records (persona);
+            CREATE INDEX IF NOT EXISTS records_scenario ON records (scenario_type);
+            CREATE INDEX IF NOT EXISTS labels_lookup ON labels (trait, level, record_id);
+        """)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "LabelCatalog":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    # ---- 갱신 ----
+
+    def _remove_file(self, path: str) -> None:
+        self.conn.execute("DELETE FROM labels WHERE record_id IN (SELECT id FROM records WHERE file = ?)", (path,))
+        self.conn.execute("DELETE FROM records WHERE file = ?", (path,))
+        self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def _add_file(self, path: str, checksum: str) -> int:
+        count = 0
+        for line_no, offset, line in iter_lines_with_offsets(path):
+            item = json.loads(line)
+            if len(item.get("messages") or []) != 3:
+                continue
+            labels = extract_labels(item)
+            record_id = self.conn.execute(
+                "INSERT INTO records (file, line, offset, length, persona, scenario_type) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, line_no, offset, len(line), labels["persona"], labels["scenario_type"])).lastrowid
+            self.conn.executemany(
+                "INSERT INTO labels VALUES (?, ?, ?, ?, ?)",
+                [(record_id, trait, level, TRAIT_LEVELS.index(level), int(inferred))
+                 for trait, (level, inferred) in labels["traits"].items() if level is not None])
+            count += 1
+        self.conn.execute("INSERT INTO files VALUES (?, ?, ?)", (path, checksum, count))
+        return count
+
+    def update(self, filenames: Iterable[str], prune: bool = True) -> Dict[str, int]:
+        """바뀐 파일만 다시 색인 (prune이면 목록에 없는 파일의 항목 삭제)"""
+        stats = {"indexed": 0, "unchanged": 0, "removed": 0, "records": 0}
+        paths = [os.path.abspath(filename) for filename in filenames]
+        known = {row["path"]: row["checksum"] for row in self.conn.execute("SELECT path, checksum FROM files")}
+
+        with self.conn:
+            for path in paths:
+                checksum = file_checksum(path)
+                if known.get(path) == checksum:
+                    stats["unchanged"] += 1
+                    continue
+                self._remove_file(path)
+                stats["records"] += self._add_file(path, checksum)
+                stats["indexed"] += 1
+            if prune:
+                for path in set(known) - set(paths):
+                    self._remove_file(path)
+                    stats["removed"] += 1
+        return stats
+
+    # ---- 조회 ----
+
+    def _where(self, levels: Optional[Dict[str, LevelSpec]], persona: Optional[str],
+               scenario_type: Optional[str], files: Optional[Iterable[str]],
+               include_inferred: bool) -> tuple:
+        clauses, params = [], []
+        for trait, spec in (levels or {}).items():
+            if trait not in BIG5_TRAITS:
+                raise ValueError(f"알 수 없는 특성: {trait}")
+            names = expand_levels(spec)
+            clause = (f"r.id IN (SELECT record_id FROM labels WHERE trait = ? "
+                      f"AND level IN ({','.join('?' * len(names))})")
+            if not include_inferred:
+                clause += " AND inferred = 0"
+            clauses.append(clause + ")")
+            params += [trait] + names
+        if persona is not None:
+            clauses.append("r.persona = ?")
+            params.append(persona)
+        if scenario_type is not None:
+            clauses.append("r.scenario_type = ?")
+            params.append(scenario_type)
+        if files is not None:
+            files = [os.path.abspath(filename) for filename in files]
+            clauses.append(f"r.file IN ({','.join('?' * len(files))})")
+            params += files
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, levels: Optional[Dict[str, LevelSpec]] = None, persona: Optional[str] = None,
+              scenario_type: Optional[str] = None, files: Optional[Iterable[str]] = None,
+              include_inferred: bool = False, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """조건에 맞는 항목 (레코드 정보 + 특성별 수준)
+
+        예: query({"neuroticism": "high", "extraversion": "low"})
+        """
+        where, params = self._where(levels, persona, scenario_type, files, include_inferred)
+        sql = f"SELECT r.* FROM records r{where} ORDER BY r.id"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        rows = [dict(row) for row in self.conn.execute(sql, params)]
+
+        by_id = {row["id"]: row for row in rows}
+        for row in rows:
+            row["levels"] = {}
+            row["inferred"] = []
+        ids = list(by_id)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for label in self.conn.execute(
+                    f"SELECT * FROM labels WHERE record_id IN ({','.join('?' * len(chunk))})", chunk):
+                if label["inferred"] and not include_inferred:
+                    continue
+                row = by_id[label["record_id"]]
+                row["levels"][label["trait"]] = label["level"]
+                if label["inferred"]:
+                    row["inferred"].append(label["trait"])
+        return rows
+
+    def count(self, levels: Optional[Dict[str, LevelSpec]] = None, persona: Optional[str] = None,
+              scenario_type: Optional[str] = None, files: Optional[Iterable[str]] = None,
+              include_inferred: bool = False) -> int:
+        where, params = self._where(levels, persona, scenario_type, files, include_inferred)
+        return self.conn.execute(f"SELECT COUNT(*) FROM records r{where}", params).fetchone()[0]
+
+    def distribution(self, trait: str, include_inferred: bool = False) -> Dict[str, int]:
+        """특성 하나의 수준별 항목 수 (TRAIT_LEVELS 순서, 라벨 없음은 None)"""
+        sql = "SELECT level, COUNT(*) FROM labels WHERE trait = ?"
+        if not include_inferred:
+            sql += " AND inferred = 0"
+        counts = dict(self.conn.execute(sql + " GROUP BY level", (trait,)).fetchall())
+        distribution = {level: counts.get(level, 0) for level in TRAIT_LEVELS}
+        distribution[None] = len(self) - sum(distribution.values())
+        return distribution
+
+    def values(self, column: str) -> Dict[str, int]:
+        """persona / scenario_type별 항목 수"""
+        if column not in ("persona", "scenario_type"):
+            raise ValueError(f"알 수 없는 열: {column}")
+        return dict(self.conn.execute(
+            f"SELECT {column}, COUNT(*) FROM records WHERE {column} IS NOT NULL GROUP BY {column} ORDER BY 2 DESC"))
+
+    def load(self, rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """조회 결과의 원본 ChatML 항목 (바이트 오프셋으로 해당 줄만 읽음)"""
+        handles = {}
+        try:
+            for row in rows:
+                handle = handles.get(row["file"])
+                if handle is None:
+                    handle = handles[row["file"]] = open(row["file"], 'rb')
+                handle.seek(row["offset"])
+                yield json.loads(handle.read(row["length"]))
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+
+def parse_level_filters(filters: List[str]) -> Dict[str, List[str]]:
+    """['neuroticism=high', 'extraversion=low,낮음'] → {trait: [수준...]}"""
+    levels = {}
+    for spec in filters:
+        trait, _, names = spec.partition("=")
+        if not names:
+            raise ValueError(f"'특성=수준' 형식이어야 합니다: {spec}")
+        levels.setdefault(trait.strip().lower(), []).extend(name.strip() for name in names.split(","))
+    return levels
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="Big5 라벨 카탈로그 (SQLite)")
+    parser.add_argument("command", choices=["build", "query", "stats"])
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG)
+    parser.add_argument("--files", nargs="*", default=None, help="색인할 JSONL (기본: llm/data/*.jsonl)")
+    parser.add_argument("--level", action="append", default=[], metavar="TRAIT=LEVEL",
+                        help="query: 예) neuroticism=high, extraversion=low (high/mid/low 또는 수준 이름)")
+    parser.add_argument("--persona", default=None)
+    parser.add_argument("--scenario-type", default=None)
+    parser.add_argument("--include-inferred", action="store_true",
+                        help="리포트에 수준이 없는 특성은 답변에서 추정한 수준도 사용 (극성 무시, 부정확)")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--jsonl", action="store_true", help="query: 원본 항목을 JSONL로 출력")
+    args = parser.parse_args()
+
+    with LabelCatalog(args.catalog) as catalog:
+        if args.command == "build":
+            files = args.files or sorted(glob.glob(os.path.join(DATA_DIR, "*.jsonl")))
+            stats = catalog.update(files)
+            print(f"🗂️ 카탈로그 갱신: 파일 {stats['indexed']}개 색인 ({stats['records']}개 항목), "
+                  f"{stats['unchanged']}개 변경 없음, {stats['removed']}개 삭제")
+            print(f"📁 {args.catalog} (총 {len(catalog)}개 항목)")
+            return
+
+        if args.command == "stats":
+            print(f"📊 총 {len(catalog)}개 항목")
+            for trait in BIG5_TRAITS:
+                labeled = catalog.distribution(trait)
+                counts = catalog.distribution(trait, include_inferred=True)
+                summary = "  ".join(f"{level} {labeled[level]}(+{counts[level] - labeled[level]})"
+                                    for level in TRAIT_LEVELS)
+                print(f"  {trait:<18} {summary}  없음 {labeled[None]}")
+            print("  (괄호: --include-inferred일 때 답변에서 추정해 더해지는 수)")
+            for column in ("persona", "scenario_type"):
+                values = catalog.values(column)
+                top = ", ".join(f"{value} {count}" for value, count in list(values.items())[:8])
+                print(f"  {column}: {len(values)}종 — {top}")
+            return
+
+        rows = catalog.query(parse_level_filters(args.level), args.persona, args.scenario_type,
+                             include_inferred=args.include_inferred, limit=args.limit)
+        if args.jsonl:
+            for item in catalog.load(rows):
+                print(json.dumps(item, ensure_ascii=False))
+            return
+        for row in rows:
+            levels = ", ".join(f"{trait} {row['levels'].get(trait, '-')}" for trait in BIG5_TRAITS)
+            print(f"{os.path.basename(row['file'])}:{row['line']}  {row['persona'] or row['scenario_type'] or '-'}  {levels}")
+        print(f"🔎 {len(rows)}개 항목")
+
+if __name__ == "__main__":
+    main()
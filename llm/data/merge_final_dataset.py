@@ -4,113 +4,101 @@
 기존 13개 + 추가 87개 = 총 100개 데이터셋 완성
 """
 
-import json
+import argparse
+import os
 import datetime
 
-def merge_datasets():
-    """데이터셋 병합"""
+from jsonl_io import iter_jsonl, save_with_stats
 
-    # 기존 데이터셋 로드
-    existing_file = "/Volumes/eungu/projects/haru-on/llm/data/big5_dataset_100.jsonl"
-    new_file = "/Volumes/eungu/projects/haru-on/llm/data/big5_final_100_20251103_220705.jsonl"
+DEFAULT_DEDUP_INDEX = "/Volumes/eungu/projects/haru-on/llm/data/big5_dedup_index.sqlite"
 
-    existing_data = []
-    new_data = []
-
-    # 기존 데이터셋 읽기
-    try:
-        with open(existing_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    existing_data.append(json.loads(line))
-        print(f"✅ 기존 데이터셋 로드: {len(existing_data)}개 항목")
-    except FileNotFoundError:
-        print("⚠️ 기존 데이터셋 파일을 찾을 수 없습니다.")
-
-    # 새 데이터셋 읽기
-    try:
-        with open(new_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    new_data.append(json.loads(line))
-        print(f"✅ 새 데이터셋 로드: {len(new_data)}개 항목")
-    except FileNotFoundError:
-        print("⚠️ 새 데이터셋 파일을 찾을 수 없습니다.")
+def merge_datasets(dedup=False, dedup_index_path=DEFAULT_DEDUP_INDEX, incremental=False):
+    """데이터셋 병합
 
-    # 데이터셋 병합
-    merged_data = existing_data + new_data
+    dedup=True면 정확/유사 중복을 걸러낸다. 기본은 병합마다 새 색인(메모리)이라
+    항상 중복 제거된 전체 데이터셋을 쓴다. incremental=True일 때만 색인 파일을 유지해
+    다음 병합에서 이전에 병합된 항목을 제외하고 새 항목만 추가한다.
+    """
 
-    # 총 100개만 선택 (초과 시 자름)
-    if len(merged_data) > 100:
-        merged_data = merged_data[:100]
-    elif len(merged_data) < 100:
-        print(f"⚠️ 데이터셋이 100개에 미달합니다: {len(merged_data)}개")
+    # 기존 데이터셋 + 새 데이터셋 (순서대로 스트리밍)
+    existing_file = "/Volumes/eungu/projects/haru-on/llm/data/big5_dataset_100.jsonl"
+    new_file = "/Volumes/eungu/projects/haru-on/llm/data/big5_final_100_20251103_220705.jsonl"
 
-    # 최종 데이터셋 저장
+    source_files = []
+    for label, filename in [("기존", existing_file), ("새", new_file)]:
+        if os.path.exists(filename):
+            source_files.append(filename)
+        else:
+            print(f"⚠️ {label} 데이터셋 파일을 찾을 수 없습니다.")
+
+    def iter_sources():
+        for filename in source_files:
+            print(f"✅ 데이터셋 스트리밍: {os.path.basename(filename)}")
+            items = iter_jsonl(filename)
+            if dedup_index is not None:
+                items = dedup_index.filter(items, source=os.path.basename(filename))
+            yield from items
+
+    dedup_index = None
+    if dedup:
+        from dedup_index import DedupIndex
+        if incremental:
+            dedup_index = DedupIndex(dedup_index_path)
+            print(f"🧹 증분 중복 제거 색인: {dedup_index_path} (기존 {len(dedup_index)}개 항목)")
+        else:
+            dedup_index = DedupIndex()
+            print("🧹 중복 제거 색인: 메모리 (이번 병합 전용)")
+
+    # 최종 데이터셋 저장 (총 100개만 선택, 초과 시 자름)
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     final_filename = f"/Volumes/eungu/projects/haru-on/llm/data/big5_complete_100_final_{timestamp}.jsonl"
 
-    with open(final_filename, 'w', encoding='utf-8') as f:
-        for item in merged_data:
-            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+    stats = save_with_stats(final_filename, iter_sources(), limit=100, sample_size=3)
+
+    if dedup_index is not None:
+        dedup_index.print_stats()
+        dedup_index.close()
+
+    if stats.total_items < 100:
+        print(f"⚠️ 데이터셋이 100개에 미달합니다: {stats.total_items}개")
 
     print(f"✅ 최종 데이터셋 저장 완료: {final_filename}")
-    print(f"📊 최종 데이터셋 크기: {len(merged_data)}개 항목")
+    print(f"📊 최종 데이터셋 크기: {stats.total_items}개 항목")
 
     # 데이터셋 분석
-    total_chars = sum(len(item["messages"][2]["content"]) for item in merged_data)
-    avg_chars = total_chars / len(merged_data)
-
-    print(f"📏 평균 리포트 길이: {avg_chars:.0f}자")
-    print(f"📝 전체 텍스트 크기: {total_chars:,}자")
+    stats.print_summary()
 
     # 샘플 데이터 확인
-    print("\n📋 샘플 데이터:")
-    for i, item in enumerate(merged_data[:3]):
-        print(f"  항목 {i+1}:")
-        print(f"    사용자 입력 길이: {len(item['messages'][1]['content'])}자")
-        print(f"    분석 리포트 길이: {len(item['messages'][2]['content'])}자")
-        print()
+    stats.print_samples()
+
+    return final_filename, stats
 
-    return final_filename, merged_data
+def validate_dataset(dataset, error_table=None):
+    """데이터셋 유효성 검증 (컬럼형 검증기, error_table을 지정하면 전체 오류를 CSV로 저장)"""
 
-def validate_dataset(dataset):
-    """데이터셋 유효성 검증"""
+    from dataset_validator import DatasetValidator, write_error_table
 
     print("🔍 데이터셋 유효성 검증 중...")
 
+    validator = DatasetValidator()
     errors = []
 
-    for i, item in enumerate(dataset):
-        # 메시지 구조 확인
-        if "messages" not in item:
-            errors.append(f"항목 {i+1}: 'messages' 필드 없음")
-            continue
-
-        messages = item["messages"]
-        if len(messages) != 3:
-            errors.append(f"항목 {i+1}: 메시지 수가 3개가 아님 ({len(messages)}개)")
-            continue
-
-        # 역할 확인
-        roles = [msg["role"] for msg in messages]
-        expected_roles = ["system", "user", "assistant"]
-        if roles != expected_roles:
-            errors.append(f"항목 {i+1}: 역할 순서가 올바르지 않음 ({roles})")
-
-        # 내용 확인
-        for j, msg in enumerate(messages):
-            if "content" not in msg:
-                errors.append(f"항목 {i+1}, 메시지 {j+1}: 'content' 필드 없음")
-            elif not msg["content"].strip():
-                errors.append(f"항목 {i+1}, 메시지 {j+1}: 내용이 비어있음")
-
-    if errors:
+    def collect(rows):
+        for row in rows:
+            if len(errors) < 10:  # 처음 10개 에러만 표시
+                errors.append(row)
+            yield row
+
+    write_error_table(collect(validator.validate(dataset)), error_table)
+
+    if validator.invalid_items:
         print("❌ 데이터셋 유효성 검증 실패:")
-        for error in errors[:10]:  # 처음 10개 에러만 표시
-            print(f"  - {error}")
-        if len(errors) > 10:
-            print(f"  - 외 {len(errors)-10}개의 에러...")
+        for index, check, message, detail in errors:
+            location = f"항목 {index+1}" + (f", 메시지 {message}" if message != "" else "")
+            print(f"  - {location}: [{check}] {detail}")
+        validator.print_summary()
+        if error_table:
+            print(f"📁 전체 오류 테이블: {error_table}")
         return False
     else:
         print("✅ 데이터셋 유효성 검증 통과!")
@@ -119,13 +107,21 @@ def validate_dataset(dataset):
 def main():
     """메인 실행 함수"""
 
+    parser = argparse.ArgumentParser(description="Big5 최종 데이터셋 병합")
+    parser.add_argument("--dedup", action="store_true", help="정확/유사 중복 제거 병합")
+    parser.add_argument("--incremental", action="store_true",
+                        help="--dedup 색인을 파일에 유지해 이전 병합 항목은 제외하고 새 항목만 저장")
+    parser.add_argument("--dedup-index", default=DEFAULT_DEDUP_INDEX, help="--incremental 영속 중복 제거 색인 파일")
+    args = parser.parse_args()
+
     print("🚀 Big5 최종 100개 데이터셋 병합 시작...")
 
     # 데이터셋 병합
-    final_filename, final_dataset = merge_datasets()
+    final_filename, _ = merge_datasets(dedup=args.dedup, dedup_index_path=args.dedup_index,
+                                       incremental=args.incremental)
 
-    # 유효성 검증
-    is_valid = validate_dataset(final_dataset)
+    # 유효성 검증 (저장된 파일을 다시 스트리밍)
+    is_valid = validate_dataset(iter_jsonl(final_filename))
 
     if is_valid:
         print("\n🎉 Big5 100개 데이터셋 생성 성공!")
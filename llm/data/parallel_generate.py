@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Big5 데이터셋 병렬 생성 엔진
+시나리오 목록을 샤드 단위로 나눠 프로세스 풀에서 생성하고 샤드 JSONL로 바로 기록
+"""
+
+import argparse
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+
+from jsonl_io import JsonlWriter
+
+DEFAULT_SHARD_SIZE = 1000
+
+
+def iter_shards(scenarios: Iterable[Dict[str, Any]], shard_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """시나리오를 순서를 유지한 채 shard_size 단위로 나누기 (지연 평가)"""
+    iterator = iter(scenarios)
+    while True:
+        shard = list(islice(iterator, shard_size))
+        if not shard:
+            return
+        yield shard
+
+
+def shard_filename(output_dir: str, shard_index: int) -> str:
+    """샤드 파일 경로"""
+    return os.path.join(output_dir, f"part-{shard_index:05d}.jsonl")
+
+
+def _build_shard(builder: Callable[[Dict[str, Any]], Dict[str, Any]], shard: List[Dict[str, Any]],
+                 shard_index: int, output_dir: str, seed: int) -> Tuple[str, int, int]:
+    """워커에서 샤드 하나를 생성해 파일로 기록 (경로, 항목 수, 리포트 글자 수 반환)"""
+
+    # 샤드별 시드 고정: 스케줄링 순서와 무관하게 같은 결과
+    random.seed(seed * 1_000_003 + shard_index)
+
+    filename = shard_filename(output_dir, shard_index)
+    total_chars = 0
+    with JsonlWriter(filename) as writer:
+        for scenario in shard:
+            item = builder(scenario)
+            total_chars += len(item["messages"][2]["content"])
+            writer.write(item)
+    return filename, writer.count, total_chars
+
+
+def generate_serial(scenarios: Iterable[Dict[str, Any]], output_dir: str,
+                    builder: Callable[[Dict[str, Any]], Dict[str, Any]],
+                    shard_size: int = DEFAULT_SHARD_SIZE, seed: int = 42) -> Iterator[Tuple[str, int, int]]:
+    """단일 프로세스 경로 (병렬 경로와 동일한 샤드 출력)"""
+    for shard_index, shard in enumerate(iter_shards(scenarios, shard_size)):
+        yield _build_shard(builder, shard, shard_index, output_dir, seed)
+
+
+def generate_parallel(scenarios: Iterable[Dict[str, Any]], output_dir: str,
+                      builder: Callable[[Dict[str, Any]], Dict[str, Any]],
+                      num_workers: Optional[int] = None, shard_size: int = DEFAULT_SHARD_SIZE,
+                      seed: int = 42) -> Iterator[Tuple[str, int, int]]:
+    """프로세스 풀 경로 (샤드 결과를 입력 순서대로 반환)"""
+
+    num_workers = num_workers or os.cpu_count() or 1
+    # 대기 중인 샤드 수를 제한해 입력을 지연 소비 (메모리 상한 유지)
+    max_pending = num_workers * 2
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        pending = deque()
+        for shard_index, shard in enumerate(iter_shards(scenarios, shard_size)):
+            pending.append(executor.submit(_build_shard, builder, shard, shard_index, output_dir, seed))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def run_generation(scenarios: Iterable[Dict[str, Any]], output_dir: str,
+                   builder: Callable[[Dict[str, Any]], Dict[str, Any]],
+                   num_workers: int = 1, shard_size: int = DEFAULT_SHARD_SIZE,
+                   seed: int = 42) -> Dict[str, Any]:
+    """샤드 생성 실행 후 처리량 리포트 반환"""
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    start_time = time.time()
+    if num_workers > 1:
+        results = generate_parallel(scenarios, output_dir, builder, num_workers, shard_size, seed)
+    else:
+        results = generate_serial(scenarios, output_dir, builder, shard_size, seed)
+
+    shards = []
+    total_items = 0
+    total_chars = 0
+    for filename, count, chars in results:
+        shards.append(os.path.basename(filename))
+        total_items += count
+        total_chars += chars
+    elapsed = time.time() - start_time
+
+    return {
+        "output_dir": output_dir,
+        "shards": shards,
+        "total_items": total_items,
+        "total_chars": total_chars,
+        "num_workers": num_workers,
+        "seed": seed,
+        "elapsed_sec": elapsed,
+        "records_per_sec": total_items / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    """메인 실행 함수"""
+
+    from final_100_datasets import build_report_item, generate_remaining_scenarios
+
+    parser = argparse.ArgumentParser(description="Big5 데이터셋 병렬 생성")
+    parser.add_argument("--output-dir", default="generated_shards")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument("--repeat", type=int, default=1, help="시나리오 목록 반복 횟수 (처리량 측정용)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print("🚀 Big5 데이터셋 병렬 생성 시작...")
+
+    base_scenarios = generate_remaining_scenarios()
+    scenarios = (scenario for _ in range(args.repeat) for scenario in base_scenarios)
+
+    report = run_generation(scenarios, args.output_dir, build_report_item,
+                            num_workers=args.workers, shard_size=args.shard_size, seed=args.seed)
+
+    print(f"✅ 샤드 생성 완료: {report['output_dir']} ({len(report['shards'])}개 샤드)")
+    print(f"📊 총 데이터셋 크기: {report['total_items']}개 항목")
+    if report["total_items"]:
+        print(f"📏 평균 리포트 길이: {report['total_chars'] / report['total_items']:.0f}자")
+    print(f"⏱️  소요 시간: {report['elapsed_sec']:.2f}초 (워커 {report['num_workers']}개)")
+    print(f"⚡ 처리량: {report['records_per_sec']:,.0f} records/sec")
+
+    return report
+
+if __name__ == "__main__":
+    main()
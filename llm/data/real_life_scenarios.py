@@ -4,10 +4,11 @@
 다양한 인생 상황에서의 심리 분석 시나리오 생성
 """
 
-import json
 import datetime
 from typing import List, Dict, Any
 
+from jsonl_io import write_jsonl
+
 class RealLifeBig5DatasetCreator:
     """실제 시나리오 Big5 데이터셋 생성기"""
 
@@ -218,9 +219,7 @@ class RealLifeBig5DatasetCreator:
 
     def save_dataset(self, dataset: List[Dict[str, Any]], filename: str) -> None:
         """데이터셋 저장"""
-        with open(filename, 'w', encoding='utf-8') as f:
-            for item in dataset:
-                f.write(json.dumps(item, ensure_ascii=False) + '\n')
+        write_jsonl(filename, dataset)
 
     def create_initial_dataset(self) -> str:
         """초기 데이터셋 생성"""
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Big5 SFT 샘플 패킹 / 길이 버킷팅
+토큰 캐시의 샘플을 cutoff_len 창에 탐욕적으로 채워 넣고(Best-Fit Decreasing)
+세그먼트 경계 정보(attention_mask 세그먼트 번호, position_ids 재시작)를 함께 저장
+"""
+
+import argparse
+import bisect
+import json
+import os
+from typing import List, Dict, Any, Iterator
+
+import numpy as np
+
+from jsonl_io import JsonlWriter
+from token_cache import CUTOFF_LEN, DEFAULT_CACHE_DIR, TokenCache, build_token_cache
+
+BATCH_SIZE = 4  # qwen2_big5_qlora.yaml per_device_train_batch_size
+IGNORE_INDEX = -100
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "packed")
+
+
+def pack_best_fit(lengths: np.ndarray, cutoff_len: int) -> List[List[int]]:
+    """길이 내림차순으로 남은 공간이 가장 작은 창에 넣기 (Best-Fit Decreasing, O(n log n))
+
+    cutoff_len보다 긴 샘플은 잘린 길이 기준으로 혼자 한 창을 차지한다.
+    """
+    clipped = np.minimum(lengths, cutoff_len)
+    order = np.argsort(-clipped, kind="stable")
+
+    packs: List[List[int]] = []
+    free_space: List[tuple] = []  # (남은 공간, 창 번호) 정렬 유지
+    for index in order:
+        length = int(clipped[index])
+        pos = bisect.bisect_left(free_space, (length, -1))
+        if pos < len(free_space):
+            remaining, pack_id = free_space.pop(pos)
+        else:
+            remaining, pack_id = cutoff_len, len(packs)
+            packs.append([])
+        packs[pack_id].append(int(index))
+        remaining -= length
+        if remaining > 0:
+            bisect.insort(free_space, (remaining, pack_id))
+
+    # 창 안에서는 원래 데이터셋 순서 유지
+    return [sorted(pack) for pack in packs]
+
+
+def bucket_by_length(lengths: np.ndarray, batch_size: int = BATCH_SIZE, seed: int = 42) -> List[List[int]]:
+    """비슷한 길이끼리 배치를 만들고 배치 순서는 섞기"""
+    order = np.argsort(lengths, kind="stable")
+    batches = [order[i:i + batch_size].tolist() for i in range(0, len(order), batch_size)]
+    np.random.default_rng(seed).shuffle(batches)
+    return batches
+
+
+def padding_ratio(batch_lengths: List[List[int]]) -> Dict[str, Any]:
+    """배치 최대 길이로 패딩할 때 패딩 토큰 비율"""
+    real = sum(sum(lengths) for lengths in batch_lengths)
+    padded = sum(max(lengths) * len(lengths) for lengths in batch_lengths if lengths)
+    return {
+        "real_tokens": int(real),
+        "padded_tokens": int(padded),
+        "padding_ratio": (padded - real) / padded if padded else 0.0,
+    }
+
+
+def padding_report(cache: TokenCache, cutoff_len: int, packs: List[List[int]], mode: str,
+                   batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """패킹 전(파일 순서 배치) / 후 패딩 비율 비교"""
+    lengths = np.minimum(cache.lengths, cutoff_len).tolist()
+    before = [lengths[i:i + batch_size] for i in range(0, len(lengths), batch_size)]
+
+    if mode == "pack":
+        pack_lengths = [sum(lengths[i] for i in pack) for pack in packs]
+        after = [pack_lengths[i:i + batch_size] for i in range(0, len(pack_lengths), batch_size)]
+    else:
+        after = [[lengths[i] for i in batch] for batch in packs]
+
+    return {
+        "mode": mode,
+        "samples": len(lengths),
+        "sequences_after": len(packs) if mode == "pack" else len(lengths),
+        "before": padding_ratio(before),
+        "after": padding_ratio(after),
+    }
+
+
+def iter_packed_records(cache: TokenCache, packs: List[List[int]], cutoff_len: int) -> Iterator[Dict[str, Any]]:
+    """패킹된 학습 레코드 (LLaMA-Factory neat_packing 형식)
+
+    attention_mask: 세그먼트 번호(1, 2, ...) — 다른 샘플끼리 어텐션하지 않도록 경계를 표시
+    position_ids: 세그먼트마다 0부터 다시 시작
+    labels: 각 샘플의 프롬프트 부분은 IGNORE_INDEX
+    """
+    for pack in packs:
+        input_ids: List[int] = []
+        labels: List[int] = []
+        attention_mask: List[int] = []
+        position_ids: List[int] = []
+        for segment, index in enumerate(pack, start=1):
+            ids = cache[index][:cutoff_len].tolist()
+            prompt_len = min(int(cache.prompt_lens[index]), len(ids))
+            input_ids.extend(ids)
+            labels.extend([IGNORE_INDEX] * prompt_len + ids[prompt_len:])
+            attention_mask.extend([segment] * len(ids))
+            position_ids.extend(range(len(ids)))
+        yield {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "position_ids": position_ids,
+            "labels": labels,
+            "sample_indices": pack,
+        }
+
+
+def iter_bucketed_records(cache: TokenCache, batches: List[List[int]], cutoff_len: int) -> Iterator[Dict[str, Any]]:
+    """길이 버킷 순서의 학습 레코드 (샘플당 하나)"""
+    for batch in batches:
+        for index in batch:
+            ids = cache[index][:cutoff_len].tolist()
+            prompt_len = min(int(cache.prompt_lens[index]), len(ids))
+            yield {
+                "input_ids": ids,
+                "attention_mask": [1] * len(ids),
+                "labels": [IGNORE_INDEX] * prompt_len + ids[prompt_len:],
+                "sample_indices": [index],
+            }
+
+
+def print_padding_report(report: Dict[str, Any]) -> None:
+    """패딩 비율 비교 출력"""
+    before, after = report["before"], report["after"]
+    print(f"📦 모드: {report['mode']} / 샘플 {report['samples']:,}개 → 시퀀스 {report['sequences_after']:,}개")
+    print(f"  패킹 전 패딩 비율: {before['padding_ratio']:.1%} ({before['padded_tokens']:,} 토큰 중 실제 {before['real_tokens']:,})")
+    print(f"  패킹 후 패딩 비율: {after['padding_ratio']:.1%} ({after['padded_tokens']:,} 토큰 중 실제 {after['real_tokens']:,})")
+    if after["padded_tokens"]:
+        print(f"  처리 토큰 감소: {1 - after['padded_tokens'] / before['padded_tokens']:.1%}")
+
+
+def write_packed_dataset(cache: TokenCache, output_dir: str, cutoff_len: int = CUTOFF_LEN,
+                         mode: str = "pack", batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """패킹 데이터셋(JSONL + 가능하면 HF datasets 디스크 형식)과 리포트 저장"""
+
+    if mode == "pack":
+        groups = pack_best_fit(cache.lengths, cutoff_len)
+        records = iter_packed_records(cache, groups, cutoff_len)
+    elif mode == "bucket":
+        groups = bucket_by_length(cache.lengths, batch_size)
+        records = iter_bucketed_records(cache, groups, cutoff_len)
+    else:
+        raise ValueError(f"지원하지 않는 모드: {mode}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    jsonl_path = os.path.join(output_dir, f"{mode}_{cutoff_len}.jsonl")
+    with JsonlWriter(jsonl_path) as writer:
+        writer.write_many(records)
+
+    report = padding_report(cache, cutoff_len, groups, mode, batch_size)
+    report["jsonl"] = jsonl_path
+    report["cache_key"] = cache.meta["key"]
+
+    try:
+        from datasets import Dataset
+    except ImportError:
+        print("⚠️ datasets 라이브러리가 없어 JSONL만 저장합니다.")
+    else:
+        # LLaMA-Factory tokenized_path로 바로 불러올 수 있는 형식
+        tokenized_path = os.path.join(output_dir, f"{mode}_{cutoff_len}")
+        Dataset.from_json(jsonl_path).remove_columns("sample_indices").save_to_disk(tokenized_path)
+        report["tokenized_path"] = tokenized_path
+
+    with open(os.path.join(output_dir, f"{mode}_{cutoff_len}_report.json"), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="Big5 SFT 샘플 패킹 / 길이 버킷팅")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--tokenizer", default="Qwen/Qwen2-1.5B")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--cutoff-len", type=int, default=CUTOFF_LEN)
+    parser.add_argument("--mode", choices=["pack", "bucket"], default="pack")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+
+    print("🚀 Big5 SFT 샘플 패킹 시작...")
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer, trust_remote_code=True)
+    cache = build_token_cache(tokenizer, args.files, args.cache_dir, args.cutoff_len)
+
+    report = write_packed_dataset(cache, args.output_dir, args.cutoff_len, args.mode, args.batch_size)
+    print_padding_report(report)
+    print(f"📁 패킹 데이터셋: {report['jsonl']}")
+    if "tokenized_path" in report:
+        print(f"📋 QLoRA 설정: tokenized_path: {report['tokenized_path']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Big5 조합형 시나리오 합성기
+기존 시나리오의 특성별 답변을 (특성, 수준, 페르소나) 풀로 색인하고
+수준 층화 샘플링으로 중복 없는 5개 특성 조합을 지연 생성
+"""
+
+import argparse
+import os
+import random
+from collections import Counter
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+from big5_labels import BIG5_TRAITS, UNLABELED, parse_persona, parse_trait_levels, parse_user_answers
+
+
+class AnswerPool:
+    """특성별 답변 풀 (특성 → 수준 → 페르소나 → 답변 ID 목록)"""
+
+    def __init__(self):
+        self.answers: List[Tuple[str, str, str, str]] = []  # (trait, level, persona, answer)
+        self.index: Dict[str, Dict[str, Dict[str, List[int]]]] = {trait: {} for trait in BIG5_TRAITS}
+        self.by_level: Dict[str, Dict[str, List[int]]] = {trait: {} for trait in BIG5_TRAITS}
+        self._answer_ids: Dict[Tuple[str, str], int] = {}
+
+    def add(self, trait: str, level: Optional[str], persona: Optional[str], answer: str) -> None:
+        """답변 하나 색인 (같은 특성의 동일 답변은 한 번만 저장하고 페르소나만 추가)"""
+        persona = persona or UNLABELED
+
+        answer_id = self._answer_ids.get((trait, answer))
+        if answer_id is not None:
+            _, first_level, _, _ = self.answers[answer_id]
+            ids = self.index[trait][first_level].setdefault(persona, [])
+            if answer_id not in ids:
+                ids.append(answer_id)
+            return
+
+        level = level or UNLABELED
+        answer_id = len(self.answers)
+        self._answer_ids[(trait, answer)] = answer_id
+        self.answers.append((trait, level, persona, answer))
+        self.index[trait].setdefault(level, {}).setdefault(persona, []).append(answer_id)
+        self.by_level[trait].setdefault(level, []).append(answer_id)
+
+    def add_scenario(self, user_answers: Dict[str, str], persona: Optional[str],
+                     trait_levels: Optional[Dict[str, Optional[str]]] = None) -> None:
+        """시나리오 하나의 5개 답변 색인"""
+        trait_levels = trait_levels or {}
+        for trait in BIG5_TRAITS:
+            if trait in user_answers:
+                self.add(trait, trait_levels.get(trait), persona, user_answers[trait])
+
+    def add_chatml_item(self, item: Dict[str, Any], persona: Optional[str] = None) -> None:
+        """ChatML 항목에서 답변/수준/페르소나를 파싱해 색인"""
+        messages = item["messages"]
+        report = messages[2]["content"]
+        self.add_scenario(parse_user_answers(messages[1]["content"]),
+                          persona or parse_persona(report),
+                          parse_trait_levels(report))
+
+    def candidates(self, trait: str, level: str, persona: Optional[str] = None) -> List[int]:
+        """특성/수준(/페르소나)에 해당하는 답변 ID 목록"""
+        if persona is not None:
+            return self.index[trait].get(level, {}).get(persona, [])
+        return self.by_level[trait].get(level, [])
+
+    def levels(self, trait: str, persona: Optional[str] = None, include_unlabeled: bool = True) -> List[str]:
+        """답변이 존재하는 수준 목록"""
+        return [
+            level for level in self.index[trait]
+            if (include_unlabeled or level != UNLABELED) and self.candidates(trait, level, persona)
+        ]
+
+    def personas(self) -> List[str]:
+        """색인된 페르소나 목록"""
+        return sorted({persona for by_level in self.index.values()
+                       for by_persona in by_level.values() for persona in by_persona})
+
+    def combination_space(self, persona: Optional[str] = None, include_unlabeled: bool = True) -> int:
+        """가능한 5개 특성 조합 수"""
+        total = 1
+        for trait in BIG5_TRAITS:
+            total *= sum(len(self.candidates(trait, level, persona))
+                         for level in self.levels(trait, persona, include_unlabeled))
+        return total
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        """특성별 수준 분포"""
+        return {
+            trait: {level: len(ids) for level, ids in by_level.items()}
+            for trait, by_level in self.by_level.items()
+        }
+
+
+def build_answer_pool(extra_files: Iterable[str] = ()) -> AnswerPool:
+    """기존 시나리오 모듈(과 선택적 JSONL 파일)에서 답변 풀 구축"""
+
+    from additional_scenarios import generate_additional_scenarios
+    from complete_100_datasets import create_complete_100_datasets
+    from final_100_datasets import generate_remaining_scenarios
+    from real_life_scenarios import RealLifeBig5DatasetCreator
+
+    pool = AnswerPool()
+
+    # 골든 리포트가 있는 시나리오 (수준 라벨 포함)
+    for item in create_complete_100_datasets():
+        pool.add_chatml_item(item)
+    for scenario in RealLifeBig5DatasetCreator().create_real_life_scenarios():
+        report = scenario["golden_report"]
+        pool.add_scenario(scenario["user_answers"], parse_persona(report), parse_trait_levels(report))
+
+    # 페르소나 유형만 있는 시나리오 (수준 미분류)
+    for scenario in generate_remaining_scenarios():
+        pool.add_scenario(scenario["user_answers"], scenario["type"])
+    for scenario in generate_additional_scenarios():
+        pool.add_scenario(scenario["user_answers"], scenario["scenario_type"])
+
+    if extra_files:
+        from jsonl_io import iter_jsonl_files
+        for item in iter_jsonl_files(extra_files, skip_missing=True):
+            pool.add_chatml_item(item)
+
+    return pool
+
+
+def synthesize_scenarios(pool: AnswerPool, count: int, seed: int = 42, persona: Optional[str] = None,
+                         include_unlabeled: bool = True, max_retries: int = 1000) -> Iterator[Dict[str, Any]]:
+    """중복 없는 5개 특성 조합을 최대 count개 지연 생성
+
+    특성마다 수준을 균등하게 먼저 고른 뒤(층화) 해당 수준 풀에서 답변을 고르므로
+    드문 수준도 흔한 수준과 같은 비율로 등장한다.
+    """
+
+    rng = random.Random(seed)
+    trait_levels = {trait: pool.levels(trait, persona, include_unlabeled) for trait in BIG5_TRAITS}
+    empty = [trait for trait, levels in trait_levels.items() if not levels]
+    if empty:
+        raise ValueError(f"답변 풀이 비어있는 특성: {', '.join(empty)}")
+
+    seen = set()
+    produced = 0
+    retries = 0
+
+    while produced < count:
+        levels = {trait: rng.choice(trait_levels[trait]) for trait in BIG5_TRAITS}
+        key = tuple(
+            rng.choice(pool.candidates(trait, levels[trait], persona))
+            for trait in BIG5_TRAITS
+        )
+
+        if key in seen:
+            retries += 1
+            if retries >= max_retries:
+                print(f"⚠️ 조합 공간이 소진되었습니다: {produced}개 생성 후 중단")
+                return
+            continue
+        seen.add(key)
+        retries = 0
+        produced += 1
+
+        answers = [pool.answers[answer_id] for answer_id in key]
+        personas = Counter(answer_persona for _, _, answer_persona, _ in answers)
+        scenario_persona = persona or personas.most_common(1)[0][0]
+
+        yield {
+            "user_answers": {trait: answer for trait, _, _, answer in answers},
+            "trait_levels": {trait: level for trait, level, _, _ in answers},
+            "type": scenario_persona,
+        }
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="Big5 조합형 시나리오 합성")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--persona", default=None, help="특정 페르소나 유형의 답변만 사용")
+    parser.add_argument("--labeled-only", action="store_true", help="수준 라벨이 있는 답변만 사용")
+    parser.add_argument("--output-dir", default=None, help="지정하면 ChatML 샤드로 바로 생성")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print("🚀 Big5 조합형 시나리오 합성 시작...")
+
+    pool = build_answer_pool()
+    include_unlabeled = not args.labeled_only
+    print(f"📚 색인된 답변 수: {len(pool.answers)}개 (페르소나 {len(pool.personas())}개)")
+    for trait, levels in pool.summary().items():
+        print(f"  {trait}: {levels}")
+    print(f"🔢 가능한 조합 수: {pool.combination_space(args.persona, include_unlabeled):,}")
+
+    scenarios = synthesize_scenarios(pool, args.count, seed=args.seed, persona=args.persona,
+                                     include_unlabeled=include_unlabeled)
+
+    if args.output_dir:
+        from final_100_datasets import build_report_item
+        from parallel_generate import run_generation
+
+        report = run_generation(scenarios, args.output_dir, build_report_item,
+                                num_workers=args.workers, seed=args.seed)
+        print(f"✅ 샤드 생성 완료: {report['output_dir']} ({report['total_items']}개 항목)")
+        print(f"⚡ 처리량: {report['records_per_sec']:,.0f} records/sec")
+    else:
+        total = sum(1 for _ in scenarios)
+        print(f"✅ 합성 가능한 고유 조합: {total}개")
+
+if __name__ == "__main__":
+    main()
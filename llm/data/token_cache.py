@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Big5 데이터셋 토큰 길이 프로파일러 + 사전 토큰화 캐시
+Qwen ChatML 템플릿으로 한 번만 토큰화해 오프셋 색인 memmap 파일로 저장하고
+학습/평가에서는 복사 없이 불러옴 (토크나이저 해시 + 데이터셋 체크섬 키)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+
+import numpy as np
+
+from jsonl_io import file_checksum, iter_jsonl_files
+
+CUTOFF_LEN = 2048  # qwen2_big5_qlora.yaml cutoff_len
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "token_cache")
+DEFAULT_BATCH_SIZE = 256
+HISTOGRAM_BIN = 128
+
+TOKEN_DTYPE = np.uint32
+OFFSET_DTYPE = np.int64
+
+
+def render_chatml(messages: List[Dict[str, str]], add_generation_prompt: bool = False) -> str:
+    """Qwen ChatML 템플릿 (LLaMA-Factory template: qwen과 같은 형식)"""
+    text = "".join(f"<|im_start|>{msg['role']}\n{msg['content']}<|im_end|>\n" for msg in messages)
+    if add_generation_prompt:
+        text += "<|im_start|>assistant\n"
+    return text
+
+
+def split_prompt_response(messages: List[Dict[str, str]]) -> Tuple[str, str]:
+    """학습 시 손실에서 제외되는 프롬프트 부분과 어시스턴트 응답 부분으로 분리"""
+    prompt = render_chatml(messages[:-1], add_generation_prompt=True)
+    response = f"{messages[-1]['content']}<|im_end|>\n"
+    return prompt, response
+
+
+def tokenizer_fingerprint(tokenizer: Any) -> str:
+    """토크나이저 어휘/병합 규칙/특수 토큰 기준 해시"""
+    digest = hashlib.sha256()
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        digest.update(backend.to_str().encode("utf-8"))
+    else:
+        digest.update(json.dumps(tokenizer.get_vocab(), sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    digest.update(json.dumps(tokenizer.all_special_tokens, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def dataset_fingerprint(filenames: List[str]) -> str:
+    """입력 JSONL 파일 목록의 체크섬 (순서 포함)"""
+    digest = hashlib.sha256()
+    for filename in filenames:
+        digest.update(file_checksum(filename).encode("ascii"))
+    return digest.hexdigest()
+
+
+def cache_key(tokenizer: Any, filenames: List[str]) -> str:
+    return f"{tokenizer_fingerprint(tokenizer)[:16]}-{dataset_fingerprint(filenames)[:16]}"
+
+
+def iter_encoded(tokenizer: Any, items: Iterable[Dict[str, Any]],
+                 batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Tuple[List[int], int]]:
+    """(토큰 ID, 프롬프트 길이)를 항목 순서대로 반환
+
+    fast 토크나이저의 배치 인코딩은 Rust 쪽에서 스레드 병렬로 실행된다.
+    프롬프트와 응답을 따로 인코딩해 이어붙이므로 경계가 정확하다.
+    """
+
+    def encode(batch: List[Dict[str, Any]]) -> Iterator[Tuple[List[int], int]]:
+        pairs = [split_prompt_response(item["messages"]) for item in batch]
+        prompts = tokenizer([prompt for prompt, _ in pairs], add_special_tokens=False)["input_ids"]
+        responses = tokenizer([response for _, response in pairs], add_special_tokens=False)["input_ids"]
+        for prompt_ids, response_ids in zip(prompts, responses):
+            yield prompt_ids + response_ids, len(prompt_ids)
+
+    batch: List[Dict[str, Any]] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield from encode(batch)
+            batch = []
+    if batch:
+        yield from encode(batch)
+
+
+def length_report(lengths: np.ndarray, cutoff_len: int = CUTOFF_LEN, bin_size: int = HISTOGRAM_BIN) -> Dict[str, Any]:
+    """샘플 길이 히스토그램과 잘림 통계"""
+    if len(lengths) == 0:
+        return {"count": 0}
+
+    edges = list(range(0, int(max(lengths.max(), cutoff_len)) + bin_size, bin_size))
+    counts, _ = np.histogram(lengths, bins=edges)
+    truncated = int((lengths > cutoff_len).sum())
+    return {
+        "count": int(len(lengths)),
+        "total_tokens": int(lengths.sum()),
+        "mean": float(lengths.mean()),
+        "p50": int(np.percentile(lengths, 50)),
+        "p90": int(np.percentile(lengths, 90)),
+        "p99": int(np.percentile(lengths, 99)),
+        "max": int(lengths.max()),
+        "cutoff_len": cutoff_len,
+        "truncated": truncated,
+        "truncated_ratio": truncated / len(lengths),
+        "histogram": [
+            {"range": f"{edges[i]}-{edges[i + 1] - 1}", "count": int(count)}
+            for i, count in enumerate(counts) if count
+        ],
+    }
+
+
+def print_length_report(report: Dict[str, Any]) -> None:
+    """길이 히스토그램 출력"""
+    if not report.get("count"):
+        print("⚠️ 토큰화된 샘플이 없습니다.")
+        return
+
+    print(f"📊 샘플 수: {report['count']:,}개 / 전체 토큰: {report['total_tokens']:,}")
+    print(f"📏 길이: 평균 {report['mean']:.0f} / p50 {report['p50']} / p90 {report['p90']} / p99 {report['p99']} / 최대 {report['max']}")
+    print(f"✂️  cutoff_len {report['cutoff_len']} 초과 (잘림): {report['truncated']:,}개 ({report['truncated_ratio']:.1%})")
+    peak = max(bucket["count"] for bucket in report["histogram"])
+    for bucket in report["histogram"]:
+        bar = "█" * max(1, round(bucket["count"] / peak * 40))
+        print(f"  {bucket['range']:>11} | {bar} {bucket['count']:,}")
+
+
+def _open_memmap(path: str, dtype: Any) -> np.ndarray:
+    """읽기 전용 memmap (빈 파일은 memmap할 수 없으므로 빈 배열)"""
+    if os.path.getsize(path):
+        return np.memmap(path, dtype=dtype, mode='r')
+    return np.zeros(0, dtype=dtype)
+
+
+class TokenCache:
+    """오프셋 색인 memmap 토큰 캐시 (읽기 전용, 복사 없이 접근)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.offsets = _open_memmap(os.path.join(path, "offsets.bin"), OFFSET_DTYPE)
+        if not len(self.offsets):
+            self.offsets = np.zeros(1, dtype=OFFSET_DTYPE)
+        self.prompt_lens = _open_memmap(os.path.join(path, "prompt_lens.bin"), np.int32)
+        self.tokens = _open_memmap(os.path.join(path, "tokens.bin"), TOKEN_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        """샘플 하나의 토큰 ID (memmap 뷰)"""
+        return self.tokens[self.offsets[index]:self.offsets[index + 1]]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def labels(self, index: int, ignore_index: int = -100) -> np.ndarray:
+        """프롬프트 부분을 ignore_index로 가린 학습 레이블"""
+        labels = self[index].astype(np.int64)
+        labels[:self.prompt_lens[index]] = ignore_index
+        return labels
+
+
+def build_token_cache(tokenizer: Any, filenames: List[str], cache_dir: str = DEFAULT_CACHE_DIR,
+                      cutoff_len: int = CUTOFF_LEN, batch_size: int = DEFAULT_BATCH_SIZE,
+                      force: bool = False) -> TokenCache:
+    """캐시가 없으면 토큰화해서 만들고, 있으면 그대로 불러오기"""
+
+    key = cache_key(tokenizer, filenames)
+    path = os.path.join(cache_dir, key)
+    if os.path.exists(os.path.join(path, "meta.json")) and not force:
+        print(f"⚡ 토큰 캐시 적중: {path}")
+        return TokenCache(path)
+
+    print(f"🔤 토큰화 중... ({len(filenames)}개 파일)")
+    start_time = time.time()
+
+    # 임시 디렉터리에 쓴 뒤 이름을 바꿔 중간 상태의 캐시가 보이지 않게 함
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    offsets = [0]
+    prompt_lens = []
+    with open(os.path.join(tmp_path, "tokens.bin"), 'wb') as f:
+        for ids, prompt_len in iter_encoded(tokenizer, iter_jsonl_files(filenames), batch_size):
+            f.write(np.asarray(ids, dtype=TOKEN_DTYPE).tobytes())
+            offsets.append(offsets[-1] + len(ids))
+            prompt_lens.append(prompt_len)
+
+    np.asarray(offsets, dtype=OFFSET_DTYPE).tofile(os.path.join(tmp_path, "offsets.bin"))
+    np.asarray(prompt_lens, dtype=np.int32).tofile(os.path.join(tmp_path, "prompt_lens.bin"))
+
+    lengths = np.diff(np.asarray(offsets, dtype=OFFSET_DTYPE))
+    meta = {
+        "key": key,
+        "tokenizer": getattr(tokenizer, "name_or_path", ""),
+        "tokenizer_hash": tokenizer_fingerprint(tokenizer),
+        "dataset_files": [os.path.basename(filename) for filename in filenames],
+        "dataset_hash": dataset_fingerprint(filenames),
+        "template": "qwen",
+        "token_dtype": np.dtype(TOKEN_DTYPE).name,
+        "elapsed_sec": time.time() - start_time,
+        "length_report": length_report(lengths, cutoff_len),
+    }
+    with open(os.path.join(tmp_path, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    print(f"✅ 토큰 캐시 저장 완료: {path} ({meta['elapsed_sec']:.2f}초)")
+    return TokenCache(path)
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="Big5 데이터셋 토큰 길이 프로파일 + 토큰 캐시")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--tokenizer", default="Qwen/Qwen2-1.5B")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--cutoff-len", type=int, default=CUTOFF_LEN)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--force", action="store_true", help="캐시가 있어도 다시 토큰화")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+
+    print("🚀 토큰 길이 프로파일링 시작...")
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer, trust_remote_code=True)
+
+    cache = build_token_cache(tokenizer, args.files, args.cache_dir, args.cutoff_len, args.batch_size, args.force)
+    report = cache.meta["length_report"]
+    if report.get("count") and report["cutoff_len"] != args.cutoff_len:
+        report = length_report(cache.lengths, args.cutoff_len)
+    print_length_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+반복 단위(continuous) 배치 생성 엔진
+요청마다 generate를 따로 돌리지 않고, 하나의 디코드 루프가 실행 중인 모든 요청을
+한 배치로 한 토큰씩 진행하며 매 단계 새 요청을 합류시키고 끝난 요청을 제거
+KV 캐시는 왼쪽 패딩으로 길이를 맞춰 배치 차원으로 이어붙임
+"""
+
+import contextlib
+import itertools
+import queue
+import threading
+import time
+from typing import List, Dict, Any, Callable, ContextManager, Iterator, Optional, Tuple
+
+import torch
+
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_WAITING = 32
+
+
+class EngineOverloaded(Exception):
+    """대기열이 가득 차서 요청을 받을 수 없음 (HTTP 429로 전달)"""
+
+
+def cache_layers(cache: Any) -> List[Tuple[torch.Tensor, torch.Tensor]]:
+    """DynamicCache의 층별 (key, value) 텐서 [batch, heads, seq, dim]"""
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+
+def build_cache(layers: List[Tuple[torch.Tensor, torch.Tensor]]) -> Any:
+    """층별 (key, value) 텐서로 DynamicCache 생성"""
+    from transformers import DynamicCache
+
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(layers))
+    return DynamicCache(ddp_cache_data=layers)
+
+
+def left_pad(tensor: torch.Tensor, length: int, dim: int) -> torch.Tensor:
+    """dim 축 왼쪽을 0으로 채워 길이 맞추기"""
+    missing = length - tensor.shape[dim]
+    if missing <= 0:
+        return tensor
+    shape = list(tensor.shape)
+    shape[dim] = missing
+    return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
+
+def sample_token(logits: torch.Tensor, temperature: float, top_p: float, top_k: int,
+                 generator: Optional[torch.Generator] = None) -> int:
+    """한 행의 로짓에서 다음 토큰 선택 (temperature <= 0이면 greedy)"""
+    if temperature <= 0:
+        return int(torch.argmax(logits))
+
+    logits = logits.float() / temperature
+    if top_k > 0:
+        kth = torch.topk(logits, min(top_k, logits.shape[-1])).values[-1]
+        logits = logits.masked_fill(logits < kth, float("-inf"))
+    probs = torch.softmax(logits, dim=-1)
+    if top_p < 1.0:
+        sorted_probs, sorted_ids = torch.sort(probs, descending=True)
+        # 누적 확률이 top_p를 넘기 전까지의 토큰만 남김 (최소 1개)
+        remove = sorted_probs.cumsum(dim=-1) - sorted_probs > top_p
+        sorted_probs = sorted_probs.masked_fill(remove, 0.0)
+        choice = torch.multinomial(sorted_probs / sorted_probs.sum(), 1, generator=generator)
+        return int(sorted_ids[choice])
+    return int(torch.multinomial(probs, 1, generator=generator))
+
+
+class GenerationRequest:
+    """엔진에 넣는 생성 요청 하나 (토큰은 events 큐로 흘려보냄)"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, prompt_ids: List[int], max_new_tokens: int = 256, temperature: float = 0.7,
+                 top_p: float = 0.9, top_k: int = 50, stop_token_ids: Optional[List[int]] = None,
+                 seed: Optional[int] = None, prefix_len: int = 0,
+                 logits_processor: Optional[Callable[[List[int], torch.Tensor], torch.Tensor]] = None,
+                 adapter: Optional[str] = None):
+        self.id = next(self._ids)
+        self.prompt_ids = list(prompt_ids)
+        self.prefix_len = prefix_len  # 접두사 KV 캐시로 대신할 앞부분 토큰 수
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.top_k = top_k
+        self.stop_token_ids = set(stop_token_ids or [])
+        # (지금까지의 생성 토큰, 다음 토큰 로짓) → 제한된 로짓 (예: report_decoding.ReportDecoder.process)
+        self.logits_processor = logits_processor
+        # 등록된 LoRA 어댑터 이름 (None이면 기반 모델, 엔진이 submit 시 인덱스로 변환)
+        self.adapter = adapter
+        self.adapter_index = 0
+        self.generator = None
+        if seed is not None:
+            self.generator = torch.Generator().manual_seed(seed)
+
+        self.output_ids: List[int] = []
+        self.finish_reason: Optional[str] = None
+        self.cancelled = False
+        self.events: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+        self.submitted_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def cancel(self) -> None:
+        """클라이언트 연결이 끊긴 경우 등 (다음 단계에서 배치에서 제거)"""
+        self.cancelled = True
+
+    def emit(self, token_id: int) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.output_ids.append(token_id)
+        self.events.put(("token", token_id))
+
+    def finish(self, reason: str) -> None:
+        self.finish_reason = reason
+        self.finished_at = time.perf_counter()
+        self.events.put(("done", reason))
+
+    def iter_tokens(self) -> Iterator[int]:
+        """생성되는 토큰 ID를 순서대로 반환 (완료 시 종료)"""
+        while True:
+            kind, value = self.events.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+
+    def result(self) -> List[int]:
+        """완료될 때까지 기다린 뒤 전체 생성 토큰 반환"""
+        for _ in self.iter_tokens():
+            pass
+        return self.output_ids
+
+
+class ContinuousBatchingEngine:
+    """하나의 디코드 루프를 동시 요청들이 공유하는 생성 엔진"""
+
+    def __init__(self, model: Any, tokenizer: Any, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_waiting: int = DEFAULT_MAX_WAITING, prefix_cache: Optional[Any] = None,
+                 adapters: Optional[Any] = None):
+        self.model = model
+        self.prefix_cache = prefix_cache
+        self.adapters = adapters  # multi_lora.AdapterRegistry (행별 LoRA 적용)
+        self.tokenizer = tokenizer
+        self.device = next(model.parameters()).device
+        self.max_batch_size = max_batch_size
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+        # 대기열 크기로 배압 적용: 가득 차면 submit이 EngineOverloaded
+        self.waiting: "queue.Queue[GenerationRequest]" = queue.Queue(maxsize=max_waiting)
+        self.active: List[GenerationRequest] = []
+        self.cache: Any = None
+        self.attention_mask: Optional[torch.Tensor] = None  # [batch, seq]
+        self.positions: Optional[torch.Tensor] = None       # 행별 다음 position id
+        self.next_tokens: Optional[torch.Tensor] = None     # 행별 다음 입력 토큰
+
+        self.metrics = {"requests": 0, "rejected": 0, "steps": 0, "generated_tokens": 0, "batch_rows": 0}
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- 외부 API ----
+
+    def start(self) -> "ContinuousBatchingEngine":
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="batching-engine", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def submit(self, request: GenerationRequest) -> GenerationRequest:
+        """요청을 대기열에 추가 (대기열이 가득 차면 EngineOverloaded, 없는 어댑터면 KeyError)"""
+        if request.adapter is not None:
+            if self.adapters is None:
+                raise KeyError(request.adapter)
+            request.adapter_index = self.adapters.acquire(request.adapter)
+        try:
+            self.waiting.put_nowait(request)
+        except queue.Full:
+            self._release(request)
+            self.metrics["rejected"] += 1
+            raise EngineOverloaded(f"대기 중인 요청이 {self.waiting.maxsize}개를 넘었습니다")
+        self.metrics["requests"] += 1
+        self._wakeup.set()
+        return request
+
+    def stats(self) -> Dict[str, Any]:
+        steps = self.metrics["steps"]
+        stats = dict(self.metrics, active=len(self.active), waiting=self.waiting.qsize(),
+                     avg_batch_size=self.metrics["batch_rows"] / steps if steps else 0.0)
+        if self.prefix_cache is not None:
+            stats["prefix_cache"] = self.prefix_cache.stats()
+        if self.adapters is not None:
+            stats["adapters"] = self.adapters.stats()
+        return stats
+
+    # ---- 디코드 루프 ----
+
+    def _loop(self) -> None:
+        while self._running:
+            if not self.active and self.waiting.empty():
+                self._wakeup.wait(timeout=0.1)
+                self._wakeup.clear()
+                continue
+            try:
+                with torch.no_grad():
+                    self._admit()
+                    if self.active:
+                        self._step()
+            except Exception as e:
+                for request in self.active:
+                    self._release(request)
+                    request.events.put(("error", e))
+                self._reset()
+
+    def _reset(self) -> None:
+        self.active = []
+        self.cache = self.attention_mask = self.positions = self.next_tokens = None
+
+    def _admit(self) -> None:
+        """빈 자리만큼 대기 요청을 꺼내 함께 프리필하고 실행 배치에 합류"""
+        group = []
+        while len(self.active) + len(group) < self.max_batch_size:
+            try:
+                request = self.waiting.get_nowait()
+            except queue.Empty:
+                break
+            if not request.cancelled:
+                group.append(request)
+            else:
+                self._release(request)
+        if not group:
+            return
+
+        # 같은 접두사를 쓰는 요청끼리 묶어서 프리필 (접두사 KV는 어댑터마다 다르므로 어댑터도 키에 포함)
+        partitions: Dict[Tuple[int, Tuple[int, ...]], List[GenerationRequest]] = {}
+        for request in group:
+            prefix = tuple(request.prompt_ids[:request.prefix_len]) if self.prefix_cache is not None else ()
+            key = (request.adapter_index if prefix else 0, prefix)
+            partitions.setdefault(key, []).append(request)
+
+        for (_, prefix_ids), partition in partitions.items():
+            try:
+                cache, mask, logits = self._prefill(partition, list(prefix_ids))
+                next_tokens = [self._sample(request, logits[i]) for i, request in enumerate(partition)]
+            except Exception as e:
+                # 프리필 실패는 새 묶음에만 전달하고 실행 중인 배치는 계속 진행
+                for request in partition:
+                    self._release(request)
+                    request.events.put(("error", e))
+                continue
+
+            positions = mask.sum(dim=1)
+            self._merge(partition, cache, mask, positions, torch.tensor(next_tokens, device=self.device))
+            # 새 묶음은 배치 끝에 붙으므로 마지막 len(partition)개 행
+            self._emit(next_tokens, start=len(self.active) - len(partition))
+
+    def _prefill(self, group: List[GenerationRequest],
+                 prefix_ids: List[int]) -> Tuple[Any, torch.Tensor, torch.Tensor]:
+        """새 요청 묶음의 프롬프트 프리필 → (KV 캐시, 어텐션 마스크, 마지막 위치 로짓)
+
+        접두사가 있으면 캐시된 접두사 KV 뒤에 나머지만 프리필한다.
+        레이아웃은 [접두사][패딩][나머지]이고 패딩은 마스크로 가린다.
+        """
+        suffixes = [request.prompt_ids[len(prefix_ids):] for request in group]
+        length = max(len(suffix) for suffix in suffixes)
+        input_ids = torch.tensor([[self.pad_token_id] * (length - len(s)) + s for s in suffixes], device=self.device)
+        mask = torch.tensor([[1] * len(prefix_ids) + [0] * (length - len(s)) + [1] * len(s) for s in suffixes],
+                            device=self.device)
+
+        if prefix_ids:
+            batch_size = len(group)
+            with self._route(group[:1]):
+                layers = self.prefix_cache.get(prefix_ids, namespace=group[0].adapter_index)
+            past = build_cache([(k.expand(batch_size, -1, -1, -1), v.expand(batch_size, -1, -1, -1))
+                                for k, v in layers])
+        else:
+            past = build_cache([])
+
+        position_ids = (mask.cumsum(dim=1) - 1).clamp(min=0)[:, len(prefix_ids):]
+        with self._route(group):
+            outputs = self.model(input_ids=input_ids, attention_mask=mask, position_ids=position_ids,
+                                 past_key_values=past, use_cache=True)
+        return outputs.past_key_values, mask, outputs.logits[:, -1]
+
+    def _merge(self, group: List[GenerationRequest], cache: Any, mask: torch.Tensor,
+               positions: torch.Tensor, next_tokens: torch.Tensor) -> None:
+        """실행 중 배치와 새 묶음을 왼쪽 패딩으로 길이를 맞춰 배치 차원으로 결합"""
+        if not self.active:
+            self.active, self.cache, self.attention_mask = group, cache, mask
+            self.positions, self.next_tokens = positions, next_tokens
+            return
+
+        length = max(self.attention_mask.shape[1], mask.shape[1])
+        layers = [
+            (torch.cat([left_pad(k1, length, 2), left_pad(k2, length, 2)]),
+             torch.cat([left_pad(v1, length, 2), left_pad(v2, length, 2)]))
+            for (k1, v1), (k2, v2) in zip(cache_layers(self.cache), cache_layers(cache))
+        ]
+        self.cache = build_cache(layers)
+        self.attention_mask = torch.cat([left_pad(self.attention_mask, length, 1), left_pad(mask, length, 1)])
+        self.positions = torch.cat([self.positions, positions])
+        self.next_tokens = torch.cat([self.next_tokens, next_tokens])
+        self.active = self.active + group
+
+    def _step(self) -> None:
+        """실행 중인 모든 요청을 한 토큰 진행"""
+        batch_size = len(self.active)
+        self.attention_mask = torch.cat([self.attention_mask, self.attention_mask.new_ones(batch_size, 1)], dim=1)
+        with self._route(self.active):
+            outputs = self.model(input_ids=self.next_tokens[:, None], attention_mask=self.attention_mask,
+                                 position_ids=self.positions[:, None], past_key_values=self.cache, use_cache=True)
+        self.cache = outputs.past_key_values
+        self.positions = self.positions + 1
+
+        logits = outputs.logits[:, -1]
+        next_tokens = [self._sample(request, logits[i]) for i, request in enumerate(self.active)]
+        self.next_tokens = torch.tensor(next_tokens, device=self.device)
+        self.metrics["steps"] += 1
+        self.metrics["batch_rows"] += batch_size
+        self._emit(next_tokens)
+
+    def _route(self, requests: List[GenerationRequest]) -> ContextManager[None]:
+        """요청 행 순서대로 어댑터를 적용한 forward 문맥 (어댑터가 없으면 아무것도 하지 않음)"""
+        if self.adapters is None:
+            return contextlib.nullcontext()
+        return self.adapters.route([request.adapter_index for request in requests])
+
+    def _release(self, request: GenerationRequest) -> None:
+        if self.adapters is not None:
+            self.adapters.release(request.adapter_index)
+            request.adapter_index = 0
+
+    def _sample(self, request: GenerationRequest, logits: torch.Tensor) -> int:
+        if request.logits_processor is not None:
+            logits = request.logits_processor(request.output_ids, logits)
+        return sample_token(logits, request.temperature, request.top_p, request.top_k, request.generator)
+
+    def _emit(self, next_tokens: List[int], start: int = 0) -> None:
+        """샘플된 토큰을 start번째 행부터 요청에 전달하고 끝난 요청을 배치에서 제거"""
+        keep = list(range(start))
+        for i, token_id in enumerate(next_tokens, start=start):
+            request = self.active[i]
+            if request.cancelled:
+                self._release(request)
+                request.finish("cancelled")
+                continue
+            request.emit(token_id)
+            self.metrics["generated_tokens"] += 1
+            if token_id in request.stop_token_ids:
+                self._release(request)
+                request.finish("stop")
+            elif len(request.output_ids) >= request.max_new_tokens:
+                self._release(request)
+                request.finish("length")
+            else:
+                keep.append(i)
+
+        if len(keep) == len(self.active):
+            return
+        if not keep:
+            self._reset()
+            return
+        self._select(keep)
+
+    def _select(self, keep: List[int]) -> None:
+        """남은 행만 선택하고 모든 행에서 패딩인 앞쪽 열은 잘라냄"""
+        index = torch.tensor(keep, device=self.device)
+        mask = self.attention_mask[index]
+        start = int(mask.any(dim=0).int().argmax())
+        self.cache = build_cache([(k[index, :, start:], v[index, :, start:]) for k, v in cache_layers(self.cache)])
+        self.attention_mask = mask[:, start:]
+        self.positions = self.positions[index]
+        self.next_tokens = self.next_tokens[index]
+        self.active = [self.active[i] for i in keep]
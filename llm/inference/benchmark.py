@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Qwen2 배치 생성 벤치마크
+배치 크기 × 프롬프트 길이 × max_new_tokens 조합을 워밍업 후 반복 측정하고
+스트리머 타임스탬프로 TTFT(첫 토큰까지 시간)와 토큰 간 지연을 기록
+생성 토큰 수는 출력 텐서에서 직접 계산 (재인코딩 없음)
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import List, Dict, Any, Iterable, Optional
+
+import numpy as np
+import torch
+from transformers.generation.streamers import BaseStreamer
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+sys.path.insert(0, DATA_DIR)
+
+from jsonl_io import iter_jsonl
+from token_cache import render_chatml
+from model_loader import DEFAULT_MODEL, DTYPES, default_device, load_model_and_tokenizer
+
+DEFAULT_DATASET = os.path.join(DATA_DIR, "big5_dataset_100.jsonl")
+END_OF_TURN = "<|im_end|>"
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "benchmarks")
+
+RESULT_COLUMNS = [
+    "batch_size", "prompt_tokens", "max_new_tokens", "trials",
+    "latency_sec", "latency_p95_sec", "ttft_sec", "ttft_p95_sec",
+    "itl_ms", "itl_p95_ms", "generated_tokens", "tokens_per_sec",
+]
+
+
+class TimingStreamer(BaseStreamer):
+    """generate 스트리머 훅으로 디코딩 단계별 시각 기록
+
+    첫 put은 프롬프트이므로 시작 시각으로만 쓰고, 이후 put마다 한 단계(배치 전체 토큰 1개씩)
+    """
+
+    def __init__(self):
+        self.start_time: Optional[float] = None
+        self.step_times: List[float] = []
+
+    def put(self, value: torch.Tensor) -> None:
+        now = time.perf_counter()
+        if self.start_time is None:
+            self.start_time = now
+        else:
+            self.step_times.append(now)
+
+    def end(self) -> None:
+        pass
+
+    @property
+    def ttft(self) -> float:
+        return self.step_times[0] - self.start_time if self.step_times else 0.0
+
+    @property
+    def inter_token_latencies(self) -> List[float]:
+        return list(np.diff(self.step_times))
+
+
+def count_generated_tokens(output_ids: torch.Tensor, prompt_len: int, eos_token_ids: Iterable[int]) -> int:
+    """배치 출력에서 실제 생성 토큰 수 (각 행의 첫 EOS까지, EOS 포함)"""
+    generated = output_ids[:, prompt_len:]
+    if generated.numel() == 0:
+        return 0
+    is_eos = torch.isin(generated, torch.tensor(list(eos_token_ids), device=generated.device))
+    # 첫 EOS 이후(패딩)는 제외
+    after_eos = (is_eos.cumsum(dim=1) - is_eos.long()) > 0
+    return int((~after_eos).sum())
+
+
+def end_of_turn_id(tokenizer: Any) -> Optional[int]:
+    """ChatML 턴 종료 토큰(<|im_end|>) id (어휘에 없으면 None)"""
+    token_id = tokenizer.convert_tokens_to_ids(END_OF_TURN)
+    if token_id is None or token_id == tokenizer.unk_token_id:
+        return None
+    return token_id
+
+
+def eos_ids(model: Any, tokenizer: Any) -> List[int]:
+    """생성 종료 토큰: generation_config EOS + 토크나이저 EOS + ChatML 턴 종료 (기반 모델 토크나이저는 EOS가 <|endoftext|>)"""
+    config_eos = getattr(getattr(model, "generation_config", None), "eos_token_id", None)
+    candidates = config_eos if isinstance(config_eos, list) else [config_eos]
+    candidates = candidates + [tokenizer.eos_token_id, end_of_turn_id(tokenizer)]
+    return list(dict.fromkeys(token_id for token_id in candidates if token_id is not None))
+
+
+def load_prompt_pool(tokenizer: Any, dataset: str = DEFAULT_DATASET, limit: int = 64) -> List[List[int]]:
+    """데이터셋의 실제 시스템+사용자 프롬프트 토큰 (ChatML, 생성 프롬프트 포함)"""
+    pool = []
+    for item in iter_jsonl(dataset):
+        text = render_chatml(item["messages"][:-1], add_generation_prompt=True)
+        pool.append(tokenizer(text, add_special_tokens=False)["input_ids"])
+        if len(pool) >= limit:
+            break
+    return pool
+
+
+def make_batch(pool: List[List[int]], batch_size: int, prompt_tokens: int, offset: int = 0) -> torch.Tensor:
+    """길이를 prompt_tokens로 맞춘 프롬프트 배치 (짧으면 반복, 길면 앞부분을 잘라 생성 프롬프트 보존)
+
+    배치 안 길이가 같으므로 패딩 없이 측정된다.
+    """
+    rows = []
+    for i in range(batch_size):
+        ids = pool[(offset + i) % len(pool)]
+        while len(ids) < prompt_tokens:
+            ids = ids + ids
+        rows.append(ids[-prompt_tokens:])
+    return torch.tensor(rows, dtype=torch.long)
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def run_case(model: Any, tokenizer: Any, pool: List[List[int]], batch_size: int, prompt_tokens: int,
+             max_new_tokens: int, trials: int = 3, warmup: int = 1,
+             generate_kwargs: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """한 조합을 warmup회 버린 뒤 trials회 측정"""
+
+    device = next(model.parameters()).device
+    eos = eos_ids(model, tokenizer)
+    kwargs = {
+        "max_new_tokens": max_new_tokens,
+        "do_sample": False,
+        "pad_token_id": tokenizer.pad_token_id if tokenizer.pad_token_id is not None else eos[0],
+        "eos_token_id": eos,
+    }
+    kwargs.update(generate_kwargs or {})
+
+    latencies, ttfts, itls, token_counts = [], [], [], []
+    for trial in range(warmup + trials):
+        input_ids = make_batch(pool, batch_size, prompt_tokens, offset=trial * batch_size).to(device)
+        streamer = TimingStreamer()
+        start_time = time.perf_counter()
+        with torch.no_grad():
+            output_ids = model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids),
+                                        streamer=streamer, **kwargs)
+        if device.type == "mps":
+            torch.mps.synchronize()
+        elapsed = time.perf_counter() - start_time
+        if trial < warmup:
+            continue
+        latencies.append(elapsed)
+        ttfts.append(streamer.ttft)
+        itls.extend(streamer.inter_token_latencies)
+        token_counts.append(count_generated_tokens(output_ids, input_ids.shape[1], eos))
+
+    total_time = sum(latencies)
+    return {
+        "batch_size": batch_size,
+        "prompt_tokens": prompt_tokens,
+        "max_new_tokens": max_new_tokens,
+        "trials": trials,
+        "latency_sec": float(np.mean(latencies)),
+        "latency_p95_sec": percentile(latencies, 95),
+        "ttft_sec": float(np.mean(ttfts)),
+        "ttft_p95_sec": percentile(ttfts, 95),
+        "itl_ms": float(np.mean(itls)) * 1000 if itls else 0.0,
+        "itl_p95_ms": percentile(itls, 95) * 1000,
+        "generated_tokens": int(sum(token_counts)),
+        "tokens_per_sec": sum(token_counts) / total_time if total_time else 0.0,
+    }
+
+
+def run_sweep(model: Any, tokenizer: Any, batch_sizes: List[int], prompt_lengths: List[int],
+              max_new_tokens: List[int], trials: int = 3, warmup: int = 1, dataset: str = DEFAULT_DATASET,
+              generate_kwargs: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """모든 조합 측정"""
+    pool = load_prompt_pool(tokenizer, dataset)
+    results = []
+    for batch_size, prompt_tokens, new_tokens in itertools.product(batch_sizes, prompt_lengths, max_new_tokens):
+        result = run_case(model, tokenizer, pool, batch_size, prompt_tokens, new_tokens, trials, warmup, generate_kwargs)
+        print(f"  bs={batch_size:<3} prompt={prompt_tokens:<5} new={new_tokens:<4} "
+              f"TTFT {result['ttft_sec'] * 1000:7.1f}ms  ITL {result['itl_ms']:6.1f}ms  "
+              f"{result['tokens_per_sec']:8.1f} tok/s")
+        results.append(result)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def environment_info(model_name: str, dtype: str, device: torch.device) -> Dict[str, Any]:
+    """커밋 간 비교용 실행 환경"""
+    return {
+        "commit": git_commit(),
+        "model": model_name,
+        "dtype": dtype,
+        "device": str(device),
+        "torch": torch.__version__,
+        "threads": torch.get_num_threads(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def write_results(results: List[Dict[str, Any]], environment: Dict[str, Any], output_dir: str,
+                  name: str = "benchmark") -> Dict[str, str]:
+    """JSON(환경 + 결과)과 CSV(결과 행) 저장"""
+    os.makedirs(output_dir, exist_ok=True)
+    stem = f"{name}_{environment['commit'] or 'nocommit'}"
+    json_path = os.path.join(output_dir, f"{stem}.json")
+    csv_path = os.path.join(output_dir, f"{stem}.csv")
+
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({"environment": environment, "results": results}, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+    columns = RESULT_COLUMNS + sorted({key for row in results for key in row} - set(RESULT_COLUMNS))
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(results)
+
+    return {"json": json_path, "csv": csv_path}
+
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="Qwen2 배치 생성 벤치마크")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float16")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--batch-sizes", type=parse_int_list, default=[1, 4])
+    parser.add_argument("--prompt-lengths", type=parse_int_list, default=[128, 512])
+    parser.add_argument("--max-new-tokens", type=parse_int_list, default=[64])
+    parser.add_argument("--trials", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--name", default="benchmark")
+    parser.add_argument("--quantize", choices=["none", "int8", "int4"], default="none",
+                        help="CPU 양자화 경로 (int8/int4면 CPU fp32로 로드 후 변환)")
+    args = parser.parse_args()
+
+    device = torch.device(args.device) if args.device else default_device()
+    if args.quantize != "none":
+        from quantization import load_quantized_model
+
+        device, args.dtype = torch.device("cpu"), "float32"
+        model, tokenizer, timings = load_quantized_model(args.model, args.quantize)
+    else:
+        model, tokenizer, timings = load_model_and_tokenizer(args.model, args.dtype, device)
+
+    print(f"🚀 생성 벤치마크 시작... ({args.model}, {args.dtype}, {device})")
+    results = run_sweep(model, tokenizer, args.batch_sizes, args.prompt_lengths, args.max_new_tokens,
+                        args.trials, args.warmup, args.dataset)
+
+    environment = environment_info(args.model, args.dtype, device)
+    environment["load_timings"] = timings
+    environment["quantize"] = args.quantize
+    paths = write_results(results, environment, args.output_dir, args.name)
+    print(f"📁 결과: {paths['json']}")
+    print(f"📁 결과: {paths['csv']}")
+
+if __name__ == "__main__":
+    main()
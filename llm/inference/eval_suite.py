@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Big5 리포트 품질·지연 자동 평가
+학습 JSONL에서 사용자 답변 해시로 고정된 held-out 분할을 골라 배치 엔진으로 재생하고,
+- 섹션 완성도 (dataset_validator.REQUIRED_SECTIONS 포함 비율)
+- 특성 수준 일치 (골든 '### 특성 (Trait): 수준' 대비 정확/한 단계 이내/파싱 실패)
+- 반복률 (생성 토큰 n-gram 중 중복 비율), 금지 표현 적중
+- 지연 p50/p95, TTFT, 생성 토큰 수
+를 체크포인트별로 diff 가능한 JSON(항목 순서·소수 자릿수 고정)과 마크다운 리포트로 저장
+--workers N이면 held-out을 N개 샤드로 나눠 CPU 워커 프로세스(스레드 수·코어 고정)에서 평가하고
+샤드별 부분 결과(part-*.json)를 합쳐 같은 리포트를 만든다
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+import torch
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+sys.path.insert(0, DATA_DIR)
+
+from big5_labels import BIG5_TRAITS, TRAIT_LEVELS, parse_trait_levels
+from dataset_validator import FORBIDDEN_PATTERNS, REQUIRED_SECTIONS
+from heldout import HELDOUT_FRACTION, is_heldout_key, item_key
+from jsonl_io import iter_jsonl
+from token_cache import render_chatml
+from batching import ContinuousBatchingEngine, GenerationRequest
+from benchmark import DEFAULT_OUTPUT_DIR, environment_info, eos_ids, percentile
+from model_loader import DEFAULT_MODEL, DTYPES, default_device, load_model_and_tokenizer, load_tokenizer
+from report_decoding import REPEAT_NGRAM, ReportDecoder, max_report_tokens
+
+DEFAULT_EVAL_DIR = os.path.join(os.path.dirname(DEFAULT_OUTPUT_DIR), "eval")
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_MAX_NEW_TOKENS = 768
+PRECISION = 4
+
+
+def heldout_split(filenames: Optional[List[str]] = None, fraction: float = HELDOUT_FRACTION) -> List[Dict[str, Any]]:
+    """해시 구간으로 고른 held-out 항목 (학습 데이터셋에서는 heldout.exclude_heldout으로 제외됨)"""
+    filenames = filenames or sorted(glob.glob(os.path.join(DATA_DIR, "*.jsonl")))
+    items: Dict[str, Dict[str, Any]] = {}
+    for filename in filenames:
+        for item in iter_jsonl(filename):
+            messages = item.get("messages") or []
+            if len(messages) != 3:
+                continue
+            key = item_key(item)
+            if key not in items and is_heldout_key(key, fraction):
+                items[key] = dict(item, id=key, source=os.path.basename(filename))
+    return [items[key] for key in sorted(items)]
+
+
+# ---- 점수 ----
+
+def repetition_rate(token_ids: List[int], n: int = REPEAT_NGRAM) -> float:
+    """n-gram 중 앞에서 이미 나온 것의 비율 (입력 문장을 통째로 되풀이하면 1에 가까움)"""
+    ngrams = [tuple(token_ids[i:i + n]) for i in range(len(token_ids) - n + 1)]
+    return 1 - len(set(ngrams)) / len(ngrams) if ngrams else 0.0
+
+
+def level_distance(a: str, b: str) -> int:
+    return abs(TRAIT_LEVELS.index(a) - TRAIT_LEVELS.index(b))
+
+
+def score_report(output: str, golden: str, token_ids: List[int]) -> Dict[str, Any]:
+    """생성 리포트 하나의 점수"""
+    golden_levels = parse_trait_levels(golden)
+    predicted = parse_trait_levels(output)
+    traits = {}
+    for trait in BIG5_TRAITS:
+        expected = golden_levels.get(trait)
+        if expected is None:
+            continue
+        level = predicted.get(trait)
+        traits[trait] = {"expected": expected, "predicted": level,
+                         "exact": level == expected,
+                         "within_one": level is not None and level_distance(level, expected) <= 1}
+    return {
+        "sections": [section for section in REQUIRED_SECTIONS if section in output],
+        "section_completeness": sum(section in output for section in REQUIRED_SECTIONS) / len(REQUIRED_SECTIONS),
+        "traits": traits,
+        "repetition_rate": repetition_rate(token_ids),
+        "forbidden": [pattern for pattern in FORBIDDEN_PATTERNS if pattern in output],
+    }
+
+
+def summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """항목 점수 → 전체 지표"""
+    traits = [trait for row in rows for trait in row["traits"].values()]
+    per_trait = {}
+    for name in BIG5_TRAITS:
+        scored = [row["traits"][name] for row in rows if name in row["traits"]]
+        if scored:
+            per_trait[name] = {"n": len(scored), "exact": float(np.mean([t["exact"] for t in scored])),
+                               "within_one": float(np.mean([t["within_one"] for t in scored]))}
+    latencies = [row["latency_sec"] for row in rows]
+    ttfts = [row["ttft_sec"] for row in rows]
+    tokens = [row["completion_tokens"] for row in rows]
+    return {
+        "items": len(rows),
+        "section_completeness": float(np.mean([row["section_completeness"] for row in rows])),
+        "complete_reports": float(np.mean([row["section_completeness"] == 1 for row in rows])),
+        "level_exact": float(np.mean([t["exact"] for t in traits])) if traits else 0.0,
+        "level_within_one": float(np.mean([t["within_one"] for t in traits])) if traits else 0.0,
+        "level_parsed": float(np.mean([t["predicted"] is not None for t in traits])) if traits else 0.0,
+        "per_trait": per_trait,
+        "repetition_rate": float(np.mean([row["repetition_rate"] for row in rows])),
+        "forbidden_hit_rate": float(np.mean([bool(row["forbidden"]) for row in rows])),
+        "truncated_rate": float(np.mean([row["finish_reason"] == "length" for row in rows])),
+        "latency_p50_sec": percentile(latencies, 50),
+        "latency_p95_sec": percentile(latencies, 95),
+        "ttft_p50_sec": percentile(ttfts, 50),
+        "ttft_p95_sec": percentile(ttfts, 95),
+        "completion_tokens_mean": float(np.mean(tokens)),
+        "completion_tokens_p95": percentile(tokens, 95),
+        "tokens_per_sec": sum(tokens) / sum(latencies) if sum(latencies) else 0.0,
+    }
+
+
+def rounded(value: Any) -> Any:
+    """diff가 흔들리지 않도록 소수 자릿수 고정"""
+    if isinstance(value, float):
+        return round(value, PRECISION)
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [rounded(item) for item in value]
+    return value
+
+
+# ---- 실행 ----
+
+def run_eval(engine: ContinuousBatchingEngine, items: List[Dict[str, Any]], batch_size: int = DEFAULT_BATCH_SIZE,
+             max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS, structured: bool = False,
+             adapter: Optional[str] = None) -> List[Dict[str, Any]]:
+    """batch_size개씩 동시에 제출해 greedy 생성 후 채점 (지연은 묶음 안에서 요청별 제출→완료)"""
+    tokenizer = engine.tokenizer
+    stop_token_ids = eos_ids(engine.model, tokenizer)
+    rows = []
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        requests = []
+        for item in batch:
+            prompt_ids = tokenizer(render_chatml(item["messages"][:2], add_generation_prompt=True),
+                                   add_special_tokens=False)["input_ids"]
+            requests.append(engine.submit(GenerationRequest(
+                prompt_ids, max_new_tokens=max_new_tokens, temperature=0, stop_token_ids=stop_token_ids,
+                logits_processor=ReportDecoder(tokenizer).process if structured else None, adapter=adapter)))
+
+        for item, request in zip(batch, requests):
+            output_ids = [token_id for token_id in request.result() if token_id not in stop_token_ids]
+            output = tokenizer.decode(output_ids, skip_special_tokens=True)
+            row = {"id": item["id"], "source": item["source"], "prompt_tokens": len(request.prompt_ids),
+                   "completion_tokens": len(request.output_ids), "finish_reason": request.finish_reason,
+                   "latency_sec": request.finished_at - request.submitted_at,
+                   "ttft_sec": request.first_token_at - request.submitted_at}
+            row.update(score_report(output, item["messages"][2]["content"], output_ids))
+            row["output"] = output
+            rows.append(row)
+        print(f"  {min(start + batch_size, len(items))}/{len(items)} 완료")
+    return rows
+
+
+def evaluate_items(items: List[Dict[str, Any]], model_name: str, dtype: str, device: torch.device,
+                   adapter_dir: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                   max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS, structured: bool = False) -> List[Dict[str, Any]]:
+    """모델(+어댑터)을 로드해 items를 평가한 항목별 결과"""
+    model, tokenizer, _ = load_model_and_tokenizer(model_name, dtype, device)
+    registry = adapter = None
+    if adapter_dir:
+        from multi_lora import AdapterRegistry
+
+        registry = AdapterRegistry(model)
+        adapter = registry.register(os.path.basename(os.path.normpath(adapter_dir)), adapter_dir)["name"]
+
+    engine = ContinuousBatchingEngine(model, tokenizer, batch_size, max(batch_size, 1) * 4, adapters=registry).start()
+    try:
+        return run_eval(engine, items, batch_size, max_new_tokens, structured, adapter)
+    finally:
+        engine.stop()
+
+
+# ---- 샤드 병렬 평가 ----
+
+def pin_worker(worker_index: int, threads: int) -> None:
+    """워커의 intra-op 스레드 수 고정, 가능하면 겹치지 않는 CPU 코어에 고정 (코어가 모자라면 스레드 수만)"""
+    torch.set_num_threads(threads)
+    if hasattr(os, "sched_setaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+        selected = cores[worker_index * threads:(worker_index + 1) * threads]
+        if len(selected) == threads:
+            os.sched_setaffinity(0, selected)
+
+
+def _eval_shard(shard: List[Dict[str, Any]], shard_index: int, threads: int, shard_dir: str,
+                options: Dict[str, Any]) -> str:
+    """워커에서 샤드 하나를 평가해 부분 결과 파일로 기록 (경로 반환)
+
+    safetensors 가중치는 mmap으로 로드하므로 저장 dtype과 같으면 워커들이 페이지 캐시를 공유한다.
+    """
+    pin_worker(shard_index, threads)
+    start_time = time.time()
+    rows = evaluate_items(shard, device=torch.device("cpu"), **options)
+    path = os.path.join(shard_dir, f"part-{shard_index:05d}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"shard": shard_index, "threads": threads, "worker_sec": time.time() - start_time,
+                   "ids": [item["id"] for item in shard], "items": rows}, f, ensure_ascii=False)
+    return path
+
+
+def merge_shards(paths: List[str]) -> List[Dict[str, Any]]:
+    """부분 결과 병합 (항목 ID 순으로 정렬해 단일 프로세스 결과와 같은 순서)"""
+    rows = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            rows.extend(json.load(f)["items"])
+    return sorted(rows, key=lambda row: row["id"])
+
+
+def evaluate_sharded(items: List[Dict[str, Any]], num_workers: int, shard_dir: str,
+                     threads: Optional[int] = None, **options) -> List[Dict[str, Any]]:
+    """items를 번갈아 num_workers개 샤드로 나눠(길이 편차 완화) 워커 프로세스에서 평가 후 병합"""
+    shards = [items[i::num_workers] for i in range(num_workers) if items[i::num_workers]]
+    threads = threads or max(1, (os.cpu_count() or 1) // len(shards))
+    os.makedirs(shard_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(shard_dir, "part-*.json")):
+        os.remove(stale)
+
+    # fork 후 torch 스레드 풀 상태를 물려받지 않도록 spawn
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(_eval_shard, shard, index, threads, shard_dir, options)
+                   for index, shard in enumerate(shards)]
+        paths = [future.result() for future in futures]
+    return merge_shards(paths)
+
+
+def checkpoint_name(model_name: str, adapter: Optional[str] = None) -> str:
+    parts = [os.path.basename(os.path.normpath(model_name))]
+    if adapter:
+        parts.append(os.path.basename(os.path.normpath(adapter)))
+    return "__".join(parts)
+
+
+def write_report(report: Dict[str, Any], output_dir: str, baseline: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """eval_<체크포인트>.json / .md 저장 (baseline이 있으면 마크다운에 지표 차이 표시)"""
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.join(output_dir, f"eval_{report['checkpoint']}")
+    with open(f"{stem}.json", 'w', encoding='utf-8') as f:
+        json.dump(rounded(report), f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+    with open(f"{stem}.md", 'w', encoding='utf-8') as f:
+        f.write(render_markdown(report, baseline))
+    return {"json": f"{stem}.json", "markdown": f"{stem}.md"}
+
+
+SUMMARY_ROWS = [
+    ("section_completeness", "섹션 완성도", "{:.1%}"),
+    ("complete_reports", "모든 섹션 포함 리포트", "{:.1%}"),
+    ("level_exact", "수준 정확 일치", "{:.1%}"),
+    ("level_within_one", "수준 한 단계 이내", "{:.1%}"),
+    ("level_parsed", "수준 헤더 파싱 성공", "{:.1%}"),
+    ("repetition_rate", f"반복률 ({REPEAT_NGRAM}-gram)", "{:.1%}"),
+    ("forbidden_hit_rate", "금지 표현 포함", "{:.1%}"),
+    ("truncated_rate", "길이 제한 도달", "{:.1%}"),
+    ("latency_p50_sec", "지연 p50 (초)", "{:.2f}"),
+    ("latency_p95_sec", "지연 p95 (초)", "{:.2f}"),
+    ("ttft_p50_sec", "TTFT p50 (초)", "{:.3f}"),
+    ("ttft_p95_sec", "TTFT p95 (초)", "{:.3f}"),
+    ("completion_tokens_mean", "평균 생성 토큰", "{:.0f}"),
+    ("tokens_per_sec", "tok/s", "{:.1f}"),
+]
+
+
+def render_markdown(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None, worst: int = 3) -> str:
+    summary = report["summary"]
+    lines = [f"# Big5 모델 평가: {report['checkpoint']}", "",
+             f"- 모델: `{report['model']}`" + (f" + 어댑터 `{report['adapter']}`" if report.get("adapter") else ""),
+             f"- held-out 항목: {summary['items']}개 (분할 {report['heldout_fraction']:.0%})",
+             f"- 디코딩: greedy, 최대 {report['max_new_tokens']} 토큰, 배치 {report['batch_size']}"
+             + (", 구조화 디코딩" if report["structured"] else ""),
+             f"- 평가 시간: {report['environment']['eval_sec']:.1f}초 "
+             f"(워커 {report['environment'].get('workers', 1)}개 × 스레드 {report['environment']['threads']})",
+             f"- 커밋: `{report['environment']['commit']}`", "", "## 📊 요약", ""]
+    header = "| 지표 | 값 |" + (f" {baseline['checkpoint']} | 차이 |" if baseline else "")
+    lines += [header, "|---|---:|" + ("---:|---:|" if baseline else "")]
+    for key, label, fmt in SUMMARY_ROWS:
+        line = f"| {label} | {fmt.format(summary[key])} |"
+        if baseline:
+            before = baseline["summary"].get(key, 0.0)
+            line += f" {fmt.format(before)} | {fmt.replace('{:', '{:+').format(summary[key] - before)} |"
+        lines.append(line)
+
+    lines += ["", "## 🎯 특성별 수준 일치", "", "| 특성 | n | 정확 | 한 단계 이내 |", "|---|---:|---:|---:|"]
+    for trait, scores in summary["per_trait"].items():
+        lines.append(f"| {trait} | {scores['n']} | {scores['exact']:.1%} | {scores['within_one']:.1%} |")
+
+    lines += ["", f"## ⚠️ 점수가 낮은 항목 (상위 {worst}개)", ""]
+    ranked = sorted(report["items"], key=lambda row: (row["section_completeness"], -row["repetition_rate"]))
+    for row in ranked[:worst]:
+        missing = [section for section in REQUIRED_SECTIONS if section not in row["sections"]]
+        lines += [f"### {row['id']} ({row['source']})",
+                  f"- 섹션 완성도 {row['section_completeness']:.0%}, 반복률 {row['repetition_rate']:.1%}, "
+                  f"생성 {row['completion_tokens']} 토큰, {row['latency_sec']:.2f}초",
+                  f"- 누락 섹션: {', '.join(missing) or '없음'}",
+                  "", "```", row["output"][:500].strip(), "```", ""]
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="Big5 리포트 품질·지연 자동 평가")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="평가할 체크포인트 (병합 모델 경로 또는 허브 이름)")
+    parser.add_argument("--adapter", default=None, help="기반 모델 위에 얹어 평가할 LoRA 어댑터 폴더")
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float16")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--dataset", action="append", default=None, help="평가 원본 JSONL (기본: data/*.jsonl)")
+    parser.add_argument("--heldout-fraction", type=float, default=HELDOUT_FRACTION)
+    parser.add_argument("--limit", type=int, default=None, help="held-out 항목 수 상한")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--max-new-tokens", type=int, default=None,
+                        help=f"생성 상한 (기본: {DEFAULT_MAX_NEW_TOKENS}, 구조화 디코딩은 섹션 예산 합)")
+    parser.add_argument("--structured", action="store_true", help="리포트 골격 구조화 디코딩으로 평가")
+    parser.add_argument("--workers", type=int, default=1, help="샤드 워커 프로세스 수 (CPU 전용)")
+    parser.add_argument("--threads", type=int, default=None, help="워커당 스레드 수 (기본: 코어 수 / 워커 수)")
+    parser.add_argument("--baseline", default=None, help="비교할 이전 eval_*.json")
+    parser.add_argument("--output-dir", default=DEFAULT_EVAL_DIR)
+    args = parser.parse_args()
+
+    items = heldout_split(args.dataset, args.heldout_fraction)[:args.limit]
+    sharded = args.workers > 1
+    device = torch.device("cpu") if sharded else torch.device(args.device) if args.device else default_device()
+    tokenizer, _ = load_tokenizer(args.model)
+    max_new_tokens = args.max_new_tokens or (max_report_tokens(tokenizer) if args.structured else DEFAULT_MAX_NEW_TOKENS)
+    options = {"model_name": args.model, "dtype": args.dtype, "adapter_dir": args.adapter,
+               "batch_size": args.batch_size, "max_new_tokens": max_new_tokens, "structured": args.structured}
+
+    checkpoint = checkpoint_name(args.model, args.adapter)
+    print(f"🚀 평가 시작... ({checkpoint}, held-out {len(items)}개, 배치 {args.batch_size}, {device}"
+          + (f", 워커 {args.workers}개" if sharded else "") + ")")
+    start_time = time.time()
+    environment = environment_info(args.model, args.dtype, device)
+    if sharded:
+        shard_dir = os.path.join(args.output_dir, "shards", checkpoint)
+        threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+        rows = evaluate_sharded(items, args.workers, shard_dir, threads, **options)
+        environment.update(workers=args.workers, threads=threads)
+    else:
+        rows = evaluate_items(items, device=device, **options)
+
+    report = {
+        "checkpoint": checkpoint,
+        "model": args.model,
+        "adapter": args.adapter,
+        "heldout_fraction": args.heldout_fraction,
+        "batch_size": args.batch_size,
+        "max_new_tokens": max_new_tokens,
+        "structured": args.structured,
+        "environment": dict(environment, eval_sec=time.time() - start_time),
+        "summary": summarize(rows),
+        "items": rows,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    summary = report["summary"]
+    print(f"📋 섹션 완성도 {summary['section_completeness']:.1%}, 수준 정확 {summary['level_exact']:.1%} "
+          f"(한 단계 이내 {summary['level_within_one']:.1%}), 반복률 {summary['repetition_rate']:.1%}, "
+          f"금지 표현 {summary['forbidden_hit_rate']:.1%}")
+    print(f"⏱️  지연 p50 {summary['latency_p50_sec']:.2f}초 / p95 {summary['latency_p95_sec']:.2f}초, "
+          f"평균 {summary['completion_tokens_mean']:.0f} 토큰")
+    paths = write_report(report, args.output_dir, baseline)
+    print(f"📁 결과: {paths['json']}")
+    print(f"📁 결과: {paths['markdown']}")
+
+if __name__ == "__main__":
+    main()
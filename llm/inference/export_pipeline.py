@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+LoRA 병합 → 내보내기 → 산출물 벤치마크 파이프라인
+1. saves/qwen2-1.5b-big5-lora 어댑터(lora_rank 64, additional_target embed_tokens,lm_head)를
+   기반 모델 가중치에 직접 병합해 분할(sharded) safetensors로 저장 (peft 없이 W += B·A·alpha/r)
+2. (선택) llama.cpp로 GGUF(f16) 변환 후 Q4_K_M 등으로 양자화 (모바일/엣지 배포용)
+3. 병합 모델(fp32/int8/int4)과 GGUF 산출물마다 같은 프롬프트로 지연/메모리/크기를 측정해
+   가장 빠르면서 출력이 허용 가능한 내보내기를 고를 수 있도록 리포트 생성
+"""
+
+import argparse
+import gc
+import glob
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+import torch
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+sys.path.insert(0, DATA_DIR)
+
+from benchmark import DEFAULT_DATASET, DEFAULT_OUTPUT_DIR, environment_info, load_prompt_pool, run_case, write_results
+from model_loader import load_tokenizer, resolve_model_dir
+from quantization import QUANT_MODES, agreement, greedy_outputs, load_fp32_model, quantize_model, rss_bytes, weight_bytes
+
+LLM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ADAPTER = os.path.join(LLM_DIR, "saves", "qwen2-1.5b-big5-lora")
+DEFAULT_EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "export")
+DEFAULT_SHARD_SIZE = "1GB"
+GGUF_QUANT_TYPES = ["Q4_K_M", "Q8_0"]
+
+ADAPTER_PREFIX = "base_model.model."
+ADAPTER_WEIGHT_FILES = ["adapter_model.safetensors", "adapter_model.bin"]
+TOKENIZER_FILES = ["tokenizer.json", "tokenizer_config.json", "vocab.json", "merges.txt", "special_tokens_map.json",
+                   "added_tokens.json"]
+
+
+# ---- LoRA 병합 ----
+
+def load_adapter(adapter_dir: str) -> Tuple[Dict[str, Any], Dict[str, torch.Tensor]]:
+    """(adapter_config, 가중치) — PEFT 저장 형식 (safetensors 우선, 없으면 .bin)"""
+    with open(os.path.join(adapter_dir, "adapter_config.json"), encoding="utf-8") as f:
+        config = json.load(f)
+    for filename in ADAPTER_WEIGHT_FILES:
+        path = os.path.join(adapter_dir, filename)
+        if not os.path.exists(path):
+            continue
+        if filename.endswith(".safetensors"):
+            from safetensors.torch import load_file
+            return config, load_file(path)
+        return config, torch.load(path, map_location="cpu", weights_only=True)
+    raise FileNotFoundError(f"어댑터 가중치가 없습니다: {adapter_dir} ({', '.join(ADAPTER_WEIGHT_FILES)})")
+
+
+def lora_scaling(config: Dict[str, Any]) -> float:
+    rank, alpha = config["r"], config.get("lora_alpha", config["r"])
+    return alpha / rank ** 0.5 if config.get("use_rslora") else alpha / rank
+
+
+def group_adapter_weights(state_dict: Dict[str, torch.Tensor]) -> Tuple[Dict[str, Dict[str, torch.Tensor]],
+                                                                        Dict[str, torch.Tensor]]:
+    """PEFT 키 → ({모듈 경로: {"A", "B", "embedding"}}, {전체 교체할 파라미터 이름: 텐서})
+
+    - ...q_proj.lora_A.weight / lora_B.weight: Linear LoRA
+    - ...embed_tokens.lora_embedding_A / lora_embedding_B: Embedding LoRA
+    - 그 밖의 키(modules_to_save: additional_target으로 통째로 학습한 embed_tokens, lm_head)는 그대로 교체
+    - Embedding LoRA 대상이면 PEFT가 함께 저장하는 ...embed_tokens.base_layer.weight도 전체 교체 (그 위에 LoRA 병합)
+    """
+    lora: Dict[str, Dict[str, torch.Tensor]] = {}
+    full: Dict[str, torch.Tensor] = {}
+    for key, tensor in state_dict.items():
+        name = key[len(ADAPTER_PREFIX):] if key.startswith(ADAPTER_PREFIX) else key
+        name = re.sub(r"\.default(?=\.|$)", "", name)
+        match = re.match(r"(.+)\.lora_(embedding_)?([AB])(?:\.weight)?$", name)
+        if match:
+            entry = lora.setdefault(match.group(1), {"embedding": bool(match.group(2))})
+            entry[match.group(3)] = tensor
+        else:
+            name = name.replace(".modules_to_save", "").replace(".original_module", "").replace(".base_layer", "")
+            full[name] = tensor
+    return lora, full
+
+
+@torch.no_grad()
+def merge_lora(model: torch.nn.Module, adapter_config: Dict[str, Any],
+               adapter_state: Dict[str, torch.Tensor]) -> Dict[str, int]:
+    """어댑터를 모델 가중치에 제자리 병합 (fp32로 계산 후 원래 dtype으로 저장)
+
+    embed_tokens/lm_head가 묶인(tied) 모델에서 어느 한쪽이 바뀌면 묶음을 풀어 각자 저장한다.
+    """
+    scaling = lora_scaling(adapter_config)
+    lora, full = group_adapter_weights(adapter_state)
+    modules = dict(model.named_modules())
+
+    touched = {name for name in lora} | {name.rsplit(".", 1)[0] for name in full}
+    output_embeddings = model.get_output_embeddings()
+    input_embeddings = model.get_input_embeddings()
+    if getattr(model.config, "tie_word_embeddings", False) and output_embeddings is not None \
+            and any(modules.get(name) in (input_embeddings, output_embeddings) for name in touched):
+        output_embeddings.weight = torch.nn.Parameter(output_embeddings.weight.detach().clone(), requires_grad=False)
+        model.config.tie_word_embeddings = False
+        if hasattr(model, "_tied_weights_keys"):
+            model._tied_weights_keys = []
+    parameters = dict(model.named_parameters(remove_duplicate=False))
+
+    # 전체 교체(modules_to_save, base_layer)를 먼저 하고 그 위에 LoRA 델타 병합
+    for name, tensor in full.items():
+        if name not in parameters:
+            raise ValueError(f"어댑터 키가 모델과 맞지 않습니다: {name}")
+        parameter = parameters[name]
+        if parameter.shape != tensor.shape:
+            raise ValueError(f"{name} 크기 불일치: 모델 {tuple(parameter.shape)}, 어댑터 {tuple(tensor.shape)}")
+        parameter.data = tensor.to(parameter.dtype)
+
+    for module_name, entry in lora.items():
+        module = modules.get(module_name)
+        if module is None or "A" not in entry or "B" not in entry:
+            raise ValueError(f"어댑터 키가 모델과 맞지 않습니다: {module_name}")
+        delta = entry["B"].float() @ entry["A"].float()
+        if entry["embedding"]:
+            delta = delta.t()  # lora_embedding_A [r, vocab], B [hidden, r] → [vocab, hidden]
+        weight = module.weight
+        module.weight.data = (weight.detach().float() + delta * scaling).to(weight.dtype)
+
+    return {"lora_modules": len(lora), "full_modules": len(full), "scaling": scaling}
+
+
+def merge_and_save(adapter_dir: str, output_dir: str, base_model: Optional[str] = None, dtype: str = "float16",
+                   max_shard_size: str = DEFAULT_SHARD_SIZE) -> Dict[str, Any]:
+    """기반 모델 로드 → 병합 → 분할 safetensors + 토크나이저 저장"""
+    adapter_config, adapter_state = load_adapter(adapter_dir)
+    base_model = base_model or adapter_config.get("base_model_name_or_path")
+    if not base_model:
+        raise ValueError("adapter_config.json에 base_model_name_or_path가 없으면 --base를 지정하세요")
+
+    start_time = time.perf_counter()
+    model = load_fp32_model(base_model)
+    stats = merge_lora(model, adapter_config, adapter_state)
+    model = model.to(getattr(torch, dtype))
+    model.config.torch_dtype = getattr(torch, dtype)
+    model.save_pretrained(output_dir, safe_serialization=True, max_shard_size=max_shard_size)
+
+    # 학습 시 토크나이저를 어댑터 폴더에 함께 저장했으면 그쪽을 우선
+    tokenizer_dir = adapter_dir if any(os.path.exists(os.path.join(adapter_dir, name))
+                                       for name in TOKENIZER_FILES) else base_model
+    tokenizer, _ = load_tokenizer(tokenizer_dir)
+    tokenizer.save_pretrained(output_dir)
+
+    stats.update({
+        "base_model": base_model,
+        "dtype": dtype,
+        "shards": len(glob.glob(os.path.join(output_dir, "*.safetensors"))),
+        "merge_sec": time.perf_counter() - start_time,
+    })
+    del model
+    gc.collect()
+    return stats
+
+
+# ---- GGUF 변환 (llama.cpp) ----
+
+def find_llama_cpp(llama_cpp_dir: Optional[str] = None) -> Dict[str, Optional[str]]:
+    """llama.cpp 변환 스크립트/실행 파일 위치 (--llama-cpp 또는 LLAMA_CPP_DIR, 실행 파일은 PATH도 확인)"""
+    root = llama_cpp_dir or os.environ.get("LLAMA_CPP_DIR")
+
+    def binary(name: str) -> Optional[str]:
+        if root:
+            for candidate in [os.path.join(root, "build", "bin", name), os.path.join(root, name)]:
+                if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                    return candidate
+        return shutil.which(name)
+
+    convert = os.path.join(root, "convert_hf_to_gguf.py") if root else None
+    return {
+        "convert": convert if convert and os.path.exists(convert) else None,
+        "quantize": binary("llama-quantize"),
+        "bench": binary("llama-bench"),
+    }
+
+
+def convert_to_gguf(tools: Dict[str, Optional[str]], model_dir: str, output_dir: str,
+                    quant_types: List[str]) -> List[str]:
+    """병합 모델 → f16 GGUF → quant_types별 양자화 GGUF (도구가 없으면 빈 목록)"""
+    if not tools["convert"]:
+        print("⚠️  llama.cpp(convert_hf_to_gguf.py)를 찾을 수 없어 GGUF 변환을 건너뜁니다 (--llama-cpp 또는 LLAMA_CPP_DIR)")
+        return []
+
+    name = os.path.basename(os.path.normpath(model_dir))
+    f16_path = os.path.join(output_dir, f"{name}.f16.gguf")
+    subprocess.run([sys.executable, tools["convert"], model_dir, "--outfile", f16_path, "--outtype", "f16"],
+                   check=True, capture_output=True, text=True)
+    paths = [f16_path]
+    print(f"✅ GGUF 변환: {f16_path}")
+
+    for quant_type in quant_types:
+        if not tools["quantize"]:
+            print(f"⚠️  llama-quantize가 없어 {quant_type} 양자화를 건너뜁니다")
+            break
+        path = os.path.join(output_dir, f"{name}.{quant_type}.gguf")
+        subprocess.run([tools["quantize"], f16_path, path, quant_type], check=True, capture_output=True, text=True)
+        paths.append(path)
+        print(f"✅ GGUF 양자화: {path}")
+    return paths
+
+
+# ---- 산출물 벤치마크 ----
+
+def artifact_bytes(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(f) for f in glob.glob(os.path.join(path, "*.safetensors")))
+
+
+def benchmark_hf_artifact(model_dir: str, mode: str, tokenizer: Any, pool: List[List[int]],
+                          references: Optional[List[List[int]]], max_new_tokens: int,
+                          trials: int) -> Tuple[Dict[str, Any], List[List[int]]]:
+    """병합 모델을 새로 로드(+CPU 양자화)해 지연/메모리/fp32 대비 일치도 측정"""
+    gc.collect()
+    rss_before = rss_bytes()
+    start_time = time.perf_counter()
+    model = quantize_model(load_fp32_model(model_dir), mode)
+    gc.collect()
+    load_sec = time.perf_counter() - start_time
+
+    outputs = greedy_outputs(model, tokenizer, pool, max_new_tokens)
+    timing = run_case(model, tokenizer, pool, 1, min(len(ids) for ids in pool), max_new_tokens, trials)
+    row = {
+        "artifact": f"merged-{'fp32' if mode == 'none' else mode}",
+        "format": "safetensors",
+        "path": model_dir,
+        "disk_mb": artifact_bytes(model_dir) / 1024 ** 2,
+        "weights_mb": weight_bytes(model) / 1024 ** 2,
+        "load_sec": load_sec,
+        "rss_delta_mb": (rss_bytes() - rss_before) / 1024 ** 2,
+        "ttft_sec": timing["ttft_sec"],
+        "itl_ms": timing["itl_ms"],
+        "tokens_per_sec": timing["tokens_per_sec"],
+    }
+    row.update(agreement(model, pool, references or outputs, outputs))
+    del model
+    return row, outputs
+
+
+def benchmark_gguf_artifact(bench: Optional[str], path: str, prompt_tokens: int, max_new_tokens: int,
+                            trials: int) -> Optional[Dict[str, Any]]:
+    """llama-bench로 프롬프트 처리/생성 속도 측정 (CPU, 같은 프롬프트 길이·생성 길이)"""
+    row = {"artifact": os.path.basename(path), "format": "gguf", "path": path,
+           "disk_mb": artifact_bytes(path) / 1024 ** 2}
+    if not bench:
+        print(f"⚠️  llama-bench가 없어 {row['artifact']}은 크기만 기록합니다")
+        return row
+
+    output = subprocess.run([bench, "-m", path, "-p", str(prompt_tokens), "-n", str(max_new_tokens),
+                             "-r", str(trials), "-o", "json"], check=True, capture_output=True, text=True).stdout
+    for test in json.loads(output):
+        if test.get("n_prompt"):
+            row["ttft_sec"] = test["n_prompt"] / test["avg_ts"] if test["avg_ts"] else 0.0
+        if test.get("n_gen"):
+            row["tokens_per_sec"] = test["avg_ts"]
+            row["itl_ms"] = 1000 / test["avg_ts"] if test["avg_ts"] else 0.0
+    return row
+
+
+def run_export_benchmark(model_dir: str, modes: List[str], gguf_paths: List[str], bench: Optional[str],
+                         dataset: str = DEFAULT_DATASET, prompts: int = 8, max_new_tokens: int = 32,
+                         trials: int = 3) -> List[Dict[str, Any]]:
+    """모든 산출물 측정 (첫 행은 병합 fp32 기준, speedup/size_ratio는 기준 대비)"""
+    tokenizer, _ = load_tokenizer(model_dir)
+    pool = load_prompt_pool(tokenizer, dataset, prompts)
+
+    results, references = [], None
+    for mode in ["none"] + [mode for mode in modes if mode != "none"]:
+        row, outputs = benchmark_hf_artifact(model_dir, mode, tokenizer, pool, references, max_new_tokens, trials)
+        references = references or outputs
+        results.append(row)
+    for path in gguf_paths:
+        results.append(benchmark_gguf_artifact(bench, path, min(len(ids) for ids in pool), max_new_tokens, trials))
+
+    baseline = results[0]
+    for row in results:
+        agreement_text = f"  top-1 일치 {row['top1_agreement']:.1%}" if "top1_agreement" in row else ""
+        print(f"  {row['artifact']:<28} 디스크 {row['disk_mb']:8.1f}MB  RSS +{row.get('rss_delta_mb', 0.0):7.1f}MB  "
+              f"{row.get('tokens_per_sec', 0.0):7.1f} tok/s{agreement_text}")
+        if "tokens_per_sec" in row and baseline["tokens_per_sec"]:
+            row["speedup"] = row["tokens_per_sec"] / baseline["tokens_per_sec"]
+        row["size_ratio"] = row["disk_mb"] / baseline["disk_mb"] if baseline["disk_mb"] else 0.0
+    return results
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="LoRA 병합 → 내보내기 → 산출물 벤치마크")
+    parser.add_argument("--adapter", default=DEFAULT_ADAPTER, help="PEFT 어댑터 폴더 (학습 output_dir)")
+    parser.add_argument("--base", default=None, help="기반 모델 (기본: adapter_config의 base_model_name_or_path)")
+    parser.add_argument("--output-dir", default=None, help="병합 모델 저장 위치 (기본: build/export/<어댑터 이름>-merged)")
+    parser.add_argument("--dtype", choices=["float16", "bfloat16", "float32"], default="float16",
+                        help="저장 dtype")
+    parser.add_argument("--max-shard-size", default=DEFAULT_SHARD_SIZE)
+    parser.add_argument("--skip-merge", action="store_true", help="이미 병합된 --output-dir를 그대로 사용")
+    parser.add_argument("--quantize", default="int8,int4", help="병합 모델에 적용해 비교할 CPU 양자화 방식")
+    parser.add_argument("--gguf", action="store_true", help="llama.cpp로 GGUF 변환/양자화")
+    parser.add_argument("--gguf-quant", default=",".join(GGUF_QUANT_TYPES))
+    parser.add_argument("--llama-cpp", default=None, help="llama.cpp 폴더 (기본: LLAMA_CPP_DIR)")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--prompts", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--trials", type=int, default=3)
+    parser.add_argument("--skip-benchmark", action="store_true")
+    parser.add_argument("--results-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or os.path.join(
+        DEFAULT_EXPORT_DIR, os.path.basename(os.path.normpath(args.adapter)) + "-merged")
+    if not args.skip_merge:
+        print(f"🚀 LoRA 병합 시작... ({args.adapter})")
+        stats = merge_and_save(args.adapter, output_dir, args.base, args.dtype, args.max_shard_size)
+        print(f"✅ 병합 완료: LoRA {stats['lora_modules']}개 층 (scaling {stats['scaling']:g}), "
+              f"전체 교체 {stats['full_modules']}개, {stats['shards']}개 샤드, {stats['merge_sec']:.1f}초")
+        print(f"📁 {output_dir}")
+    elif resolve_model_dir(output_dir) is None:
+        raise SystemExit(f"병합된 모델이 없습니다: {output_dir}")
+
+    gguf_paths: List[str] = []
+    tools = find_llama_cpp(args.llama_cpp)
+    if args.gguf:
+        quant_types = [quant_type for quant_type in args.gguf_quant.split(",") if quant_type]
+        gguf_paths = convert_to_gguf(tools, output_dir, os.path.dirname(os.path.normpath(output_dir)), quant_types)
+
+    if args.skip_benchmark:
+        return
+
+    modes = [mode for mode in args.quantize.split(",") if mode]
+    unknown = [mode for mode in modes if mode not in QUANT_MODES]
+    if unknown:
+        raise SystemExit(f"알 수 없는 양자화 방식: {', '.join(unknown)}")
+    print(f"⏱️  산출물 벤치마크... (병합 fp32, {', '.join(modes) or '양자화 없음'}, GGUF {len(gguf_paths)}개)")
+    results = run_export_benchmark(output_dir, modes, gguf_paths, tools["bench"], args.dataset, args.prompts,
+                                   args.max_new_tokens, args.trials)
+
+    environment = environment_info(output_dir, "float32", torch.device("cpu"))
+    environment["adapter"] = args.adapter
+    paths = write_results(results, environment, args.results_dir, "export")
+    print(f"📁 결과: {paths['json']}")
+    print(f"📁 결과: {paths['csv']}")
+
+if __name__ == "__main__":
+    main()
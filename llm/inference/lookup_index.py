@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+골든 리포트 접미사 배열(suffix array) 조회 디코딩
+학습 JSONL의 모든 assistant 리포트를 토큰화해 하나의 배열로 잇고 접미사 배열을 만들어
+build/lookup_index/<키>/에 .npy로 저장 (다음 실행부터 mmap으로 바로 로드)
+디코딩 중에는 최근 토큰과 가장 길게 일치하는 위치들을 찾아 그 뒤의 여러 토큰을 초안으로 제안
+("당신의 답변을 바탕으로 분석한 성격 특성은 다음과 같습니다" 같은 반복 구절을 한 번에 검증)
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+sys.path.insert(0, DATA_DIR)
+
+from jsonl_io import file_checksum
+from speculative import DEFAULT_NUM_DRAFT_TOKENS, iter_report_texts
+from model_loader import DEFAULT_MODEL, load_tokenizer
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "lookup_index")
+SEPARATOR = -1  # 리포트 경계 (제안이 다른 리포트로 넘어가지 않도록)
+MAX_MATCH = 16
+MIN_MATCH = 2
+MAX_CANDIDATES = 64
+
+
+def build_suffix_array(tokens: np.ndarray) -> np.ndarray:
+    """접두사 배가(prefix doubling)로 접미사 배열 생성 (O(n log² n), NumPy 벡터 연산)
+
+    배열 끝을 넘는 위치는 -2로 취급해 구분자(-1)를 포함한 모든 토큰보다 앞에 정렬된다.
+    """
+    n = len(tokens)
+    rank = tokens.astype(np.int64)
+    suffix_array = np.argsort(rank, kind="stable")
+    k = 1
+    while k < n:
+        second = np.full(n, -2, dtype=np.int64)
+        second[:n - k] = rank[k:]
+        suffix_array = np.lexsort((second, rank))
+        changed = (np.diff(rank[suffix_array]) != 0) | (np.diff(second[suffix_array]) != 0)
+        new_rank = np.empty(n, dtype=np.int64)
+        new_rank[suffix_array] = np.concatenate([[0], np.cumsum(changed)])
+        rank = new_rank
+        if rank[suffix_array[-1]] == n - 1:
+            break
+        k *= 2
+    return suffix_array.astype(np.int32)
+
+
+def index_key(tokenizer: Any, filenames: List[str]) -> str:
+    """토크나이저 + 원본 파일 내용이 같으면 같은 키 (바뀌면 새로 빌드)"""
+    payload = json.dumps([tokenizer.name_or_path, len(tokenizer)] + [file_checksum(f) for f in filenames])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class SuffixArrayIndex:
+    """토큰 배열 + 접미사 배열 (둘 다 mmap 가능한 int32 .npy)"""
+
+    def __init__(self, tokens: np.ndarray, suffix_array: np.ndarray):
+        self.tokens = tokens
+        self.suffix_array = suffix_array
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    @classmethod
+    def build(cls, tokenizer: Any, filenames: Optional[List[str]] = None) -> "SuffixArrayIndex":
+        texts = list(iter_report_texts(filenames))
+        tokens: List[int] = []
+        for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]:
+            tokens.extend(ids)
+            tokens.append(SEPARATOR)
+        tokens = np.asarray(tokens, dtype=np.int32)
+        return cls(tokens, build_suffix_array(tokens))
+
+    def save(self, path: str) -> None:
+        tmp_path = path + ".tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+        np.save(os.path.join(tmp_path, "tokens.npy"), self.tokens)
+        np.save(os.path.join(tmp_path, "suffix_array.npy"), self.suffix_array)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SuffixArrayIndex":
+        return cls(np.load(os.path.join(path, "tokens.npy"), mmap_mode="r"),
+                   np.load(os.path.join(path, "suffix_array.npy"), mmap_mode="r"))
+
+    # ---- 조회 ----
+
+    def _suffix(self, rank: int, length: int) -> Tuple[int, ...]:
+        start = int(self.suffix_array[rank])
+        return tuple(self.tokens[start:start + length].tolist())
+
+    def find(self, query: List[int], lo: int = 0, hi: Optional[int] = None) -> Tuple[int, int]:
+        """query로 시작하는 접미사의 접미사 배열 범위 [lo, hi) (이진 탐색)"""
+        hi = len(self.suffix_array) if hi is None else hi
+        query = tuple(query)
+        m = len(query)
+        left, right = lo, hi
+        while left < right:
+            mid = (left + right) // 2
+            if self._suffix(mid, m) < query:
+                left = mid + 1
+            else:
+                right = mid
+        start = left
+        right = hi
+        while left < right:
+            mid = (left + right) // 2
+            if self._suffix(mid, m) <= query:
+                left = mid + 1
+            else:
+                right = mid
+        return start, left
+
+    def longest_match(self, context: List[int], max_match: int = MAX_MATCH,
+                      min_match: int = MIN_MATCH) -> Tuple[int, int, int]:
+        """context 끝부분과 가장 길게 일치하는 (길이, lo, hi) — 없으면 길이 0"""
+        best = (0, 0, 0)
+        for length in range(min_match, min(max_match, len(context)) + 1):
+            lo, hi = self.find(context[-length:])
+            if lo >= hi:
+                break
+            best = (length, lo, hi)
+        return best
+
+    def continuation(self, context: List[int], num_tokens: int, max_match: int = MAX_MATCH,
+                     min_match: int = MIN_MATCH) -> List[int]:
+        """가장 긴 일치 위치들 뒤에서 토큰별 다수결로 고른 이어질 토큰열"""
+        length, lo, hi = self.longest_match(context, max_match, min_match)
+        if not length:
+            return []
+        starts = [int(self.suffix_array[rank]) + length for rank in range(lo, min(hi, lo + MAX_CANDIDATES))]
+        draft: List[int] = []
+        for offset in range(num_tokens):
+            votes = Counter(int(self.tokens[start + offset]) for start in starts
+                            if start + offset < len(self.tokens))
+            if not votes:
+                break
+            token_id, _ = votes.most_common(1)[0]
+            if token_id == SEPARATOR:
+                break
+            draft.append(token_id)
+            starts = [start for start in starts if int(self.tokens[start + offset]) == token_id]
+        return draft
+
+
+def load_or_build_index(tokenizer: Any, filenames: Optional[List[str]] = None,
+                        index_dir: str = DEFAULT_INDEX_DIR) -> Tuple[SuffixArrayIndex, Dict[str, Any]]:
+    """(색인, 타이밍) — 저장된 색인이 있으면 mmap 로드(warm), 없으면 빌드 후 저장(cold)"""
+    filenames = filenames or sorted(glob.glob(os.path.join(DATA_DIR, "*.jsonl")))
+    path = os.path.join(index_dir, index_key(tokenizer, filenames))
+    start_time = time.time()
+    if os.path.exists(os.path.join(path, "suffix_array.npy")):
+        index = SuffixArrayIndex.load(path)
+        return index, {"index": "warm", "index_sec": time.time() - start_time, "path": path}
+
+    index = SuffixArrayIndex.build(tokenizer, filenames)
+    index.save(path)
+    return index, {"index": "cold", "index_sec": time.time() - start_time, "path": path}
+
+
+class SuffixArrayDraft:
+    """speculative_generate용 초안 생성기 (색인에 없으면 현재 프롬프트+생성 토큰에서 조회)
+
+    골든 리포트는 사용자 답변을 그대로 인용하므로 색인에서 못 찾은 구간은 프롬프트에서 자주 찾는다.
+    """
+
+    def __init__(self, index: SuffixArrayIndex, max_match: int = MAX_MATCH, min_match: int = MIN_MATCH):
+        self.index = index
+        self.max_match = max_match
+        self.min_match = min_match
+        self.metrics = {"index": 0, "prompt": 0, "none": 0}
+
+    def propose(self, ids: List[int], num_tokens: int) -> List[int]:
+        context = list(ids[-self.max_match:])
+        draft = self.index.continuation(context, num_tokens, self.max_match, self.min_match)
+        if draft:
+            self.metrics["index"] += 1
+            return draft
+        draft = self._prompt_lookup(ids, num_tokens)
+        self.metrics["prompt" if draft else "none"] += 1
+        return draft
+
+    def _prompt_lookup(self, ids: List[int], num_tokens: int) -> List[int]:
+        """ids 안에서 끝부분과 가장 길게 일치하는 앞선 위치의 다음 토큰들"""
+        n = self.min_match
+        if len(ids) <= n:
+            return []
+        tail = ids[-n:]
+        best_end, best_length = None, 0
+        for end in range(len(ids) - 1, n - 1, -1):
+            if ids[end - n:end] != tail:
+                continue
+            # 일치 구간을 왼쪽으로 최대 max_match까지 확장
+            length = n
+            while length < self.max_match and end - length > 0 and ids[end - length - 1] == ids[-length - 1]:
+                length += 1
+            if length > best_length:
+                best_end, best_length = end, length
+        return ids[best_end:best_end + num_tokens] if best_end is not None else []
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="골든 리포트 접미사 배열 조회 색인")
+    parser.add_argument("command", choices=["build", "query"])
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="토크나이저 기준 모델")
+    parser.add_argument("--text", default="당신의 답변을 바탕으로", help="query: 이어질 토큰을 찾을 문맥")
+    parser.add_argument("--num-tokens", type=int, default=DEFAULT_NUM_DRAFT_TOKENS * 4)
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    args = parser.parse_args()
+
+    tokenizer, _ = load_tokenizer(args.model)
+    index, timings = load_or_build_index(tokenizer, index_dir=args.index_dir)
+    print(f"📚 색인: {len(index):,} 토큰 ({timings['index']}, {timings['index_sec']:.3f}초)")
+    print(f"📁 {timings['path']}")
+
+    if args.command == "query":
+        context = tokenizer(args.text, add_special_tokens=False)["input_ids"]
+        length, lo, hi = index.longest_match(context)
+        draft = index.continuation(context, args.num_tokens)
+        print(f"🔍 최장 일치 {length} 토큰, 후보 {hi - lo}개 위치")
+        print(f"💡 {args.text}|{tokenizer.decode(draft)}")
+        print("⚡ 디코딩 가속 측정: python speculative.py --draft suffix")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Qwen2 모델/토크나이저 상주 로더
+- safetensors 가중치를 memmap으로 열어 meta 장치 모델에 그대로 연결 (복사/초기화 생략)
+- fast 토크나이저를 tokenizer.json 직렬화 형태로 로컬 캐시 (원본 파일 체크섬이 같을 때만 재사용, 허브 조회/변환 생략)
+- 같은 프로세스 안에서는 로드한 모델을 재사용하고,
+  상주 워커 프로세스(serve)에 붙으면 프로세스가 바뀌어도 로드 비용 없음
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import signal
+import sys
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.managers import BaseManager
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+import torch
+
+DEFAULT_MODEL = "Qwen/Qwen2-1.5B"
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "tokenizer_cache")
+# 캐시 키에 반영할 원본 토크나이저 파일
+TOKENIZER_FILES = ("tokenizer.json", "tokenizer_config.json", "vocab.json", "merges.txt",
+                   "special_tokens_map.json", "added_tokens.json")
+TOKENIZER_KEY_FILE = "source_key.txt"
+WORKER_ADDRESS = ("127.0.0.1", 50515)
+# 워커 RPC는 피클 기반이므로 실행마다 무작위 키 — 환경 변수(16진수) 또는 0600 키 파일로 공유
+WORKER_AUTHKEY_ENV = "BIG5_WORKER_AUTHKEY"
+WORKER_KEY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "worker")
+
+DTYPES = {
+    "float32": torch.float32,
+    "float16": torch.float16,
+    "bfloat16": torch.bfloat16,
+}
+
+# 프로세스 안 상주 캐시 {(모델, dtype, 장치): (model, tokenizer)}
+_LOADED: Dict[Tuple[str, str, str], Tuple[Any, Any]] = {}
+
+
+def default_device() -> torch.device:
+    return torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+
+
+def resolve_model_dir(model_name: str) -> Optional[str]:
+    """로컬 디렉터리 또는 이미 받아둔 허브 스냅샷 경로 (네트워크 조회 없음)"""
+    if os.path.isdir(model_name):
+        return model_name
+    try:
+        from huggingface_hub import snapshot_download
+        return snapshot_download(model_name, local_files_only=True)
+    except Exception:
+        return None
+
+
+def tokenizer_source_key(model_name: str) -> str:
+    """원본 토크나이저 파일 내용의 체크섬 (같은 경로에 다시 만든 모델/새 허브 리비전이면 달라짐)"""
+    digest = hashlib.sha256(model_name.encode("utf-8"))
+    model_dir = resolve_model_dir(model_name)
+    if model_dir is None:
+        return "unresolved:" + digest.hexdigest()
+    for filename in TOKENIZER_FILES:
+        filepath = os.path.join(model_dir, filename)
+        if os.path.isfile(filepath):
+            digest.update(filename.encode("utf-8"))
+            with open(filepath, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def load_tokenizer(model_name: str = DEFAULT_MODEL, cache_dir: str = DEFAULT_CACHE_DIR) -> Tuple[Any, Dict[str, Any]]:
+    """(토크나이저, 타이밍) — 원본 파일이 그대로면 직렬화된 fast 토크나이저를 바로 읽음"""
+    from transformers import AutoTokenizer
+
+    start_time = time.time()
+    path = os.path.join(cache_dir, hashlib.sha256(model_name.encode("utf-8")).hexdigest()[:16])
+    source_key = tokenizer_source_key(model_name)
+    key_path = os.path.join(path, TOKENIZER_KEY_FILE)
+    if os.path.exists(os.path.join(path, "tokenizer.json")) and os.path.exists(key_path):
+        with open(key_path, encoding="utf-8") as f:
+            cached_key = f.read().strip()
+        if cached_key == source_key:
+            tokenizer = AutoTokenizer.from_pretrained(path)
+            return tokenizer, {"tokenizer_sec": time.time() - start_time, "tokenizer_cache": "warm"}
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True, use_fast=True)
+    if tokenizer.is_fast:
+        tmp_path, old_path = path + ".tmp", path + ".old"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tokenizer.save_pretrained(tmp_path)
+        with open(os.path.join(tmp_path, TOKENIZER_KEY_FILE), "w", encoding="utf-8") as f:
+            f.write(source_key + "\n")
+        # 불완전한 기존 캐시 디렉터리는 비어 있지 않으면 os.replace로 덮을 수 없으므로 먼저 치움
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    return tokenizer, {"tokenizer_sec": time.time() - start_time, "tokenizer_cache": "cold"}
+
+
+def load_mmap_model(model_dir: str, dtype: torch.dtype) -> Any:
+    """safetensors memmap 텐서를 meta 장치 모델에 assign으로 연결
+
+    저장된 dtype과 요청 dtype이 같으면 가중치를 복사하지 않는다.
+    """
+    from accelerate import init_empty_weights
+    from safetensors import safe_open
+    from transformers import AutoConfig, AutoModelForCausalLM
+
+    config = AutoConfig.from_pretrained(model_dir, trust_remote_code=True)
+    # 파라미터만 meta 장치에 두고 버퍼(rotary inv_freq 등)는 실제로 계산
+    with init_empty_weights(include_buffers=False):
+        model = AutoModelForCausalLM.from_config(config, trust_remote_code=True)
+
+    state_dict = {}
+    for filename in sorted(glob.glob(os.path.join(model_dir, "*.safetensors"))):
+        with safe_open(filename, framework="pt") as f:
+            for name in f.keys():
+                tensor = f.get_tensor(name)
+                state_dict[name] = tensor if tensor.dtype == dtype else tensor.to(dtype)
+
+    missing, unexpected = model.load_state_dict(state_dict, strict=False, assign=True)
+    if config.tie_word_embeddings:
+        model.tie_weights()
+        missing = [name for name in missing if name != "lm_head.weight"]
+    if missing or unexpected:
+        raise ValueError(f"가중치 불일치: missing={missing[:5]} unexpected={unexpected[:5]}")
+    return model.eval()
+
+
+def load_model_and_tokenizer(model_name: str = DEFAULT_MODEL, dtype: str = "float16",
+                             device: Optional[torch.device] = None,
+                             cache_dir: str = DEFAULT_CACHE_DIR) -> Tuple[Any, Any, Dict[str, Any]]:
+    """(모델, 토크나이저, 타이밍) — 같은 프로세스에서 두 번째 호출부터는 캐시 적중"""
+    from transformers import AutoModelForCausalLM
+
+    device = device or default_device()
+    key = (model_name, dtype, str(device))
+    if key in _LOADED:
+        model, tokenizer = _LOADED[key]
+        return model, tokenizer, {"load": "warm", "tokenizer_cache": "resident", "tokenizer_sec": 0.0, "model_sec": 0.0}
+
+    tokenizer, timings = load_tokenizer(model_name, cache_dir)
+
+    start_time = time.time()
+    torch_dtype = DTYPES[dtype]
+    model_dir = resolve_model_dir(model_name)
+    if model_dir and glob.glob(os.path.join(model_dir, "*.safetensors")):
+        model = load_mmap_model(model_dir, torch_dtype)
+        timings["weights"] = "mmap"
+    else:
+        model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch_dtype,
+                                                     low_cpu_mem_usage=True, trust_remote_code=True).eval()
+        timings["weights"] = "from_pretrained"
+    model.to(device)
+    timings["model_sec"] = time.time() - start_time
+    timings["load"] = "cold"
+
+    _LOADED[key] = (model, tokenizer)
+    return model, tokenizer, timings
+
+
+class ResidentModel:
+    """상주 워커 프로세스 안에서 모델을 들고 있는 객체 (프록시로 노출)"""
+
+    def __init__(self, model_name: str, dtype: str, device: str):
+        self.model_name = model_name
+        self.model, self.tokenizer, self.timings = load_model_and_tokenizer(model_name, dtype, torch.device(device))
+        self.device = device
+        self.requests = 0
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "device": self.device,
+            "dtype": str(next(self.model.parameters()).dtype),
+            "num_parameters": self.num_parameters(),
+            "timings": self.timings,
+            "requests": self.requests,
+        }
+
+    def num_parameters(self) -> int:
+        return sum(p.numel() for p in self.model.parameters())
+
+    def generate(self, **kwargs) -> Any:
+        """model.generate와 같은 인자 (텐서는 NumPy 배열로 주고받음)"""
+        self.requests += 1
+        inputs = {key: torch.from_numpy(value).to(self.device) if isinstance(value, np.ndarray) else value
+                  for key, value in kwargs.items()}
+        with torch.no_grad():
+            return self.model.generate(**inputs).cpu().numpy()
+
+
+class RemoteModel:
+    """상주 워커 모델 프록시를 로컬 모델처럼 쓰기 위한 래퍼
+
+    torch 텐서는 프로세스 간 공유 메모리 방식으로 피클되므로
+    경계를 넘을 때는 NumPy 배열로 바꿔 보낸다.
+    """
+
+    def __init__(self, proxy: Any):
+        self._proxy = proxy
+
+    def generate(self, **kwargs) -> torch.Tensor:
+        inputs = {key: value.cpu().numpy() if isinstance(value, torch.Tensor) else value
+                  for key, value in kwargs.items()}
+        return torch.from_numpy(self._proxy.generate(**inputs))
+
+    def info(self) -> Dict[str, Any]:
+        return self._proxy.info()
+
+    def num_parameters(self) -> int:
+        return self._proxy.num_parameters()
+
+
+class WorkerManager(BaseManager):
+    pass
+
+
+def worker_key_path(port: int) -> str:
+    return os.path.join(WORKER_KEY_DIR, f"worker-{port}.key")
+
+
+def write_worker_key(port: int, authkey: bytes) -> str:
+    """키 파일을 소유자만 읽을 수 있게(0600) 저장"""
+    os.makedirs(WORKER_KEY_DIR, mode=0o700, exist_ok=True)
+    path = worker_key_path(port)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        os.fchmod(f.fileno(), 0o600)
+        f.write(authkey.hex())
+    return path
+
+
+def read_worker_key(port: int) -> Optional[bytes]:
+    """환경 변수, 없으면 키 파일의 워커 키 (없으면 None)"""
+    value = os.environ.get(WORKER_AUTHKEY_ENV)
+    if value is None:
+        try:
+            with open(worker_key_path(port), encoding='utf-8') as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+    return bytes.fromhex(value.strip())
+
+
+def serve(model_name: str, dtype: str = "float16", device: Optional[str] = None,
+          address: Tuple[str, int] = WORKER_ADDRESS) -> None:
+    """모델을 한 번 로드하고 요청을 계속 받는 상주 워커 실행 (종료 시까지 블록)"""
+
+    resident = ResidentModel(model_name, dtype, device or str(default_device()))
+    print(f"✅ 모델 상주 완료: {model_name} ({resident.timings['model_sec']:.2f}초)")
+    WorkerManager.register("get_model", callable=lambda: resident)
+    value = os.environ.get(WORKER_AUTHKEY_ENV)
+    authkey = bytes.fromhex(value) if value else os.urandom(32)
+    key_path = write_worker_key(address[1], authkey)
+    manager = WorkerManager(address=address, authkey=authkey)
+    server = manager.get_server()
+    print(f"🔌 워커 대기 중: {address[0]}:{address[1]} (키: {key_path})")
+    # SIGTERM에도 키 파일을 지우도록 정상 종료 경로로
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        if os.path.exists(key_path):
+            os.remove(key_path)
+
+
+def attach(address: Tuple[str, int] = WORKER_ADDRESS) -> Optional[RemoteModel]:
+    """실행 중인 상주 워커의 모델 (없으면 None)"""
+    WorkerManager.register("get_model")
+    authkey = read_worker_key(address[1])
+    if authkey is None:
+        return None
+    manager = WorkerManager(address=address, authkey=authkey)
+    try:
+        manager.connect()
+    except (ConnectionRefusedError, OSError, AuthenticationError):
+        return None
+    return RemoteModel(manager.get_model())
+
+
+def print_load_report(timings: Dict[str, Any]) -> None:
+    """콜드/웜 로드 시간 출력"""
+    print(f"🔤 토크나이저: {timings.get('tokenizer_sec', 0.0):.2f}초 ({timings.get('tokenizer_cache', '-')})")
+    print(f"🤖 모델: {timings.get('model_sec', 0.0):.2f}초 ({timings.get('load')}, {timings.get('weights', '-')})")
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="Qwen2 모델 상주 로더")
+    parser.add_argument("command", choices=["serve", "bench"], help="serve: 상주 워커 실행 / bench: 콜드·웜 로드 시간 비교")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float16")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--port", type=int, default=WORKER_ADDRESS[1])
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.model, args.dtype, args.device, (WORKER_ADDRESS[0], args.port))
+        return
+
+    device = torch.device(args.device) if args.device else default_device()
+    results = []
+    for label in ["첫 로드", "프로세스 내 재로드"]:
+        _, _, timings = load_model_and_tokenizer(args.model, args.dtype, device)
+        print(f"\n⏱️  {label}")
+        print_load_report(timings)
+        results.append(timings)
+
+    start_time = time.time()
+    resident = attach((WORKER_ADDRESS[0], args.port))
+    if resident is not None:
+        info = resident.info()
+        print(f"\n⏱️  상주 워커 연결: {time.time() - start_time:.3f}초 ({info['model']}, 요청 {info['requests']}회 처리)")
+    print(json.dumps(results, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+기반 모델 하나 + 여러 LoRA 어댑터 동시 서빙
+saves/qwen2-1.5b-big5-test(rank 32), saves/qwen2-1.5b-big5-lora(rank 64) 같은 어댑터를 이름으로 등록하고,
+배치의 행마다 어댑터를 골라 기반 층 출력에 x·Aᵀ·Bᵀ·scaling을 더함 (기반 가중치는 건드리지 않음)
+어댑터가 다른 요청도 한 배치로 디코딩하므로 A/B 비교·카나리 배포에 기반 모델 메모리 한 벌만 사용
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+sys.path.insert(0, DATA_DIR)
+
+from token_cache import render_chatml
+from batching import ContinuousBatchingEngine, GenerationRequest
+from benchmark import DEFAULT_DATASET, DEFAULT_OUTPUT_DIR, environment_info, write_results
+from export_pipeline import group_adapter_weights, load_adapter, lora_scaling, merge_lora
+from model_loader import DEFAULT_MODEL, DTYPES, default_device, load_model_and_tokenizer
+from quantization import load_fp32_model, weight_bytes
+from jsonl_io import iter_jsonl
+
+
+class AdapterRegistry:
+    """이름 → LoRA 어댑터, 층마다 forward 훅으로 행별 어댑터 출력을 더함
+
+    - route(인덱스 목록) 안에서 실행한 forward만 어댑터가 적용된다 (인덱스 0 = 기반 모델)
+    - 어댑터 인덱스는 acquire/release로 참조를 세어, 진행 중 요청이 있는 어댑터를 해제해도
+      그 요청이 끝날 때까지 가중치를 유지한다 (새 요청은 바로 거부)
+    """
+
+    def __init__(self, model: torch.nn.Module):
+        self.model = model
+        self.modules = dict(model.named_modules())
+        weight = model.get_input_embeddings().weight
+        self.device, self.dtype = weight.device, weight.dtype
+
+        self.names: Dict[str, int] = {}        # 등록된 이름 → 인덱스
+        self.adapters: Dict[int, Dict[str, Any]] = {}  # 인덱스 → {name, path, rank, bytes, modules}
+        self.refs: Dict[int, int] = {}
+        self._weights: Dict[str, Dict[int, Dict[str, Any]]] = {}  # 층 이름 → 인덱스 → LoRA/교체 가중치
+        self._hooks: Dict[str, Any] = {}
+        self._groups: Optional[List[Tuple[int, torch.Tensor]]] = None
+        self._next_index = 1
+        self._lock = threading.RLock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+    # ---- 등록/해제 ----
+
+    def register(self, name: str, adapter_dir: str) -> Dict[str, Any]:
+        """어댑터 로드 후 등록 (디스크 읽기는 잠금 밖에서, 교체는 잠금 안에서)"""
+        config, state_dict = load_adapter(adapter_dir)
+        scaling = lora_scaling(config)
+        lora, full = group_adapter_weights(state_dict)
+
+        layers: Dict[str, Dict[str, Any]] = {}
+        for module_name, entry in lora.items():
+            if module_name not in self.modules or "A" not in entry or "B" not in entry:
+                raise ValueError(f"어댑터 키가 모델과 맞지 않습니다: {module_name}")
+            layers[module_name] = {"A": self._to_device(entry["A"]), "B": self._to_device(entry["B"]),
+                                   "scaling": scaling, "embedding": entry["embedding"]}
+        for param_name, tensor in full.items():
+            module_name, _, attr = param_name.rpartition(".")
+            module = self.modules.get(module_name)
+            if module is None or attr != "weight" or module.weight.shape != tensor.shape:
+                raise ValueError(f"어댑터 키가 모델과 맞지 않습니다: {param_name}")
+            # 같은 모듈에 LoRA도 있으면(Embedding LoRA의 base_layer) 교체한 출력 위에 델타를 더함
+            layers.setdefault(module_name, {"embedding": isinstance(module, torch.nn.Embedding)})
+            layers[module_name]["weight"] = self._to_device(tensor)
+
+        info = {"name": name, "path": adapter_dir, "rank": config.get("r"), "scaling": scaling,
+                "modules": len(layers),
+                "bytes": sum(t.numel() * t.element_size() for layer in layers.values()
+                             for t in layer.values() if isinstance(t, torch.Tensor))}
+        with self._lock:
+            if name in self.names:
+                self._unregister(name)
+            index = self._next_index
+            self._next_index += 1
+            for module_name, layer in layers.items():
+                self._weights.setdefault(module_name, {})[index] = layer
+                if module_name not in self._hooks:
+                    self._hooks[module_name] = self.modules[module_name].register_forward_hook(
+                        self._make_hook(module_name))
+            self.names[name] = index
+            self.adapters[index] = info
+            self.refs[index] = 0
+        return info
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            if name not in self.names:
+                raise KeyError(name)
+            self._unregister(name)
+
+    def _unregister(self, name: str) -> None:
+        index = self.names.pop(name)
+        if not self.refs[index]:
+            self._free(index)
+
+    def _free(self, index: int) -> None:
+        del self.adapters[index], self.refs[index]
+        for module_name in list(self._weights):
+            self._weights[module_name].pop(index, None)
+            if not self._weights[module_name]:
+                del self._weights[module_name]
+                self._hooks.pop(module_name).remove()
+
+    def _to_device(self, tensor: torch.Tensor) -> torch.Tensor:
+        return tensor.to(device=self.device, dtype=self.dtype)
+
+    # ---- 요청 참조 ----
+
+    def acquire(self, name: Optional[str]) -> int:
+        """요청이 쓸 어댑터 인덱스 (None이면 기반 모델 0, 없는 이름이면 KeyError)"""
+        if name is None:
+            return 0
+        with self._lock:
+            index = self.names[name]
+            self.refs[index] += 1
+            return index
+
+    def release(self, index: int) -> None:
+        if not index:
+            return
+        with self._lock:
+            self.refs[index] -= 1
+            if not self.refs[index] and self.adapters[index]["name"] not in self.names:
+                self._free(index)
+
+    # ---- 행별 적용 ----
+
+    @contextmanager
+    def route(self, indices: List[int]) -> Iterator[None]:
+        """배치 행별 어댑터 인덱스를 정하고 forward 실행 (모두 0이면 훅이 아무것도 하지 않음)"""
+        if not any(indices):
+            yield
+            return
+        with self._lock:
+            rows = torch.tensor(indices, device=self.device)
+            self._groups = [(index, (rows == index).nonzero().squeeze(1)) for index in sorted(set(indices)) if index]
+            try:
+                yield
+            finally:
+                self._groups = None
+
+    def _make_hook(self, module_name: str):
+        def hook(module: torch.nn.Module, inputs: Tuple[torch.Tensor, ...], output: torch.Tensor) -> torch.Tensor:
+            if not self._groups:
+                return output
+            x = inputs[0]
+            weights = self._weights.get(module_name, {})
+            for index, rows in self._groups:
+                layer = weights.get(index)
+                if layer is None:
+                    continue
+                if "weight" in layer:
+                    # modules_to_save (embed_tokens/lm_head 통째 교체)
+                    if layer["embedding"]:
+                        output[rows] = F.embedding(x[rows], layer["weight"])
+                    else:
+                        output[rows] = F.linear(x[rows], layer["weight"], module.bias)
+                if "A" not in layer:
+                    continue
+                if layer["embedding"]:
+                    # lora_embedding_A [r, vocab], B [hidden, r]
+                    output[rows] += F.embedding(x[rows], layer["A"].t()) @ layer["B"].t() * layer["scaling"]
+                else:
+                    output[rows] += (x[rows] @ layer["A"].t()) @ layer["B"].t() * layer["scaling"]
+            return output
+        return hook
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "adapters": [dict(self.adapters[index], active_requests=self.refs[index])
+                             for index in self.names.values()],
+                "adapter_mb": sum(info["bytes"] for info in self.adapters.values()) / 1024 ** 2,
+                "hooked_modules": len(self._hooks),
+            }
+
+
+def parse_adapter_specs(specs: List[str]) -> Dict[str, str]:
+    """["이름=경로", ...] → {이름: 경로} (이름을 생략하면 폴더 이름)"""
+    adapters = {}
+    for spec in specs:
+        name, sep, path = spec.partition("=")
+        if not sep:
+            name, path = os.path.basename(os.path.normpath(spec)), spec
+        adapters[name] = path
+    return adapters
+
+
+# ---- A/B 비교 벤치마크 ----
+
+def load_prompts(tokenizer: Any, dataset: str, limit: int) -> List[List[int]]:
+    prompts = []
+    for item in iter_jsonl(dataset):
+        prompts.append(tokenizer(render_chatml(item["messages"][:-1], add_generation_prompt=True),
+                                 add_special_tokens=False)["input_ids"])
+        if len(prompts) >= limit:
+            break
+    return prompts
+
+
+def run_requests(engine: ContinuousBatchingEngine, prompts: List[List[int]], adapters: List[Optional[str]],
+                 max_new_tokens: int) -> Tuple[Dict[Optional[str], List[List[int]]], float, int]:
+    """모든 (어댑터, 프롬프트) 조합을 한꺼번에 제출 → (어댑터별 출력, 경과 시간, 생성 토큰 수)"""
+    start_time = time.perf_counter()
+    requests = [(adapter, engine.submit(GenerationRequest(prompt_ids, max_new_tokens=max_new_tokens, temperature=0,
+                                                          adapter=adapter)))
+                for prompt_ids in prompts for adapter in adapters]
+    outputs: Dict[Optional[str], List[List[int]]] = {adapter: [] for adapter in adapters}
+    for adapter, request in requests:
+        outputs[adapter].append(list(request.result()))
+    elapsed = time.perf_counter() - start_time
+    return outputs, elapsed, sum(len(ids) for rows in outputs.values() for ids in rows)
+
+
+def run_multi_lora_benchmark(model: Any, tokenizer: Any, adapter_dirs: Dict[str, str], dataset: str = DEFAULT_DATASET,
+                             prompts: int = 4, max_new_tokens: int = 32, max_batch_size: int = 8,
+                             verify: bool = False) -> List[Dict[str, Any]]:
+    """어댑터별 메모리, 어댑터를 섞은 배치 vs 어댑터별 순차 배치 처리량, (선택) 병합 모델과의 출력 일치"""
+    registry = AdapterRegistry(model)
+    base_mb = weight_bytes(model) / 1024 ** 2
+    for name, path in adapter_dirs.items():
+        info = registry.register(name, path)
+        print(f"🔌 {name}: rank {info['rank']}, {info['modules']}개 층, {info['bytes'] / 1024 ** 2:.1f}MB")
+
+    pool = load_prompts(tokenizer, dataset, prompts)
+    adapters: List[Optional[str]] = [None] + list(adapter_dirs)
+    engine = ContinuousBatchingEngine(model, tokenizer, max_batch_size, adapters=registry).start()
+    try:
+        run_requests(engine, pool[:1], adapters, 2)  # warmup
+        mixed, mixed_sec, mixed_tokens = run_requests(engine, pool, adapters, max_new_tokens)
+        mixed_steps = engine.stats()["steps"]
+        separate_sec, separate_tokens = 0.0, 0
+        for adapter in adapters:
+            outputs, elapsed, tokens = run_requests(engine, pool, [adapter], max_new_tokens)
+            separate_sec += elapsed
+            separate_tokens += tokens
+            if outputs[adapter] != mixed[adapter]:
+                print(f"⚠️  {adapter or 'base'}: 섞은 배치와 단독 배치의 greedy 출력이 다릅니다")
+    finally:
+        engine.stop()
+
+    results = []
+    for adapter in adapters:
+        info = registry.adapters[registry.names[adapter]] if adapter else {"rank": 0, "bytes": 0}
+        row = {
+            "adapter": adapter or "base",
+            "rank": info["rank"],
+            "adapter_mb": info["bytes"] / 1024 ** 2,
+            "base_mb": base_mb,
+            "mixed_tokens_per_sec": mixed_tokens / mixed_sec,
+            "separate_tokens_per_sec": separate_tokens / separate_sec,
+        }
+        if verify and adapter:
+            # 같은 프롬프트를 병합 모델로 greedy 생성해 행별 적용 결과와 비교
+            merged = load_fp32_model(model.name_or_path)
+            merge_lora(merged, *load_adapter(adapter_dirs[adapter]))
+            merged = merged.to(device=model.device, dtype=model.dtype)
+            merged_engine = ContinuousBatchingEngine(merged, tokenizer, max_batch_size).start()
+            try:
+                reference, _, _ = run_requests(merged_engine, pool, [None], max_new_tokens)
+            finally:
+                merged_engine.stop()
+            row["merged_exact_match"] = float(np.mean([a == b for a, b in zip(reference[None], mixed[adapter])]))
+            del merged
+        results.append(row)
+    print(f"🧮 기반 {base_mb:.1f}MB + 어댑터 {registry.stats()['adapter_mb']:.1f}MB "
+          f"(어댑터별 모델 로드 시 {base_mb * len(adapters):.1f}MB)")
+    print(f"⚡ 섞은 배치 {mixed_tokens / mixed_sec:.1f} tok/s ({mixed_steps} 단계) vs "
+          f"어댑터별 순차 {separate_tokens / separate_sec:.1f} tok/s")
+    return results
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="기반 모델 하나로 여러 LoRA 어댑터 A/B 비교")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="어댑터를 학습한 기반 모델")
+    parser.add_argument("--adapter", action="append", default=[], metavar="NAME=PATH",
+                        help="등록할 어댑터 (여러 번 지정)")
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float16")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--prompts", type=int, default=4)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--verify", action="store_true", help="어댑터별 병합 모델과 greedy 출력 비교 (모델을 추가로 로드)")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    adapters = parse_adapter_specs(args.adapter)
+    if not adapters:
+        parser.error("--adapter NAME=PATH를 하나 이상 지정하세요")
+
+    device = torch.device(args.device) if args.device else default_device()
+    print(f"🚀 멀티 LoRA 비교 시작... ({args.model}, 어댑터 {len(adapters)}개, {device})")
+    model, tokenizer, _ = load_model_and_tokenizer(args.model, args.dtype, device)
+    results = run_multi_lora_benchmark(model, tokenizer, adapters, args.dataset, args.prompts, args.max_new_tokens,
+                                       args.max_batch_size, args.verify)
+    for row in results:
+        match = f"  병합 모델 일치 {row['merged_exact_match']:.0%}" if "merged_exact_match" in row else ""
+        print(f"  {row['adapter']:<24} rank {row['rank']:<3} {row['adapter_mb']:8.1f}MB{match}")
+
+    paths = write_results(results, environment_info(args.model, args.dtype, device), args.output_dir, "multi_lora")
+    print(f"📁 결과: {paths['json']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+공유 프롬프트 접두사 KV 캐시
+모든 요청이 같은 긴 시스템 프롬프트("당신은 Big5 심리학 모델을 기반으로...")로 시작하므로
+접두사의 KV를 한 번만 계산해 LRU 캐시에 두고, 요청마다 사용자 답변 부분만 프리필
+"""
+
+import argparse
+import os
+import sys
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+import torch
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+sys.path.insert(0, DATA_DIR)
+
+from jsonl_io import iter_jsonl
+from token_cache import render_chatml
+from batching import ContinuousBatchingEngine, GenerationRequest, build_cache, cache_layers
+from benchmark import DEFAULT_DATASET, DEFAULT_OUTPUT_DIR, environment_info, write_results
+from model_loader import DEFAULT_MODEL, DTYPES, default_device, load_model_and_tokenizer
+
+DEFAULT_CAPACITY = 4
+
+KVLayers = List[Tuple[torch.Tensor, torch.Tensor]]
+
+
+def system_prefix(messages: List[Dict[str, str]]) -> str:
+    """프롬프트에서 캐시할 접두사 (시스템 메시지까지의 ChatML 텍스트)"""
+    if messages and messages[0].get("role") == "system":
+        return render_chatml(messages[:1])
+    return ""
+
+
+class PrefixCache:
+    """접두사 토큰열 → 층별 KV 텐서 (배치 1) LRU 캐시"""
+
+    def __init__(self, model: Any, capacity: int = DEFAULT_CAPACITY):
+        self.model = model
+        self.capacity = capacity
+        self._entries: "OrderedDict[Tuple[Any, Tuple[int, ...]], KVLayers]" = OrderedDict()
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0, "saved_tokens": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, prefix_ids: List[int], namespace: Any = None) -> KVLayers:
+        """접두사 KV (없으면 계산해서 저장, 용량 초과 시 가장 오래 안 쓴 항목 제거)
+
+        같은 접두사라도 KV가 달라지는 경우(LoRA 어댑터별)는 namespace로 구분한다.
+        """
+        key = (namespace, tuple(prefix_ids))
+        layers = self._entries.get(key)
+        if layers is not None:
+            self._entries.move_to_end(key)
+            self.metrics["hits"] += 1
+            self.metrics["saved_tokens"] += len(prefix_ids)
+            return layers
+
+        self.metrics["misses"] += 1
+        input_ids = torch.tensor([prefix_ids], device=next(self.model.parameters()).device)
+        with torch.no_grad():
+            outputs = self.model(input_ids=input_ids, past_key_values=build_cache([]), use_cache=True)
+        layers = [(k.detach(), v.detach()) for k, v in cache_layers(outputs.past_key_values)]
+        self._entries[key] = layers
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.metrics["evictions"] += 1
+        return layers
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return dict(self.metrics, entries=len(self._entries),
+                    hit_rate=self.metrics["hits"] / lookups if lookups else 0.0)
+
+
+def prefix_length(tokenizer: Any, prompt_ids: List[int], prefix_text: str) -> int:
+    """prompt_ids가 prefix_text의 토큰으로 시작하면 그 길이, 아니면 0"""
+    if not prefix_text:
+        return 0
+    prefix_ids = tokenizer(prefix_text, add_special_tokens=False)["input_ids"]
+    if prompt_ids[:len(prefix_ids)] == prefix_ids and len(prefix_ids) < len(prompt_ids):
+        return len(prefix_ids)
+    return 0
+
+
+def load_prompts(tokenizer: Any, dataset: str = DEFAULT_DATASET, limit: int = 16) -> List[Tuple[List[int], int]]:
+    """데이터셋 프롬프트 (토큰, 접두사 길이)"""
+    prompts = []
+    for item in iter_jsonl(dataset):
+        messages = item["messages"][:-1]
+        prompt_ids = tokenizer(render_chatml(messages, add_generation_prompt=True), add_special_tokens=False)["input_ids"]
+        prompts.append((prompt_ids, prefix_length(tokenizer, prompt_ids, system_prefix(messages))))
+        if len(prompts) >= limit:
+            break
+    return prompts
+
+
+def measure_ttft(engine: ContinuousBatchingEngine, prompts: List[Tuple[List[int], int]],
+                 use_prefix: bool) -> List[float]:
+    """요청을 하나씩 보내 TTFT 측정 (첫 토큰만 생성)"""
+    ttfts = []
+    for prompt_ids, prefix_len in prompts:
+        request = GenerationRequest(prompt_ids, max_new_tokens=1, temperature=0,
+                                    prefix_len=prefix_len if use_prefix else 0)
+        engine.submit(request).result()
+        ttfts.append(request.first_token_at - request.submitted_at)
+    return ttfts
+
+
+def run_prefix_benchmark(model: Any, tokenizer: Any, dataset: str = DEFAULT_DATASET, requests: int = 16,
+                         warmup: int = 2) -> Dict[str, Any]:
+    """접두사 캐시 유무에 따른 요청당 프리필 토큰 수와 TTFT 비교"""
+    prompts = load_prompts(tokenizer, dataset, requests)
+    prefix_cache = PrefixCache(model)
+    engine = ContinuousBatchingEngine(model, tokenizer, max_batch_size=1, prefix_cache=prefix_cache).start()
+    try:
+        measure_ttft(engine, prompts[:warmup], use_prefix=False)
+        baseline = measure_ttft(engine, prompts, use_prefix=False)
+        # 첫 요청에서 접두사 KV를 계산(미스)하고 이후 요청은 적중
+        cached = measure_ttft(engine, prompts, use_prefix=True)
+    finally:
+        engine.stop()
+
+    prompt_tokens = [len(prompt_ids) for prompt_ids, _ in prompts]
+    prefill_tokens = [len(prompt_ids) - prefix_len for prompt_ids, prefix_len in prompts]
+    return {
+        "requests": len(prompts),
+        "prompt_tokens": float(np.mean(prompt_tokens)),
+        "prefix_tokens": float(np.mean([prefix_len for _, prefix_len in prompts])),
+        "prefill_tokens_cached": float(np.mean(prefill_tokens)),
+        "prefill_saved_ratio": 1 - sum(prefill_tokens) / sum(prompt_tokens),
+        "ttft_ms": float(np.mean(baseline)) * 1000,
+        "ttft_cached_ms": float(np.mean(cached[1:])) * 1000,
+        "ttft_first_miss_ms": cached[0] * 1000,
+        "ttft_speedup": float(np.mean(baseline) / np.mean(cached[1:])),
+        "cache": prefix_cache.stats(),
+    }
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="시스템 프롬프트 접두사 KV 캐시 벤치마크")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float16")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    device = torch.device(args.device) if args.device else default_device()
+    model, tokenizer, _ = load_model_and_tokenizer(args.model, args.dtype, device)
+
+    print(f"🚀 접두사 KV 캐시 벤치마크 시작... ({args.model}, {device})")
+    result = run_prefix_benchmark(model, tokenizer, args.dataset, args.requests)
+
+    print(f"🔤 요청당 프롬프트 {result['prompt_tokens']:.0f} 토큰 중 접두사 {result['prefix_tokens']:.0f} 토큰")
+    print(f"✂️  요청당 프리필: {result['prompt_tokens']:.0f} → {result['prefill_tokens_cached']:.0f} 토큰 "
+          f"({result['prefill_saved_ratio']:.1%} 절감)")
+    print(f"⏱️  TTFT: {result['ttft_ms']:.1f}ms → {result['ttft_cached_ms']:.1f}ms "
+          f"(x{result['ttft_speedup']:.2f}, 첫 미스 {result['ttft_first_miss_ms']:.1f}ms)")
+
+    environment = environment_info(args.model, args.dtype, device)
+    paths = write_results([result], environment, args.output_dir, "prefix_cache")
+    print(f"📁 결과: {paths['json']}")
+
+if __name__ == "__main__":
+    main()
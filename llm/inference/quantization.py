@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+CPU 양자화 추론 경로
+- int8: nn.Linear 동적 양자화 (가중치 int8, 활성값은 실행 시 int8로 양자화)
+- int4: 가중치 전용 그룹 양자화 (그룹별 scale/zero, 활성값은 fp32)
+fp32 기준 모델과 비교해 지연, 상주 메모리, 출력 일치도를 고정 프롬프트 세트로 측정한 리포트 생성
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+import torch
+from torch import nn
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+sys.path.insert(0, DATA_DIR)
+
+from benchmark import DEFAULT_DATASET, DEFAULT_OUTPUT_DIR, environment_info, load_prompt_pool, run_case, write_results
+from model_loader import DEFAULT_MODEL, load_mmap_model, load_tokenizer, resolve_model_dir
+
+QUANT_MODES = ["none", "int8", "int4"]
+INT4_GROUP_SIZES = [128, 64, 32]
+
+# CPU int4 packed matmul 커널 (없는 빌드에서는 매 호출 역양자화)
+HAS_INT4_KERNEL = hasattr(torch.ops.aten, "_weight_int4pack_mm_for_cpu")
+
+
+class Int4Linear(nn.Module):
+    """가중치 전용 int4 Linear (4비트 값 0..15, w = (q - 8) * scale + zero)"""
+
+    def __init__(self, linear: nn.Linear, group_size: int):
+        super().__init__()
+        self.in_features = linear.in_features
+        self.out_features = linear.out_features
+        self.group_size = group_size
+
+        weight = linear.weight.detach().float()
+        groups = weight.reshape(self.out_features, -1, group_size)
+        low = groups.amin(dim=-1, keepdim=True)
+        scale = (groups.amax(dim=-1, keepdim=True) - low).clamp(min=1e-6) / 15
+        q = ((groups - low) / scale).round().clamp(0, 15).to(torch.int32).reshape(self.out_features, -1)
+        zero = low + 8 * scale
+        # [in/group, out, 2]
+        scales_and_zeros = torch.stack([scale[..., 0], zero[..., 0]], dim=-1).transpose(0, 1).contiguous()
+        self.register_buffer("scales_and_zeros", scales_and_zeros)
+        if HAS_INT4_KERNEL:
+            self.register_buffer("packed_weight", torch.ops.aten._convert_weight_to_int4pack_for_cpu(q, 1))
+        else:
+            self.register_buffer("packed_weight", ((q[:, ::2] << 4) | q[:, 1::2]).to(torch.uint8))
+        self.bias = None if linear.bias is None else nn.Parameter(linear.bias.detach().float(), requires_grad=False)
+
+    def _dequantize(self) -> torch.Tensor:
+        q = torch.stack([self.packed_weight >> 4, self.packed_weight & 0xF], dim=-1).reshape(self.out_features, -1)
+        q = q.float().reshape(self.out_features, -1, self.group_size) - 8
+        scale, zero = self.scales_and_zeros.transpose(0, 1).unbind(dim=-1)
+        return (q * scale[..., None] + zero[..., None]).reshape(self.out_features, -1)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        shape = x.shape
+        x = x.reshape(-1, self.in_features).float()
+        if HAS_INT4_KERNEL:
+            y = torch.ops.aten._weight_int4pack_mm_for_cpu(x.contiguous(), self.packed_weight, self.group_size,
+                                                           self.scales_and_zeros)
+        else:
+            y = x @ self._dequantize().t()
+        if self.bias is not None:
+            y = y + self.bias
+        return y.reshape(*shape[:-1], self.out_features)
+
+    def extra_repr(self) -> str:
+        return f"in_features={self.in_features}, out_features={self.out_features}, group_size={self.group_size}"
+
+
+def int4_group_size(in_features: int) -> Optional[int]:
+    return next((size for size in INT4_GROUP_SIZES if in_features % size == 0), None)
+
+
+def quantize_int4(model: nn.Module) -> nn.Module:
+    """모든 nn.Linear를 Int4Linear로 교체 (그룹 크기로 나누어떨어지지 않는 층은 fp32 유지)"""
+    for module in list(model.modules()):
+        for child_name, child in list(module.named_children()):
+            if isinstance(child, nn.Linear):
+                group_size = int4_group_size(child.in_features)
+                if group_size is not None:
+                    setattr(module, child_name, Int4Linear(child, group_size))
+    return model
+
+
+def quantize_model(model: nn.Module, mode: str) -> nn.Module:
+    """CPU 양자화 적용 (제자리 변환, mode: none | int8 | int4)
+
+    양자화 커널은 CPU fp32 활성값 기준이므로 모델을 CPU fp32로 옮긴 뒤 변환한다.
+    """
+    if mode == "none":
+        return model
+    if mode not in QUANT_MODES:
+        raise ValueError(f"알 수 없는 양자화 방식: {mode}")
+    model = model.to(device="cpu", dtype=torch.float32)
+    if mode == "int8":
+        from torch.ao.quantization import quantize_dynamic
+
+        return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    return quantize_int4(model)
+
+
+def weight_bytes(model: nn.Module) -> int:
+    """state_dict 텐서 바이트 합 (동적 양자화 층의 packed 파라미터 포함, 묶인 가중치는 한 번만)"""
+    seen, total = set(), 0
+
+    def add(value: Any) -> None:
+        nonlocal total
+        if isinstance(value, torch.Tensor):
+            key = (value.data_ptr(), value.numel()) if not value.is_quantized else id(value)
+            if key not in seen:
+                seen.add(key)
+                total += value.numel() * value.element_size()
+        elif isinstance(value, (tuple, list)):
+            for item in value:
+                add(item)
+
+    for value in model.state_dict().values():
+        add(value)
+    return total
+
+
+def rss_bytes() -> int:
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except ImportError:
+        return 0
+
+
+def load_fp32_model(model_name: str) -> nn.Module:
+    """캐시하지 않은 새 CPU fp32 모델 (모드별 상주 메모리를 따로 재기 위해)"""
+    model_dir = resolve_model_dir(model_name)
+    if model_dir and any(name.endswith(".safetensors") for name in os.listdir(model_dir)):
+        return load_mmap_model(model_dir, torch.float32)
+    from transformers import AutoModelForCausalLM
+    return AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32, low_cpu_mem_usage=True,
+                                                trust_remote_code=True).eval()
+
+
+def load_quantized_model(model_name: str, mode: str) -> Tuple[nn.Module, Any, Dict[str, Any]]:
+    """(양자화 모델, 토크나이저, 타이밍)
+
+    quantize_model은 제자리 변환이므로 load_model_and_tokenizer의 상주 fp32 모델 대신
+    캐시하지 않은 새 사본을 변환한다 (같은 프로세스의 이후 fp32 로드가 양자화 모델을 받지 않도록).
+    """
+    tokenizer, timings = load_tokenizer(model_name)
+    start_time = time.time()
+    model = load_fp32_model(model_name)
+    timings.update(model_sec=time.time() - start_time, load="cold", weights="uncached")
+    start_time = time.time()
+    model = quantize_model(model, mode)
+    timings["quantize_sec"] = time.time() - start_time
+    return model, tokenizer, timings
+
+
+def greedy_outputs(model: nn.Module, tokenizer: Any, prompts: List[List[int]], max_new_tokens: int) -> List[List[int]]:
+    """프롬프트별 greedy 생성 토큰 (EOS에서 멈추지 않고 max_new_tokens까지 비교)"""
+    outputs = []
+    for prompt_ids in prompts:
+        input_ids = torch.tensor([prompt_ids])
+        with torch.no_grad():
+            output_ids = model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids),
+                                        max_new_tokens=max_new_tokens, min_new_tokens=max_new_tokens,
+                                        do_sample=False, pad_token_id=tokenizer.eos_token_id)
+        outputs.append(output_ids[0, len(prompt_ids):].tolist())
+    return outputs
+
+
+def agreement(model: nn.Module, prompts: List[List[int]], references: List[List[int]],
+              outputs: List[List[int]]) -> Dict[str, float]:
+    """fp32 기준 대비 출력 일치도
+
+    - exact_match: 생성 전체가 같은 비율
+    - prefix_agreement: 처음 달라지기 전까지 같은 토큰 비율
+    - top1_agreement: fp32 출력을 teacher forcing으로 넣었을 때 다음 토큰 argmax가 같은 비율
+    """
+    exact, prefix, top1 = [], [], []
+    for prompt_ids, reference, output in zip(prompts, references, outputs):
+        exact.append(float(reference == output))
+        same = next((i for i, (a, b) in enumerate(zip(reference, output)) if a != b), len(reference))
+        prefix.append(same / len(reference))
+
+        input_ids = torch.tensor([prompt_ids + reference[:-1]])
+        with torch.no_grad():
+            logits = model(input_ids=input_ids).logits[0, len(prompt_ids) - 1:]
+        top1.append(float((logits.argmax(dim=-1) == torch.tensor(reference)).float().mean()))
+    return {"exact_match": float(np.mean(exact)), "prefix_agreement": float(np.mean(prefix)),
+            "top1_agreement": float(np.mean(top1))}
+
+
+def run_quantization_report(model_name: str, modes: List[str], dataset: str = DEFAULT_DATASET,
+                            prompts: int = 8, max_new_tokens: int = 32, trials: int = 3) -> List[Dict[str, Any]]:
+    """모드별로 새로 로드 → 양자화 → 지연/메모리/일치도 측정 (첫 행은 fp32 기준)"""
+    tokenizer, _ = load_tokenizer(model_name)
+    pool = load_prompt_pool(tokenizer, dataset, prompts)
+    prompt_tokens = min(len(ids) for ids in pool)
+
+    references: Optional[List[List[int]]] = None
+    results = []
+    for mode in ["none"] + [mode for mode in modes if mode != "none"]:
+        gc.collect()
+        rss_before = rss_bytes()
+        start_time = time.perf_counter()
+        model = quantize_model(load_fp32_model(model_name), mode)
+        gc.collect()
+        load_sec = time.perf_counter() - start_time
+
+        outputs = greedy_outputs(model, tokenizer, pool, max_new_tokens)
+        if references is None:
+            references = outputs
+        timing = run_case(model, tokenizer, pool, 1, prompt_tokens, max_new_tokens, trials)
+        row = {
+            "mode": "fp32" if mode == "none" else mode,
+            "load_sec": load_sec,
+            "weights_mb": weight_bytes(model) / 1024 ** 2,
+            "rss_delta_mb": (rss_bytes() - rss_before) / 1024 ** 2,
+            "ttft_sec": timing["ttft_sec"],
+            "itl_ms": timing["itl_ms"],
+            "tokens_per_sec": timing["tokens_per_sec"],
+        }
+        row.update(agreement(model, pool, references, outputs))
+        results.append(row)
+        print(f"  {row['mode']:<5} 가중치 {row['weights_mb']:8.1f}MB  RSS +{row['rss_delta_mb']:7.1f}MB  "
+              f"{row['tokens_per_sec']:7.1f} tok/s  top-1 일치 {row['top1_agreement']:.1%}  "
+              f"완전 일치 {row['exact_match']:.0%}")
+        del model
+
+    baseline = results[0]
+    for row in results:
+        row["speedup"] = row["tokens_per_sec"] / baseline["tokens_per_sec"] if baseline["tokens_per_sec"] else 0.0
+        row["size_ratio"] = row["weights_mb"] / baseline["weights_mb"]
+    return results
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="CPU 양자화(int8/int4) 정확도-속도 리포트")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--modes", default="int8,int4", help="비교할 양자화 방식 (fp32 기준은 항상 포함)")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--prompts", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--trials", type=int, default=3)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    print(f"🚀 양자화 리포트 시작... ({args.model}, {', '.join(modes)}, int4 커널 {'있음' if HAS_INT4_KERNEL else '없음'})")
+    results = run_quantization_report(args.model, modes, args.dataset, args.prompts, args.max_new_tokens, args.trials)
+
+    environment = environment_info(args.model, "float32", torch.device("cpu"))
+    environment["int4_kernel"] = HAS_INT4_KERNEL
+    paths = write_results(results, environment, args.output_dir, "quantization")
+    print(f"📁 결과: {paths['json']}")
+    print(f"📁 결과: {paths['csv']}")
+
+if __name__ == "__main__":
+    main()
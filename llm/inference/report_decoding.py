@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Big5 리포트 템플릿 구조화 디코딩
+리포트 골격(제목, 5개 '### 특성 (Trait): 수준' 섹션, '## 종합 의견')은 토큰을 강제로 넣고,
+모델은 수준(TRAIT_LEVELS 중 하나)과 섹션 본문만 생성한다.
+섹션마다 토큰 예산을 두고 반복 루프를 감지하면 다음 섹션으로 넘어가며,
+'## 종합 의견'이 끝나면 EOS를 강제해 바로 멈춘다 (최악의 경우 지연과 낭비 토큰 상한)
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+import torch
+from transformers import LogitsProcessor, LogitsProcessorList
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+sys.path.insert(0, DATA_DIR)
+
+from big5_labels import TRAIT_LEVELS
+from final_100_datasets import SYSTEM_PROMPT, TRAIT_HEADERS
+from jsonl_io import iter_jsonl
+from token_cache import render_chatml
+from benchmark import DEFAULT_DATASET, DEFAULT_OUTPUT_DIR, end_of_turn_id, environment_info, eos_ids, write_results
+from model_loader import DEFAULT_MODEL, DTYPES, default_device, load_model_and_tokenizer
+
+REPORT_TITLE = "## Big5 심리 분석 리포트"
+SUMMARY_HEADER = "## 종합 의견"
+
+# 섹션별 본문 토큰 예산
+DEFAULT_BUDGETS = {"intro": 64, "trait": 160, "summary": 240}
+
+# 최근 REPEAT_NGRAM 토큰이 이미 MAX_REPEATS번 나왔으면 반복 루프로 판단
+REPEAT_NGRAM = 8
+MAX_REPEATS = 2
+
+# (종류, 이름, 값): force → 토큰열, choice → 후보 토큰열 목록, free → 토큰 예산
+Segment = Tuple[str, str, Any]
+
+_BANNED: Dict[int, torch.Tensor] = {}
+
+
+def report_skeleton(budgets: Optional[Dict[str, int]] = None) -> List[Tuple[str, str, Any]]:
+    """리포트 골격 (텍스트 단위): 제목 → 도입 → 특성 5개(헤더, 수준, 본문) → 종합 의견"""
+    budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+    skeleton = [("force", "title", f"{REPORT_TITLE}\n\n"), ("free", "intro", budgets["intro"])]
+    for trait, header in TRAIT_HEADERS:
+        # 학습 텍스트와 같은 토큰 경계: 공백은 수준 토큰에 붙음 (': 매우' → ':' + ' 매우')
+        skeleton.append(("force", trait, f"### {header}:"))
+        skeleton.append(("choice", trait, [f" {level}\n" for level in TRAIT_LEVELS]))
+        skeleton.append(("free", trait, budgets["trait"]))
+    skeleton.append(("force", "summary", f"{SUMMARY_HEADER}\n\n"))
+    skeleton.append(("free", "summary", budgets["summary"]))
+    return skeleton
+
+
+def banned_token_mask(tokenizer: Any) -> torch.Tensor:
+    """본문에서 금지할 토큰 (헤더를 새로 여는 '#' 포함 토큰, 특수 토큰) — 토크나이저별 캐시"""
+    key = id(tokenizer)
+    if key not in _BANNED:
+        size = len(tokenizer)
+        mask = torch.zeros(size, dtype=torch.bool)
+        tokens = tokenizer.convert_ids_to_tokens(list(range(size)))
+        mask[[i for i, token in enumerate(tokens) if token and "#" in token]] = True
+        mask[[i for i in tokenizer.all_special_ids if i < size]] = True
+        _BANNED[key] = mask
+    return _BANNED[key]
+
+
+class ReportDecoder:
+    """생성 한 건의 템플릿 상태 머신 (process를 매 디코딩 단계 호출)"""
+
+    def __init__(self, tokenizer: Any, budgets: Optional[Dict[str, int]] = None,
+                 repeat_ngram: int = REPEAT_NGRAM, max_repeats: int = MAX_REPEATS):
+        self.tokenizer = tokenizer
+        # 토크나이저 EOS(<|endoftext|>)와 ChatML 턴 종료(<|im_end|>) 모두 끝으로 인정, 강제 종료는 턴 종료 토큰으로
+        self.eos_token_ids = eos_ids(None, tokenizer)
+        end_id = end_of_turn_id(tokenizer)
+        self.end_token_id = end_id if end_id is not None else tokenizer.eos_token_id
+        self.repeat_ngram = repeat_ngram
+        self.max_repeats = max_repeats
+        self.banned = banned_token_mask(tokenizer)
+        self.segments: List[Segment] = []
+        for kind, name, value in report_skeleton(budgets):
+            if kind == "force":
+                value = self._encode(value)
+            elif kind == "choice":
+                value = [self._encode(option) for option in value]
+            self.segments.append((kind, name, value))
+
+        self.index = 0            # 현재 구간
+        self.segment_ids: List[int] = []  # 현재 구간에서 생성된 토큰
+        self.forced: List[int] = []       # 구간 사이에 끼워 넣을 구분자 토큰 (본문이 빈 줄로 끝나지 않았을 때)
+        self.consumed = 0
+        self.free_ngrams: Dict[Tuple[int, ...], int] = {}
+        self.free_history: List[int] = []
+        self.sections: List[Dict[str, Any]] = []
+        self.done = False
+
+    def _encode(self, text: str) -> List[int]:
+        return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    @property
+    def segment(self) -> Segment:
+        return self.segments[self.index]
+
+    # ---- 상태 전이 ----
+
+    def _advance(self) -> None:
+        self.index += 1
+        self.segment_ids = []
+        self.done = self.index >= len(self.segments)
+
+    def _end_free(self, reason: str) -> None:
+        """본문 구간 종료 (다음 헤더 앞에 빈 줄이 없으면 구분자 추가)"""
+        _, name, budget = self.segment
+        text = self.tokenizer.decode(self.segment_ids, skip_special_tokens=True)
+        self.sections.append({"section": name, "tokens": len(self.segment_ids), "budget": budget, "end": reason})
+        is_last = self.index == len(self.segments) - 1
+        if not is_last and reason != "eos":
+            trailing = len(text) - len(text.rstrip("\n"))
+            self.forced = self._encode("\n" * (2 - trailing)) if trailing < 2 else []
+        self._advance()
+
+    def _is_repeating(self) -> bool:
+        if len(self.free_history) < self.repeat_ngram:
+            return False
+        ngram = tuple(self.free_history[-self.repeat_ngram:])
+        self.free_ngrams[ngram] = self.free_ngrams.get(ngram, 0) + 1
+        return self.free_ngrams[ngram] > self.max_repeats
+
+    def _consume(self, token_id: int) -> None:
+        if self.done:
+            return
+        if self.forced:
+            self.forced.pop(0)
+            return
+
+        kind, _, value = self.segment
+        self.segment_ids.append(token_id)
+        if kind == "force":
+            if len(self.segment_ids) == len(value):
+                self._advance()
+        elif kind == "choice":
+            if any(option == self.segment_ids for option in value):
+                self._advance()
+        else:
+            if token_id in self.eos_token_ids:
+                self.segment_ids.pop()
+                self._end_free("eos")
+                self.done = True
+                return
+            self.free_history.append(token_id)
+            text = self.tokenizer.decode(self.segment_ids, skip_special_tokens=True)
+            if text.endswith("\n\n") and text.strip():
+                self._end_free("paragraph")
+            elif self._is_repeating():
+                self._end_free("repetition")
+            elif len(self.segment_ids) >= value:
+                self._end_free("budget")
+
+    # ---- 로짓 처리 ----
+
+    def allowed(self) -> Optional[List[int]]:
+        """다음에 허용되는 토큰 (None이면 본문 자유 생성)"""
+        if self.done:
+            return [self.end_token_id]
+        if self.forced:
+            return [self.forced[0]]
+        kind, _, value = self.segment
+        position = len(self.segment_ids)
+        if kind == "force":
+            return [value[position]]
+        if kind == "choice":
+            return sorted({option[position] for option in value
+                           if len(option) > position and option[:position] == self.segment_ids})
+        return None
+
+    def process(self, output_ids: List[int], logits: torch.Tensor) -> torch.Tensor:
+        """지금까지의 생성 토큰을 반영하고 다음 토큰 로짓을 제한 (logits: [vocab])"""
+        for token_id in output_ids[self.consumed:]:
+            self._consume(token_id)
+        self.consumed = len(output_ids)
+
+        allowed = self.allowed()
+        if allowed is not None:
+            masked = torch.full_like(logits, float("-inf"))
+            masked[allowed] = logits[allowed]
+            return masked
+
+        banned = self.banned.to(logits.device)
+        if banned.shape[0] < logits.shape[0]:
+            banned = torch.cat([banned, banned.new_ones(logits.shape[0] - banned.shape[0])])
+        banned = banned[:logits.shape[0]].clone()
+        # 마지막 구간에서만 EOS로 끝낼 수 있음 (중간 섹션을 건너뛰고 멈추지 않도록)
+        banned[self.eos_token_ids] = self.index != len(self.segments) - 1
+        return logits.masked_fill(banned, float("-inf"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "complete": self.done,
+            "sections": self.sections,
+            "repetition_aborts": sum(section["end"] == "repetition" for section in self.sections),
+            "budget_aborts": sum(section["end"] == "budget" for section in self.sections),
+        }
+
+
+class ReportLogitsProcessor(LogitsProcessor):
+    """model.generate용 래퍼 (배치 행마다 ReportDecoder 하나)"""
+
+    def __init__(self, tokenizer: Any, prompt_len: int, batch_size: int = 1, **decoder_kwargs):
+        self.prompt_len = prompt_len
+        self.decoders = [ReportDecoder(tokenizer, **decoder_kwargs) for _ in range(batch_size)]
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        for i, decoder in enumerate(self.decoders):
+            scores[i] = decoder.process(input_ids[i, self.prompt_len:].tolist(), scores[i])
+        return scores
+
+
+def max_report_tokens(tokenizer: Any, budgets: Optional[Dict[str, int]] = None) -> int:
+    """구조화 디코딩 리포트의 최대 토큰 수 (골격 + 예산 + 구분자 + EOS)"""
+    total = 1
+    for kind, _, value in report_skeleton(budgets):
+        if kind == "force":
+            total += len(tokenizer(value, add_special_tokens=False)["input_ids"])
+        elif kind == "choice":
+            total += max(len(tokenizer(option, add_special_tokens=False)["input_ids"]) for option in value)
+        else:
+            total += value + len(tokenizer("\n\n", add_special_tokens=False)["input_ids"])
+    return total
+
+
+def generate_report(model: Any, tokenizer: Any, messages: List[Dict[str, str]], structured: bool = True,
+                    budgets: Optional[Dict[str, int]] = None, max_new_tokens: Optional[int] = None,
+                    **generate_kwargs) -> Tuple[str, Dict[str, Any]]:
+    """리포트 한 건 생성 → (텍스트, 생성 통계)"""
+    if not messages or messages[0].get("role") != "system":
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}] + list(messages)
+    device = next(model.parameters()).device
+    prompt = render_chatml(messages, add_generation_prompt=True)
+    inputs = tokenizer(prompt, return_tensors="pt", add_special_tokens=False).to(device)
+    prompt_len = inputs["input_ids"].shape[1]
+
+    eos = eos_ids(model, tokenizer)
+    kwargs = {"do_sample": False, "eos_token_id": eos,
+              "pad_token_id": tokenizer.pad_token_id if tokenizer.pad_token_id is not None else eos[0]}
+    kwargs.update(generate_kwargs)
+    processor = None
+    if structured:
+        processor = ReportLogitsProcessor(tokenizer, prompt_len, budgets=budgets)
+        kwargs["logits_processor"] = LogitsProcessorList([processor])
+    kwargs["max_new_tokens"] = max_new_tokens or max_report_tokens(tokenizer, budgets)
+
+    start_time = time.perf_counter()
+    with torch.no_grad():
+        output_ids = model.generate(**inputs, **kwargs)
+    elapsed = time.perf_counter() - start_time
+
+    generated = output_ids[0, prompt_len:].tolist()
+    end = next((i for i, token_id in enumerate(generated) if token_id in eos), None)
+    if end is not None:
+        generated = generated[:end + 1]
+    stats = {"generated_tokens": len(generated), "latency_sec": elapsed}
+    if processor is not None:
+        stats.update(processor.decoders[0].stats())
+    return tokenizer.decode(generated, skip_special_tokens=True), stats
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="Big5 리포트 구조화 디코딩 (자유 생성과 비교)")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float16")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--requests", type=int, default=4)
+    parser.add_argument("--free-max-new-tokens", type=int, default=1024, help="자유 생성 비교 시 최대 토큰")
+    parser.add_argument("--trait-budget", type=int, default=DEFAULT_BUDGETS["trait"])
+    parser.add_argument("--summary-budget", type=int, default=DEFAULT_BUDGETS["summary"])
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--show", action="store_true", help="첫 구조화 리포트 출력")
+    args = parser.parse_args()
+
+    device = torch.device(args.device) if args.device else default_device()
+    model, tokenizer, _ = load_model_and_tokenizer(args.model, args.dtype, device)
+    budgets = {"trait": args.trait_budget, "summary": args.summary_budget}
+    print(f"🚀 구조화 디코딩 비교 시작... ({args.model}, 최대 {max_report_tokens(tokenizer, budgets)} 토큰)")
+
+    results = []
+    for i, item in enumerate(iter_jsonl(args.dataset)):
+        if i >= args.requests:
+            break
+        messages = item["messages"][:-1]
+        _, free = generate_report(model, tokenizer, messages, structured=False,
+                                  max_new_tokens=args.free_max_new_tokens)
+        text, structured = generate_report(model, tokenizer, messages, budgets=budgets)
+        if args.show and i == 0:
+            print(text)
+        results.append({
+            "request": i,
+            "free_tokens": free["generated_tokens"],
+            "free_latency_sec": free["latency_sec"],
+            "structured_tokens": structured["generated_tokens"],
+            "structured_latency_sec": structured["latency_sec"],
+            "complete": structured["complete"],
+            "repetition_aborts": structured["repetition_aborts"],
+            "budget_aborts": structured["budget_aborts"],
+        })
+        print(f"  #{i}: 자유 {free['generated_tokens']} 토큰 {free['latency_sec']:.2f}초 → "
+              f"구조화 {structured['generated_tokens']} 토큰 {structured['latency_sec']:.2f}초 "
+              f"(반복 중단 {structured['repetition_aborts']}, 예산 중단 {structured['budget_aborts']})")
+
+    print(f"📉 평균 생성 토큰: {np.mean([r['free_tokens'] for r in results]):.0f} → "
+          f"{np.mean([r['structured_tokens'] for r in results]):.0f}")
+    environment = environment_info(args.model, args.dtype, device)
+    paths = write_results(results, environment, args.output_dir, "structured_decoding")
+    print(f"📁 결과: {paths['json']}")
+
+if __name__ == "__main__":
+    main()
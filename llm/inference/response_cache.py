@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Big5 분석 응답 캐시
+- 정확 일치: 정규화한 5개 특성 답변 + 생성 파라미터 해시
+- 유사 일치(선택): 특성별 답변 임베딩의 코사인 유사도가 모든 특성에서 임계값 이상이면 재사용
+- SQLite 파일에 저장해 재시작 후에도 유지, TTL 만료 + LRU 용량 제한, 적중률 지표
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+sys.path.insert(0, DATA_DIR)
+
+from big5_labels import BIG5_TRAITS, parse_user_answers
+from dedup_index import shingle_hashes
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "response_cache.sqlite")
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL_SEC = 7 * 24 * 3600
+DEFAULT_THRESHOLD = 0.9
+EMBEDDING_DIM = 512
+
+# 캐시 키에 들어가는 생성 파라미터 (나머지는 결과에 영향 없음)
+KEY_PARAMS = ["model", "temperature", "top_p", "top_k", "max_tokens", "seed", "system", "structured"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    params_key TEXT NOT NULL,
+    answers TEXT NOT NULL,
+    response TEXT NOT NULL,
+    embedding BLOB,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_params ON responses (params_key);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used_at);
+"""
+
+
+def normalize_text(text: str) -> str:
+    """유니코드 정규화 + 공백 정리 + 소문자 + 끝 문장부호 제거"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(".!?~ ")
+
+
+def normalize_answers(messages: List[Dict[str, str]]) -> Dict[str, str]:
+    """마지막 사용자 메시지에서 특성별 답변 추출 후 정규화
+
+    5개 특성을 모두 찾지 못하면 메시지 전체를 "_messages" 하나로 취급한다 (정확 일치만 사용).
+    """
+    user_messages = [msg["content"] for msg in messages if msg.get("role") == "user"]
+    answers = parse_user_answers(user_messages[-1]) if user_messages else {}
+    if len(answers) == len(BIG5_TRAITS):
+        return {trait: normalize_text(answers[trait]) for trait in BIG5_TRAITS}
+    return {"_messages": json.dumps([[msg.get("role"), normalize_text(msg.get("content", ""))] for msg in messages],
+                                    ensure_ascii=False)}
+
+
+def params_key(params: Dict[str, Any]) -> str:
+    """생성 파라미터 해시 (시스템 프롬프트는 내용 해시로 포함)"""
+    selected = {name: params.get(name) for name in KEY_PARAMS}
+    return hashlib.sha256(json.dumps(selected, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(answers: Dict[str, str], params: Dict[str, Any]) -> str:
+    payload = json.dumps([answers, params_key(params)], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def hashing_embedding(text: str, dim: int = EMBEDDING_DIM, shingle_size: int = 3) -> np.ndarray:
+    """문자 n-gram 해싱 임베딩 (모델 없이 철자/어순 수준의 유사도, L2 정규화)"""
+    vector = np.zeros(dim, dtype=np.float32)
+    hashes = np.asarray(list(shingle_hashes(text, shingle_size)), dtype=np.uint64)
+    if len(hashes):
+        np.add.at(vector, (hashes % dim).astype(np.int64), 1.0)
+        vector /= np.linalg.norm(vector)
+    return vector
+
+
+def embed_answers(answers: Dict[str, str], embed: Callable[[str], np.ndarray]) -> Optional[np.ndarray]:
+    """특성별 임베딩 [5, dim] (5개 특성 답변이 아니면 None)"""
+    if set(answers) != set(BIG5_TRAITS):
+        return None
+    return np.stack([embed(answers[trait]) for trait in BIG5_TRAITS]).astype(np.float32)
+
+
+class ResponseCache:
+    """SQLite 기반 2단계(정확/유사) 응답 캐시"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl_sec: float = DEFAULT_TTL_SEC, similarity_threshold: Optional[float] = None,
+                 embed: Callable[[str], np.ndarray] = hashing_embedding):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # 서버 핸들러 스레드들이 공유하므로 조회/저장은 잠금으로 직렬화
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed
+        self.metrics = {"lookups": 0, "exact_hits": 0, "near_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        # 유사 검색용 메모리 색인 {params_key: (keys, [n, 5, dim])}
+        self._vectors: Dict[str, Tuple[List[str], np.ndarray]] = {}
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "ResponseCache":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    # ---- 조회/저장 ----
+
+    def get(self, messages: List[Dict[str, str]], params: Dict[str, Any]) -> Tuple[Optional[str], str]:
+        """(응답, "exact" | "near" | "miss")"""
+        with self.lock:
+            return self._get(messages, params)
+
+    def put(self, messages: List[Dict[str, str]], params: Dict[str, Any], response: str) -> None:
+        """응답 저장 (용량 초과 시 가장 오래 안 쓴 항목부터 제거)"""
+        with self.lock:
+            self._put(messages, params, response)
+
+    def _get(self, messages: List[Dict[str, str]], params: Dict[str, Any]) -> Tuple[Optional[str], str]:
+        self.metrics["lookups"] += 1
+        now = time.time()
+        answers = normalize_answers(messages)
+        key = cache_key(answers, params)
+
+        row = self.conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            if now - row[1] <= self.ttl_sec:
+                self._touch(key, now)
+                self.metrics["exact_hits"] += 1
+                return row[0], "exact"
+            self._delete([key])
+            self.metrics["expired"] += 1
+
+        if self.similarity_threshold is not None:
+            near_key = self._nearest(answers, params_key(params), now)
+            while near_key is not None:
+                response, created_at = self.conn.execute(
+                    "SELECT response, created_at FROM responses WHERE key = ?", (near_key,)).fetchone()
+                if now - created_at <= self.ttl_sec:
+                    self._touch(near_key, now)
+                    self.metrics["near_hits"] += 1
+                    return response, "near"
+                # 벡터 인덱스는 만들 때의 만료 기준을 쓰므로 그 사이 만료된 항목은 정확 일치처럼 지우고 다시 찾음
+                self._delete([near_key])
+                self.metrics["expired"] += 1
+                near_key = self._nearest(answers, params_key(params), now)
+
+        self.metrics["misses"] += 1
+        return None, "miss"
+
+    def _put(self, messages: List[Dict[str, str]], params: Dict[str, Any], response: str) -> None:
+        now = time.time()
+        answers = normalize_answers(messages)
+        key = cache_key(answers, params)
+        # 유사 일치를 나중에 켜도 쓸 수 있도록 임베딩은 항상 저장
+        embedding = embed_answers(answers, self.embed)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, params_key, answers, response, embedding, created_at, last_used_at, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+            (key, params_key(params), json.dumps(answers, ensure_ascii=False), response,
+             embedding.tobytes() if embedding is not None else None, now, now))
+        self._vectors.pop(params_key(params), None)
+        self._evict()
+
+    def _touch(self, key: str, now: float) -> None:
+        self.conn.execute("UPDATE responses SET last_used_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+
+    def _delete(self, keys: List[str]) -> None:
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in keys])
+        self._vectors.clear()
+
+    def _evict(self) -> None:
+        count = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            keys = [row[0] for row in self.conn.execute(
+                "SELECT key FROM responses ORDER BY last_used_at LIMIT ?", (excess,))]
+            self._delete(keys)
+            self.metrics["evictions"] += len(keys)
+
+    def _nearest(self, answers: Dict[str, str], group: str, now: float) -> Optional[str]:
+        """같은 생성 파라미터 항목 중 특성별 최소 코사인 유사도가 가장 높은 항목 (임계값 이상일 때만)"""
+        query = embed_answers(answers, self.embed)
+        if query is None:
+            return None
+
+        if group not in self._vectors:
+            rows = self.conn.execute(
+                "SELECT key, embedding FROM responses WHERE params_key = ? AND embedding IS NOT NULL AND created_at >= ?",
+                (group, now - self.ttl_sec)).fetchall()
+            vectors = np.stack([np.frombuffer(blob, dtype=np.float32).reshape(len(BIG5_TRAITS), -1)
+                                for _, blob in rows]) if rows else np.zeros((0,) + query.shape, dtype=np.float32)
+            self._vectors[group] = ([key for key, _ in rows], vectors)
+
+        keys, vectors = self._vectors[group]
+        if not keys:
+            return None
+        similarity = np.einsum("ntd,td->nt", vectors, query).min(axis=1)
+        best = int(similarity.argmax())
+        return keys[best] if similarity[best] >= self.similarity_threshold else None
+
+    # ---- 지표 ----
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.metrics["lookups"]
+        hits = self.metrics["exact_hits"] + self.metrics["near_hits"]
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return dict(self.metrics, entries=entries, hit_rate=hits / lookups if lookups else 0.0)
+
+    def print_stats(self) -> None:
+        stats = self.stats()
+        print(f"📦 캐시 항목: {stats['entries']:,}개")
+        print(f"🎯 적중률: {stats['hit_rate']:.1%} (정확 {stats['exact_hits']:,} / 유사 {stats['near_hits']:,} / 미스 {stats['misses']:,})")
+        print(f"🧹 만료 {stats['expired']:,}건 / LRU 제거 {stats['evictions']:,}건")
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="Big5 응답 캐시 관리")
+    parser.add_argument("command", choices=["stats", "clear"])
+    parser.add_argument("--path", default=DEFAULT_CACHE_PATH)
+    args = parser.parse_args()
+
+    with ResponseCache(args.path) as cache:
+        if args.command == "clear":
+            cache.conn.execute("DELETE FROM responses")
+            print("🧹 응답 캐시를 비웠습니다.")
+        cache.print_stats()
+
+if __name__ == "__main__":
+    main()
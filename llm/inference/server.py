@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+OpenAI 호환 Big5 추론 서버
+POST /v1/chat/completions (일반 응답 + SSE 스트리밍), GET /v1/models, GET /health
+"structured": true면 리포트 골격을 강제하는 구조화 디코딩(report_decoding) 사용
+스트리밍 요청에 "sections": true를 주면 리포트 섹션 헤더마다 'event: section' SSE 이벤트를 함께 전송
+동시 요청은 ContinuousBatchingEngine의 디코드 루프 하나를 공유하고,
+대기열이 가득 차면 429 + Retry-After로 배압을 건다
+--response-cache를 주면 같은(또는 유사한) 답변 세트의 리포트를 생성 없이 재사용 (X-Cache 헤더)
+--adapter 이름=경로로 LoRA 어댑터를 등록하면 요청의 "model"이 그 이름일 때 해당 어댑터로 생성
+(기반 모델은 한 벌만 올리고 어댑터가 다른 요청도 한 배치로 디코딩)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Iterable, Optional
+
+import torch
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+sys.path.insert(0, DATA_DIR)
+
+from final_100_datasets import SYSTEM_PROMPT
+from token_cache import CUTOFF_LEN, render_chatml
+from benchmark import eos_ids
+from batching import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAITING, ContinuousBatchingEngine, EngineOverloaded, GenerationRequest
+from model_loader import DEFAULT_MODEL, DTYPES, default_device, load_model_and_tokenizer
+from multi_lora import AdapterRegistry, parse_adapter_specs
+from report_decoding import ReportDecoder, max_report_tokens
+from prefix_cache import DEFAULT_CAPACITY, PrefixCache, prefix_length, system_prefix
+from response_cache import DEFAULT_CACHE_PATH, DEFAULT_THRESHOLD, DEFAULT_TTL_SEC, ResponseCache
+from streaming import iter_report_events, iter_text_deltas
+
+SERVED_MODEL_NAME = "qwen2-1.5b-big5-full"  # app/services/Big5AnalyzerService.ts MODEL_NAME
+DEFAULT_MAX_TOKENS = 512
+MAX_TOKENS_LIMIT = 2048
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str, error_type: str = "invalid_request_error"):
+        super().__init__(message)
+        self.status = status
+        self.error_type = error_type
+
+
+def prepare_messages(messages: List[Dict[str, str]], default_system: Optional[str] = SYSTEM_PROMPT) -> List[Dict[str, str]]:
+    """요청 메시지 검증 (시스템 메시지가 없으면 학습 시 시스템 프롬프트 사용)"""
+    if not messages or any(not isinstance(msg.get("content"), str) for msg in messages):
+        raise ApiError(400, "'messages'는 content 문자열을 가진 메시지 목록이어야 합니다")
+    if messages[0].get("role") != "system" and default_system:
+        messages = [{"role": "system", "content": default_system}] + list(messages)
+    return messages
+
+
+def build_prompt(messages: List[Dict[str, str]], default_system: Optional[str] = SYSTEM_PROMPT) -> str:
+    """학습 데이터와 같은 ChatML 프롬프트"""
+    return render_chatml(prepare_messages(messages, default_system), add_generation_prompt=True)
+
+
+def generation_params(body: Dict[str, Any], messages: List[Dict[str, str]], model_name: str,
+                      structured_max_tokens: int = DEFAULT_MAX_TOKENS) -> Dict[str, Any]:
+    """요청 본문의 생성 파라미터 (응답 캐시 키에도 사용)
+
+    구조화 디코딩은 섹션 예산 합계가 상한이므로 max_tokens를 주지 않으면 그 값을 쓴다.
+    """
+    system = messages[0]["content"] if messages[0].get("role") == "system" else ""
+    structured = bool(body.get("structured"))
+    default_max_tokens = structured_max_tokens if structured else DEFAULT_MAX_TOKENS
+    return {
+        "model": model_name,
+        "structured": structured,
+        "max_tokens": min(int(body.get("max_tokens") or default_max_tokens), MAX_TOKENS_LIMIT),
+        "temperature": float(body.get("temperature", 0.7)),
+        "top_p": float(body.get("top_p", 0.9)),
+        "top_k": int(body.get("top_k", 50)),
+        "seed": body.get("seed"),
+        "system": hashlib.sha256(system.encode("utf-8")).hexdigest()[:16],
+    }
+
+
+class InferenceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, engine: ContinuousBatchingEngine, model_name: str = SERVED_MODEL_NAME,
+                 cutoff_len: int = CUTOFF_LEN, response_cache: Optional[ResponseCache] = None,
+                 allow_adapter_updates: bool = False):
+        super().__init__(address, ChatCompletionHandler)
+        self.engine = engine
+        self.model_name = model_name
+        self.cutoff_len = cutoff_len
+        self.response_cache = response_cache
+        self.allow_adapter_updates = allow_adapter_updates
+        self.structured_max_tokens = max_report_tokens(engine.tokenizer)
+        # 기반 모델 토크나이저의 EOS는 <|endoftext|>이므로 ChatML 턴 종료(<|im_end|>)도 함께 멈춤
+        self.stop_token_ids = eos_ids(engine.model, engine.tokenizer)
+
+    def resolve_adapter(self, model: Optional[str]) -> Optional[str]:
+        """요청의 "model" → 어댑터 이름 (생략하거나 기반 모델 이름이면 None)"""
+        if not model or model == self.model_name:
+            return None
+        if self.engine.adapters is None or model not in self.engine.adapters:
+            raise ApiError(404, f"알 수 없는 모델: {model}", "model_not_found")
+        return model
+
+
+class ChatCompletionHandler(BaseHTTPRequestHandler):
+    server: InferenceServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    # ---- 응답 헬퍼 ----
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, error: ApiError) -> None:
+        headers = {"Retry-After": "1"} if error.status == 429 else None
+        self._send_json(error.status, {"error": {"message": str(error), "type": error.error_type}}, headers)
+
+    def _send_event(self, payload: Any, event: Optional[str] = None) -> None:
+        data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+        chunk = (f"event: {event}\n" if event else "") + f"data: {data}\n\n"
+        chunk = chunk.encode("utf-8")
+        self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+        self.wfile.flush()
+
+    # ---- 라우팅 ----
+
+    def do_OPTIONS(self) -> None:
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, DELETE, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type, Authorization")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            stats = dict(status="ok", model=self.server.model_name, **self.server.engine.stats())
+            if self.server.response_cache is not None:
+                stats["response_cache"] = self.server.response_cache.stats()
+            self._send_json(200, stats)
+        elif self.path == "/v1/models":
+            models = [{"id": self.server.model_name, "object": "model", "owned_by": "local"}]
+            if self.server.engine.adapters is not None:
+                models += [{"id": name, "object": "model", "owned_by": "local", "parent": self.server.model_name}
+                           for name in self.server.engine.adapters.names]
+            self._send_json(200, {"object": "list", "data": models})
+        elif self.path == "/v1/adapters" and self.server.engine.adapters is not None:
+            self._send_json(200, self.server.engine.adapters.stats())
+        else:
+            self._send_error(ApiError(404, f"알 수 없는 경로: {self.path}", "not_found"))
+
+    def do_POST(self) -> None:
+        if self.path == "/v1/adapters":
+            self._update_adapters()
+            return
+        if self.path != "/v1/chat/completions":
+            self._send_error(ApiError(404, f"알 수 없는 경로: {self.path}", "not_found"))
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            messages = prepare_messages(body.get("messages") or [])
+            adapter = self.server.resolve_adapter(body.get("model"))
+            self.response_model = adapter or self.server.model_name
+            params = generation_params(body, messages, self.response_model, self.server.structured_max_tokens)
+
+            cache = self.server.response_cache
+            if cache is not None:
+                text, cache_status = cache.get(messages, params)
+                if text is not None:
+                    self._respond_cached(body, messages, text, cache_status)
+                    return
+            request = self._submit(params, messages, adapter)
+        except json.JSONDecodeError:
+            self._send_error(ApiError(400, "요청 본문이 올바른 JSON이 아닙니다"))
+            return
+        except (ApiError, ValueError) as e:
+            self._send_error(e if isinstance(e, ApiError) else ApiError(400, str(e)))
+            return
+
+        if body.get("stream"):
+            text = self._stream(request, bool(body.get("sections")))
+        else:
+            text = self._complete(request)
+        if text is not None and self.server.response_cache is not None and request.finish_reason in ("stop", "length"):
+            self.server.response_cache.put(messages, params, text)
+
+    def do_DELETE(self) -> None:
+        if self.path.startswith("/v1/adapters/"):
+            self._update_adapters(self.path[len("/v1/adapters/"):])
+        else:
+            self._send_error(ApiError(404, f"알 수 없는 경로: {self.path}", "not_found"))
+
+    def _update_adapters(self, remove: Optional[str] = None) -> None:
+        """POST /v1/adapters {"name", "path"}: 등록(같은 이름이면 교체), DELETE /v1/adapters/<이름>: 해제
+
+        진행 중인 요청은 원래 어댑터로 끝까지 생성하고, 이후 요청부터 바뀐 어댑터를 사용한다.
+        """
+        adapters = self.server.engine.adapters
+        try:
+            if adapters is None or not self.server.allow_adapter_updates:
+                raise ApiError(403, "어댑터 변경이 허용되지 않았습니다 (--allow-adapter-updates)", "permission_denied")
+            if remove is not None:
+                adapters.unregister(remove)
+                self._send_json(200, {"name": remove, "deleted": True})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not body.get("name") or not body.get("path") or body["name"] == self.server.model_name:
+                raise ApiError(400, "'name'(기반 모델 이름 제외)과 'path'가 필요합니다")
+            info = adapters.register(body["name"], body["path"])
+            self._send_json(200, info)
+        except KeyError:
+            self._send_error(ApiError(404, f"알 수 없는 어댑터: {remove}", "model_not_found"))
+        except json.JSONDecodeError:
+            self._send_error(ApiError(400, "요청 본문이 올바른 JSON이 아닙니다"))
+        except (OSError, ValueError) as e:
+            self._send_error(ApiError(400, f"어댑터를 불러올 수 없습니다: {e}"))
+        except ApiError as e:
+            self._send_error(e)
+
+    # ---- 생성 ----
+
+    def _submit(self, params: Dict[str, Any], messages: List[Dict[str, str]],
+                adapter: Optional[str] = None) -> GenerationRequest:
+        tokenizer = self.server.engine.tokenizer
+        prompt_ids = tokenizer(render_chatml(messages, add_generation_prompt=True), add_special_tokens=False)["input_ids"]
+        if len(prompt_ids) + params["max_tokens"] > self.server.cutoff_len + MAX_TOKENS_LIMIT:
+            raise ApiError(400, f"프롬프트가 너무 깁니다 ({len(prompt_ids)} 토큰)")
+
+        request = GenerationRequest(
+            prompt_ids,
+            max_new_tokens=params["max_tokens"],
+            temperature=params["temperature"],
+            top_p=params["top_p"],
+            top_k=params["top_k"],
+            stop_token_ids=self.server.stop_token_ids,
+            seed=params["seed"],
+            prefix_len=prefix_length(tokenizer, prompt_ids, system_prefix(messages)),
+            logits_processor=ReportDecoder(tokenizer).process if params["structured"] else None,
+            adapter=adapter,
+        )
+        try:
+            return self.server.engine.submit(request)
+        except EngineOverloaded as e:
+            raise ApiError(429, str(e), "server_overloaded")
+        except KeyError:
+            raise ApiError(404, f"알 수 없는 모델: {adapter}", "model_not_found")
+
+    def _usage(self, prompt_tokens: int, completion_tokens: int) -> Dict[str, int]:
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def _chunk(self) -> Dict[str, Any]:
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": self.response_model,
+        }
+
+    def _send_completion(self, text: str, finish_reason: str, usage: Dict[str, int], cache_status: str) -> None:
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": self.response_model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": finish_reason,
+            }],
+            "usage": usage,
+        }, {"X-Cache": cache_status})
+
+    def _start_stream(self, cache_status: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("X-Cache", cache_status)
+        self.end_headers()
+
+    def _finish_stream(self, chunk: Dict[str, Any], finish_reason: str, usage: Dict[str, int]) -> None:
+        self._send_event(dict(chunk, choices=[{"index": 0, "delta": {}, "finish_reason": finish_reason}], usage=usage))
+        self._send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _respond_cached(self, body: Dict[str, Any], messages: List[Dict[str, str]], text: str,
+                        cache_status: str) -> None:
+        """캐시된 리포트 응답 (스트리밍 요청이면 한 번에 한 조각으로 전송)"""
+        tokenizer = self.server.engine.tokenizer
+        prompt = render_chatml(messages, add_generation_prompt=True)
+        usage = self._usage(len(tokenizer(prompt, add_special_tokens=False)["input_ids"]),
+                            len(tokenizer(text, add_special_tokens=False)["input_ids"]))
+        if not body.get("stream"):
+            self._send_completion(text, "stop", usage, cache_status)
+            return
+        chunk = self._chunk()
+        try:
+            self._start_stream(cache_status)
+            self._send_event(dict(chunk, choices=[{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]))
+            self._send_deltas(chunk, [text], bool(body.get("sections")))
+            self._finish_stream(chunk, "stop", usage)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _complete(self, request: GenerationRequest) -> Optional[str]:
+        try:
+            output_ids = request.result()
+        except Exception as e:
+            self._send_error(ApiError(500, f"생성 실패: {e}", "server_error"))
+            return None
+        text = self.server.engine.tokenizer.decode(output_ids, skip_special_tokens=True)
+        finish_reason = "stop" if request.finish_reason == "stop" else "length"
+        self._send_completion(text, finish_reason, self._usage(len(request.prompt_ids), len(output_ids)), "miss")
+        return text
+
+    def _send_deltas(self, chunk: Dict[str, Any], deltas: Iterable[str], sections: bool = False) -> str:
+        """텍스트 조각을 content 청크로 전송 (sections면 섹션 헤더를 'event: section'으로 추가 전송)"""
+        parts = []
+        events = iter_report_events(deltas) if sections else ({"type": "text", "text": delta} for delta in deltas)
+        for event in events:
+            if event["type"] == "section":
+                self._send_event(event, "section")
+                continue
+            parts.append(event["text"])
+            self._send_event(dict(chunk, choices=[{"index": 0, "delta": {"content": event["text"]}, "finish_reason": None}]))
+        return "".join(parts)
+
+    def _stream(self, request: GenerationRequest, sections: bool = False) -> Optional[str]:
+        """SSE 스트리밍 (chat.completion.chunk), 연결이 끊기면 요청 취소"""
+        self._start_stream("miss")
+        chunk = self._chunk()
+        try:
+            self._send_event(dict(chunk, choices=[{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]))
+            text = self._send_deltas(chunk, iter_text_deltas(self.server.engine.tokenizer, request.iter_tokens()),
+                                     sections)
+            finish_reason = "stop" if request.finish_reason == "stop" else "length"
+            self._finish_stream(chunk, finish_reason, self._usage(len(request.prompt_ids), len(request.output_ids)))
+            return text
+        except (BrokenPipeError, ConnectionResetError):
+            request.cancel()
+        except Exception as e:
+            request.cancel()
+            self._send_event({"error": {"message": f"생성 실패: {e}", "type": "server_error"}})
+            self.wfile.write(b"0\r\n\r\n")
+        return None
+
+
+def create_server(model_name: str = DEFAULT_MODEL, dtype: str = "float16", device: Optional[torch.device] = None,
+                  host: str = "127.0.0.1", port: int = 8000, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                  max_waiting: int = DEFAULT_MAX_WAITING, served_model_name: str = SERVED_MODEL_NAME,
+                  prefix_cache_size: int = DEFAULT_CAPACITY,
+                  response_cache: Optional[ResponseCache] = None, adapters: Optional[Dict[str, str]] = None,
+                  allow_adapter_updates: bool = False) -> InferenceServer:
+    """모델을 로드하고 엔진을 시작한 서버 (serve_forever 호출 전)
+
+    adapters({이름: 경로})를 주거나 실행 중 등록을 허용하면 LoRA 어댑터 레지스트리를 붙인다.
+    """
+    model, tokenizer, _ = load_model_and_tokenizer(model_name, dtype, device)
+    prefix_cache = PrefixCache(model, prefix_cache_size) if prefix_cache_size > 0 else None
+    registry = None
+    if adapters or allow_adapter_updates:
+        registry = AdapterRegistry(model)
+        for name, path in (adapters or {}).items():
+            registry.register(name, path)
+    engine = ContinuousBatchingEngine(model, tokenizer, max_batch_size, max_waiting, prefix_cache, registry).start()
+    return InferenceServer((host, port), engine, served_model_name, response_cache=response_cache,
+                           allow_adapter_updates=allow_adapter_updates)
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="OpenAI 호환 Big5 추론 서버")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="병합된 파인튜닝 모델 경로 또는 허브 이름")
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float16")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-waiting", type=int, default=DEFAULT_MAX_WAITING, help="대기열 한도 (초과 시 429)")
+    parser.add_argument("--served-model-name", default=SERVED_MODEL_NAME)
+    parser.add_argument("--prefix-cache-size", type=int, default=DEFAULT_CAPACITY, help="시스템 프롬프트 KV 캐시 항목 수 (0이면 비활성)")
+    parser.add_argument("--response-cache", default=None, nargs="?", const=DEFAULT_CACHE_PATH,
+                        help="응답 캐시 SQLite 경로 (옵션만 주면 기본 경로)")
+    parser.add_argument("--similarity-threshold", type=float, default=None,
+                        help=f"유사 답변 재사용 임계값 (예: {DEFAULT_THRESHOLD}, 생략하면 정확 일치만)")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL_SEC, help="응답 캐시 유효 시간(초)")
+    parser.add_argument("--adapter", action="append", default=[], metavar="NAME=PATH",
+                        help="LoRA 어댑터 등록 (여러 번 지정, 요청의 model에 이름을 넣어 선택)")
+    parser.add_argument("--allow-adapter-updates", action="store_true",
+                        help="POST /v1/adapters, DELETE /v1/adapters/<이름>으로 실행 중 어댑터 교체 허용")
+    args = parser.parse_args()
+
+    response_cache = None
+    if args.response_cache:
+        response_cache = ResponseCache(args.response_cache, ttl_sec=args.cache_ttl,
+                                       similarity_threshold=args.similarity_threshold)
+
+    device = torch.device(args.device) if args.device else default_device()
+    print(f"🚀 추론 서버 시작... ({args.model}, {args.dtype}, {device})")
+    server = create_server(args.model, args.dtype, device, args.host, args.port,
+                           args.max_batch_size, args.max_waiting, args.served_model_name, args.prefix_cache_size,
+                           response_cache, parse_adapter_specs(args.adapter), args.allow_adapter_updates)
+    print(f"🔌 http://{args.host}:{args.port}/v1/chat/completions (최대 배치 {args.max_batch_size}, 대기열 {args.max_waiting})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.engine.stop()
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
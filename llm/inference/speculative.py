@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+추측(speculative) 디코딩
+초안 생성기가 다음 토큰 여러 개를 제안하면 파인튜닝 모델이 한 번의 순전파로 모두 검증하고
+앞에서부터 일치하는 만큼 받아들인 뒤 (+ 모델이 고른 다음 토큰 1개) 이어서 진행
+- ModelDraft: 같은 토크나이저를 쓰는 작은 초안 모델 (예: Qwen2-0.5B)
+- NgramDraft: 학습 데이터 리포트(llm/data/*.jsonl assistant 메시지)의 토큰 n-gram 표
+- lookup_index.SuffixArrayDraft: 같은 리포트의 접미사 배열에서 가장 길게 일치하는 구간의 뒤를 제안
+검증은 greedy 기준이므로 출력은 초안 없이 greedy 디코딩한 결과와 같다
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from collections import Counter
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+import torch
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+sys.path.insert(0, DATA_DIR)
+
+from jsonl_io import iter_jsonl_files
+from batching import build_cache, cache_layers
+from benchmark import DEFAULT_DATASET, DEFAULT_OUTPUT_DIR, eos_ids, environment_info, load_prompt_pool, write_results
+from model_loader import DEFAULT_MODEL, DTYPES, default_device, load_model_and_tokenizer
+
+DEFAULT_NUM_DRAFT_TOKENS = 4
+DEFAULT_NGRAM_ORDER = 4
+MIN_NGRAM_ORDER = 2
+
+
+def crop_cache(cache: Any, length: int) -> Any:
+    """KV 캐시를 앞쪽 length 위치만 남기도록 자르기 (거절된 초안 토큰 제거)"""
+    return build_cache([(k[:, :, :length], v[:, :, :length]) for k, v in cache_layers(cache)])
+
+
+def iter_report_texts(filenames: Optional[List[str]] = None) -> Iterator[str]:
+    """학습 데이터의 assistant 리포트 (파일 간 중복 제거)"""
+    filenames = filenames or sorted(glob.glob(os.path.join(DATA_DIR, "*.jsonl")))
+    seen = set()
+    for item in iter_jsonl_files(filenames):
+        for msg in item["messages"]:
+            if msg["role"] == "assistant" and msg["content"] not in seen:
+                seen.add(msg["content"])
+                yield msg["content"]
+
+
+class NgramDraft:
+    """학습 리포트 토큰 n-gram → 가장 흔한 다음 토큰 (긴 문맥부터 짧은 문맥으로 후퇴)"""
+
+    def __init__(self, sequences: Iterable[List[int]], order: int = DEFAULT_NGRAM_ORDER,
+                 min_order: int = MIN_NGRAM_ORDER):
+        self.order = order
+        self.min_order = min_order
+        counts: Dict[Tuple[int, ...], Counter] = {}
+        for ids in sequences:
+            for n in range(min_order, order + 1):
+                for i in range(n, len(ids)):
+                    counts.setdefault(tuple(ids[i - n:i]), Counter())[ids[i]] += 1
+        self.table = {context: counter.most_common(1)[0][0] for context, counter in counts.items()}
+
+    @classmethod
+    def from_reports(cls, tokenizer: Any, filenames: Optional[List[str]] = None,
+                     order: int = DEFAULT_NGRAM_ORDER) -> "NgramDraft":
+        texts = list(iter_report_texts(filenames))
+        return cls(tokenizer(texts, add_special_tokens=False)["input_ids"], order)
+
+    def propose(self, ids: List[int], num_tokens: int) -> List[int]:
+        draft: List[int] = []
+        context = list(ids[-self.order:])
+        for _ in range(num_tokens):
+            for n in range(min(self.order, len(context)), self.min_order - 1, -1):
+                token_id = self.table.get(tuple(context[-n:]))
+                if token_id is not None:
+                    break
+            else:
+                break
+            draft.append(token_id)
+            context = (context + [token_id])[-self.order:]
+        return draft
+
+
+class ModelDraft:
+    """작은 초안 모델로 greedy 제안 (자체 KV 캐시를 수락된 토큰열에 맞춰 유지)"""
+
+    def __init__(self, model: Any):
+        self.model = model
+        self.device = next(model.parameters()).device
+        self.cache: Any = None
+        self.cached_ids: List[int] = []
+
+    def _sync(self, ids: List[int]) -> None:
+        """캐시된 토큰열과 ids의 공통 접두사까지만 캐시 유지"""
+        common = 0
+        for a, b in zip(self.cached_ids, ids):
+            if a != b:
+                break
+            common += 1
+        # 마지막 토큰은 다음 단계 입력으로 다시 넣어야 하므로 캐시에 남기지 않음
+        common = min(common, len(ids) - 1)
+        if self.cache is None or common == 0:
+            self.cache, self.cached_ids = build_cache([]), []
+        elif common < len(self.cached_ids):
+            self.cache = crop_cache(self.cache, common)
+            self.cached_ids = self.cached_ids[:common]
+
+    def propose(self, ids: List[int], num_tokens: int) -> List[int]:
+        self._sync(ids)
+        draft: List[int] = []
+        pending = ids[len(self.cached_ids):]
+        with torch.no_grad():
+            for _ in range(num_tokens):
+                input_ids = torch.tensor([pending], device=self.device)
+                outputs = self.model(input_ids=input_ids, past_key_values=self.cache, use_cache=True)
+                self.cache = outputs.past_key_values
+                self.cached_ids = self.cached_ids + pending
+                token_id = int(outputs.logits[0, -1].argmax())
+                draft.append(token_id)
+                pending = [token_id]
+        return draft
+
+
+def speculative_generate(model: Any, input_ids: List[int], drafter: Optional[Any] = None,
+                         max_new_tokens: int = 256, num_draft_tokens: int = DEFAULT_NUM_DRAFT_TOKENS,
+                         eos_token_ids: Iterable[int] = ()) -> Tuple[List[int], Dict[str, Any]]:
+    """배치 1 greedy 생성 (drafter가 없으면 단계당 1토큰인 기준선) → (생성 토큰, 통계)"""
+    device = next(model.parameters()).device
+    eos = set(eos_token_ids)
+    stats = {"steps": 0, "proposed": 0, "accepted": 0}
+
+    with torch.no_grad():
+        outputs = model(input_ids=torch.tensor([input_ids], device=device), past_key_values=build_cache([]),
+                        use_cache=True)
+        cache = outputs.past_key_values
+        ids = list(input_ids) + [int(outputs.logits[0, -1].argmax())]
+        generated = ids[len(input_ids):]
+
+        while len(generated) < max_new_tokens and generated[-1] not in eos:
+            draft = drafter.propose(ids, num_draft_tokens) if drafter is not None else []
+            # 남은 토큰 수보다 많이 검증할 필요 없음
+            draft = draft[:max_new_tokens - len(generated) - 1]
+
+            cached_len = len(ids) - 1
+            outputs = model(input_ids=torch.tensor([ids[-1:] + draft], device=device), past_key_values=cache,
+                            use_cache=True)
+            predictions = outputs.logits[0].argmax(dim=-1).tolist()
+
+            accepted = 0
+            while accepted < len(draft) and draft[accepted] == predictions[accepted]:
+                accepted += 1
+            new_tokens = draft[:accepted] + [predictions[accepted]]
+            # 캐시에는 ids[-1] + 수락된 초안까지만 남김 (마지막 새 토큰은 다음 단계 입력)
+            cache = crop_cache(outputs.past_key_values, cached_len + 1 + accepted)
+
+            stats["steps"] += 1
+            stats["proposed"] += len(draft)
+            stats["accepted"] += accepted
+            for token_id in new_tokens:
+                ids.append(token_id)
+                generated.append(token_id)
+                if token_id in eos:
+                    break
+
+    stats["generated_tokens"] = len(generated)
+    stats["acceptance_rate"] = stats["accepted"] / stats["proposed"] if stats["proposed"] else 0.0
+    stats["accepted_per_step"] = stats["accepted"] / stats["steps"] if stats["steps"] else 0.0
+    stats["tokens_per_step"] = (len(generated) - 1) / stats["steps"] if stats["steps"] else 0.0
+    return generated, stats
+
+
+def run_speculative_benchmark(model: Any, tokenizer: Any, drafter: Any, dataset: str = DEFAULT_DATASET,
+                              requests: int = 8, max_new_tokens: int = 128,
+                              num_draft_tokens: int = DEFAULT_NUM_DRAFT_TOKENS, warmup: int = 1) -> Dict[str, Any]:
+    """같은 프롬프트로 기준선(초안 없음)과 추측 디코딩을 번갈아 측정"""
+    pool = load_prompt_pool(tokenizer, dataset, requests + warmup)
+    eos = eos_ids(model, tokenizer)
+    baseline_times, speculative_times, tokens, matches = [], [], [], 0
+    totals = {"steps": 0, "proposed": 0, "accepted": 0}
+
+    for i, prompt_ids in enumerate(pool):
+        start_time = time.perf_counter()
+        baseline, _ = speculative_generate(model, prompt_ids, None, max_new_tokens, eos_token_ids=eos)
+        baseline_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        generated, stats = speculative_generate(model, prompt_ids, drafter, max_new_tokens, num_draft_tokens, eos)
+        speculative_time = time.perf_counter() - start_time
+        if i < warmup:
+            continue
+
+        baseline_times.append(baseline_time)
+        speculative_times.append(speculative_time)
+        tokens.append(len(generated))
+        matches += generated == baseline
+        for key in totals:
+            totals[key] += stats[key]
+
+    total_tokens = sum(tokens)
+    return {
+        "requests": len(tokens),
+        "max_new_tokens": max_new_tokens,
+        "num_draft_tokens": num_draft_tokens,
+        "generated_tokens": total_tokens,
+        "baseline_tokens_per_sec": total_tokens / sum(baseline_times),
+        "speculative_tokens_per_sec": total_tokens / sum(speculative_times),
+        "speedup": sum(baseline_times) / sum(speculative_times),
+        "acceptance_rate": totals["accepted"] / totals["proposed"] if totals["proposed"] else 0.0,
+        "accepted_per_step": totals["accepted"] / totals["steps"] if totals["steps"] else 0.0,
+        "tokens_per_step": (total_tokens - len(tokens)) / totals["steps"] if totals["steps"] else 0.0,
+        "identical_outputs": matches,
+    }
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="추측 디코딩 벤치마크 (수락률, 속도 향상)")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float16")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--draft", default="ngram",
+                        help="'ngram', 'suffix'(접미사 배열 색인) 또는 초안 모델 경로/이름 (예: Qwen/Qwen2-0.5B)")
+    parser.add_argument("--ngram-order", type=int, default=DEFAULT_NGRAM_ORDER)
+    parser.add_argument("--num-draft-tokens", type=int, default=DEFAULT_NUM_DRAFT_TOKENS)
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    device = torch.device(args.device) if args.device else default_device()
+    model, tokenizer, _ = load_model_and_tokenizer(args.model, args.dtype, device)
+
+    start_time = time.time()
+    if args.draft == "ngram":
+        drafter = NgramDraft.from_reports(tokenizer, order=args.ngram_order)
+        print(f"📚 n-gram 초안 표: {len(drafter.table):,}개 문맥 ({time.time() - start_time:.2f}초)")
+    elif args.draft == "suffix":
+        from lookup_index import SuffixArrayDraft, load_or_build_index
+
+        index, timings = load_or_build_index(tokenizer)
+        drafter = SuffixArrayDraft(index)
+        print(f"📚 접미사 배열 색인: {len(index):,} 토큰 ({timings['index']}, {timings['index_sec']:.3f}초)")
+    else:
+        draft_model, _, _ = load_model_and_tokenizer(args.draft, args.dtype, device)
+        drafter = ModelDraft(draft_model)
+        print(f"🤖 초안 모델: {args.draft} ({time.time() - start_time:.2f}초)")
+
+    print(f"🚀 추측 디코딩 벤치마크 시작... ({args.model}, 초안 {args.num_draft_tokens}토큰)")
+    result = run_speculative_benchmark(model, tokenizer, drafter, args.dataset, args.requests,
+                                       args.max_new_tokens, args.num_draft_tokens)
+    result["draft"] = args.draft
+    if hasattr(drafter, "metrics"):
+        result["draft_sources"] = dict(drafter.metrics)
+
+    print(f"✅ 수락률: {result['acceptance_rate']:.1%} (단계당 수락 {result['accepted_per_step']:.2f}, "
+          f"생성 {result['tokens_per_step']:.2f} 토큰)")
+    print(f"⚡ {result['baseline_tokens_per_sec']:.1f} → {result['speculative_tokens_per_sec']:.1f} tok/s "
+          f"(x{result['speedup']:.2f})")
+    print(f"🔍 greedy 결과 일치: {result['identical_outputs']}/{result['requests']}")
+
+    environment = environment_info(args.model, args.dtype, device)
+    paths = write_results([result], environment, args.output_dir, "speculative")
+    print(f"📁 결과: {paths['json']}")
+
+if __name__ == "__main__":
+    main()
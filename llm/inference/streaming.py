@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Big5 리포트 스트리밍 생성
+토큰이 나올 때마다 확정된 한국어 텍스트 조각을 내보내고 (UTF-8 조각이 끝나지 않은 토큰은 보류),
+'## 종합 의견', '### 개방성 (Openness): 높음' 같은 섹션 헤더는 구조화된 이벤트로 따로 전달
+"""
+
+import argparse
+import asyncio
+import os
+import queue
+import sys
+import threading
+import time
+from typing import List, Dict, Any, AsyncIterator, Iterable, Iterator, Optional
+
+import torch
+from transformers.generation.stopping_criteria import StoppingCriteria, StoppingCriteriaList
+from transformers.generation.streamers import BaseStreamer
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+sys.path.insert(0, DATA_DIR)
+
+from big5_labels import TRAIT_HEADER_PATTERN, normalize_level
+from final_100_datasets import SYSTEM_PROMPT
+from token_cache import render_chatml
+from benchmark import eos_ids
+from model_loader import DEFAULT_MODEL, DTYPES, RemoteModel, default_device, load_model_and_tokenizer
+
+# 디코딩 시 앞쪽 문맥으로 함께 디코딩할 토큰 수 (단어 경계 공백 처리용)
+CONTEXT_TOKENS = 5
+
+_END = object()
+
+
+def iter_text_deltas(tokenizer: Any, token_ids: Iterable[int]) -> Iterator[str]:
+    """토큰이 들어올 때마다 새로 확정된 텍스트만 반환
+
+    전체를 매번 다시 디코딩하지 않고 최근 몇 토큰 창만 디코딩한다.
+    바이트 단위 BPE에서 한글 한 글자가 여러 토큰에 걸치면 끝에 U+FFFD가 나오므로 다음 토큰까지 보류.
+    """
+    ids: List[int] = []
+    prefix_offset = 0  # 문맥 창 시작
+    read_offset = 0  # 이미 내보낸 토큰 끝
+    for token_id in token_ids:
+        ids.append(token_id)
+        prefix_text = tokenizer.decode(ids[prefix_offset:read_offset], skip_special_tokens=True)
+        text = tokenizer.decode(ids[prefix_offset:], skip_special_tokens=True)
+        if text.endswith("�") or len(text) <= len(prefix_text):
+            continue
+        yield text[len(prefix_text):]
+        read_offset = len(ids)
+        prefix_offset = max(0, read_offset - CONTEXT_TOKENS)
+
+    # 끝까지 완성되지 않은 바이트가 남았으면 그대로 내보냄
+    prefix_text = tokenizer.decode(ids[prefix_offset:read_offset], skip_special_tokens=True)
+    text = tokenizer.decode(ids[prefix_offset:], skip_special_tokens=True)
+    if len(text) > len(prefix_text):
+        yield text[len(prefix_text):]
+
+
+def parse_section(line: str) -> Optional[Dict[str, Any]]:
+    """'## ...' / '### ...' 헤더 줄을 섹션 이벤트로 변환 (헤더가 아니면 None)"""
+    stripped = line.strip()
+    depth = len(stripped) - len(stripped.lstrip("#"))
+    if depth not in (2, 3) or not stripped[depth:].startswith(" "):
+        return None
+
+    section = {"type": "section", "depth": depth, "title": stripped[depth:].strip(), "trait": None, "level": None}
+    match = TRAIT_HEADER_PATTERN.match(stripped)
+    if match:
+        section["title"] = match.group(1)
+        section["trait"] = match.group(2).lower()
+        section["level"] = normalize_level(match.group(3))
+    return section
+
+
+def iter_report_events(deltas: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """텍스트 조각 → {"type": "text", "text"} / {"type": "section", ...} 이벤트
+
+    '#'로 시작하는 줄은 헤더일 수 있으므로 줄이 끝날 때까지 모았다가 판단하고,
+    나머지 텍스트는 도착하는 즉시 내보낸다. 헤더 줄 자체도 text 이벤트로 함께 전달된다.
+    """
+    pending = ""  # 아직 헤더 여부를 모르는 줄
+    at_line_start = True
+    for delta in deltas:
+        for piece in delta.splitlines(keepends=True):
+            if pending or (at_line_start and piece.lstrip(" ").startswith("#")):
+                pending += piece
+                if not pending.endswith("\n"):
+                    continue
+                section = parse_section(pending)
+                if section is not None:
+                    yield section
+                yield {"type": "text", "text": pending}
+                pending = ""
+            else:
+                yield {"type": "text", "text": piece}
+            # 줄 시작에 공백만 온 경우 다음 조각까지 줄 시작으로 취급
+            at_line_start = piece.endswith("\n") or (at_line_start and piece.strip(" ") == "")
+
+    if pending:
+        section = parse_section(pending)
+        if section is not None:
+            yield section
+        yield {"type": "text", "text": pending}
+
+
+class TokenQueueStreamer(BaseStreamer):
+    """generate 스트리머 훅 → 새 토큰 id를 큐로 전달 (첫 put은 프롬프트라 무시)"""
+
+    def __init__(self):
+        self.queue: "queue.Queue[Any]" = queue.Queue()
+        self.start_time: Optional[float] = None
+        self.first_token_time: Optional[float] = None
+        self.generated_tokens = 0
+        self.cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """소비자가 중간에 멈췄을 때 생성 중단 요청 (CancelCriteria가 다음 스텝에서 확인)"""
+        self.cancelled.set()
+
+    def put(self, value: torch.Tensor) -> None:
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+            return
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+        for token_id in value.reshape(-1).tolist():
+            self.generated_tokens += 1
+            self.queue.put(token_id)
+
+    def end(self) -> None:
+        self.queue.put(_END)
+
+    @property
+    def ttft(self) -> float:
+        return self.first_token_time - self.start_time if self.first_token_time else 0.0
+
+    def __iter__(self) -> Iterator[int]:
+        while True:
+            item = self.queue.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+class CancelCriteria(StoppingCriteria):
+    """스트리머가 취소되면 다음 스텝에서 생성 종료"""
+
+    def __init__(self, streamer: TokenQueueStreamer):
+        self.streamer = streamer
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), self.streamer.cancelled.is_set(), dtype=torch.bool,
+                          device=input_ids.device)
+
+
+def stream_generate(model: Any, tokenizer: Any, prompt: str, streamer: Optional[TokenQueueStreamer] = None,
+                    **generate_kwargs) -> Iterator[str]:
+    """model.generate를 백그라운드 스레드로 돌리며 확정된 텍스트 조각을 반환 (배치 1)
+
+    생성 토큰 수/TTFT가 필요하면 streamer를 넘겨 생성 후 확인한다.
+    """
+    streamer = streamer if streamer is not None else TokenQueueStreamer()
+    device = torch.device("cpu") if isinstance(model, RemoteModel) else next(model.parameters()).device
+    inputs = tokenizer(prompt, return_tensors="pt", add_special_tokens=False).to(device)
+    # ChatML 턴 종료(<|im_end|>)에서도 멈춤 (기반 모델 토크나이저의 EOS는 <|endoftext|>)
+    eos = eos_ids(model, tokenizer)
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else eos[0]
+    kwargs = {"max_new_tokens": 512, "pad_token_id": pad_token_id, "eos_token_id": eos}
+    kwargs.update(generate_kwargs)
+
+    if isinstance(model, RemoteModel):
+        # 워커 프로세스로는 스트리머를 넘길 수 없으므로 생성이 끝난 뒤 토큰을 순서대로 재생
+        streamer.put(inputs["input_ids"])
+        output_ids = model.generate(**inputs, **kwargs)
+        streamer.put(output_ids[0, inputs["input_ids"].shape[1]:])
+        streamer.end()
+        yield from iter_text_deltas(tokenizer, streamer)
+        return
+
+    kwargs["stopping_criteria"] = StoppingCriteriaList(list(kwargs.get("stopping_criteria") or []) +
+                                                       [CancelCriteria(streamer)])
+
+    def run():
+        try:
+            with torch.no_grad():
+                model.generate(**inputs, streamer=streamer, **kwargs)
+        except BaseException as e:
+            streamer.queue.put(e)
+            streamer.queue.put(_END)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        yield from iter_text_deltas(tokenizer, streamer)
+    finally:
+        # 소비자가 일찍 멈춰도(클라이언트 연결 끊김) 남은 생성을 기다리지 않도록 먼저 중단 요청
+        streamer.cancel()
+        thread.join()
+
+
+def stream_report(model: Any, tokenizer: Any, messages: List[Dict[str, str]],
+                  **generate_kwargs) -> Iterator[Dict[str, Any]]:
+    """ChatML 메시지로 리포트를 생성하며 text/section 이벤트 반환 (시스템 메시지가 없으면 학습 프롬프트 사용)"""
+    if not messages or messages[0].get("role") != "system":
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}] + list(messages)
+    prompt = render_chatml(messages, add_generation_prompt=True)
+    yield from iter_report_events(stream_generate(model, tokenizer, prompt, **generate_kwargs))
+
+
+async def astream_report(model: Any, tokenizer: Any, messages: List[Dict[str, str]],
+                         **generate_kwargs) -> AsyncIterator[Dict[str, Any]]:
+    """stream_report의 async 버전 (이벤트 루프를 막지 않도록 다음 이벤트를 스레드에서 대기)"""
+    loop = asyncio.get_running_loop()
+    events = stream_report(model, tokenizer, messages, **generate_kwargs)
+    while True:
+        event = await loop.run_in_executor(None, next, events, _END)
+        if event is _END:
+            return
+        yield event
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="Big5 리포트 스트리밍 생성")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float16")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--max-new-tokens", type=int, default=512)
+    parser.add_argument("--answers", default="1. Openness: '새로운 것을 배우는 걸 좋아해요'\n"
+                                              "2. Conscientiousness: '계획을 세우고 지키는 게 중요해요'")
+    args = parser.parse_args()
+
+    device = torch.device(args.device) if args.device else default_device()
+    model, tokenizer, _ = load_model_and_tokenizer(args.model, args.dtype, device)
+
+    start_time = time.perf_counter()
+    first_text_time = None
+    sections = []
+    for event in stream_report(model, tokenizer, [{"role": "user", "content": args.answers}],
+                               max_new_tokens=args.max_new_tokens, do_sample=False):
+        if event["type"] == "section":
+            sections.append(event)
+            continue
+        if first_text_time is None:
+            first_text_time = time.perf_counter()
+        print(event["text"], end="", flush=True)
+
+    print()
+    print("-" * 20)
+    if first_text_time is not None:
+        print(f"⏱️  첫 텍스트까지: {(first_text_time - start_time) * 1000:.0f}ms")
+    print(f"⏱️  전체: {time.perf_counter() - start_time:.2f}초")
+    for section in sections:
+        level = f" → {section['level']}" if section["level"] else ""
+        print(f"📑 {'#' * section['depth']} {section['title']}{level}")
+
+if __name__ == "__main__":
+    main()
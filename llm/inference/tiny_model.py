@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+CPU 테스트용 초소형 Qwen2 모델 생성
+Big5 데이터셋으로 바이트 수준 BPE 토크나이저를 학습하고 (ChatML 특수 토큰 포함)
+같은 아키텍처의 무작위 초기화 Qwen2 모델을 safetensors로 저장
+"""
+
+import argparse
+import glob
+import os
+import sys
+from typing import List, Iterator, Optional
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+sys.path.insert(0, DATA_DIR)
+
+from jsonl_io import iter_jsonl_files
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "tiny-qwen2")
+SPECIAL_TOKENS = ["<|endoftext|>", "<|im_start|>", "<|im_end|>"]
+
+
+def iter_dataset_texts(filenames: List[str]) -> Iterator[str]:
+    """학습 데이터의 모든 메시지 본문"""
+    for item in iter_jsonl_files(filenames):
+        for msg in item["messages"]:
+            yield msg["content"]
+
+
+def train_tiny_tokenizer(filenames: List[str], vocab_size: int = 2000) -> "PreTrainedTokenizerFast":
+    """Qwen과 같은 바이트 수준 BPE + ChatML 특수 토큰 토크나이저 (기반 모델처럼 EOS는 <|endoftext|>)"""
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import PreTrainedTokenizerFast
+
+    backend = Tokenizer(models.BPE())
+    backend.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    backend.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(vocab_size=vocab_size, special_tokens=SPECIAL_TOKENS,
+                                  initial_alphabet=pre_tokenizers.ByteLevel.alphabet())
+    backend.train_from_iterator(iter_dataset_texts(filenames), trainer)
+
+    return PreTrainedTokenizerFast(
+        tokenizer_object=backend,
+        eos_token="<|endoftext|>",
+        pad_token="<|endoftext|>",
+        additional_special_tokens=["<|im_start|>", "<|im_end|>"],
+    )
+
+
+def create_tiny_model(output_dir: str = DEFAULT_OUTPUT_DIR, filenames: Optional[List[str]] = None,
+                      vocab_size: int = 2000, hidden_size: int = 64, num_layers: int = 2,
+                      seed: int = 42) -> str:
+    """토크나이저 + 무작위 초기화 Qwen2 모델을 output_dir에 저장하고 경로 반환"""
+    import torch
+    from transformers import Qwen2Config, Qwen2ForCausalLM
+
+    filenames = filenames or sorted(glob.glob(os.path.join(DATA_DIR, "*.jsonl")))
+    tokenizer = train_tiny_tokenizer(filenames, vocab_size)
+
+    config = Qwen2Config(
+        vocab_size=len(tokenizer),
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 4,
+        num_hidden_layers=num_layers,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=4096,
+        tie_word_embeddings=True,
+        bos_token_id=tokenizer.pad_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+    torch.manual_seed(seed)
+    model = Qwen2ForCausalLM(config)
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer.save_pretrained(output_dir)
+    model.save_pretrained(output_dir, safe_serialization=True)
+    return output_dir
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="CPU 테스트용 초소형 Qwen2 모델 생성")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--vocab-size", type=int, default=2000)
+    parser.add_argument("--hidden-size", type=int, default=64)
+    parser.add_argument("--num-layers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print("🧪 초소형 Qwen2 모델 생성 중...")
+    path = create_tiny_model(args.output_dir, vocab_size=args.vocab_size, hidden_size=args.hidden_size,
+                             num_layers=args.num_layers, seed=args.seed)
+    print(f"✅ 저장 완료: {path}")
+    print(f"💡 사용 예: python ../test/02_qwen_test.py --model {path}")
+
+if __name__ == "__main__":
+    main()
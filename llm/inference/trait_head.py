@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Big5 특성 수준 추출 헤드 (리포트 생성 없이 점수화)
+골든 리포트의 '### 특성 (Trait): 수준' 라벨을 1~10점으로 바꾸고,
+특성별 답변 문장의 Qwen2 은닉 상태 평균(mean pooling)에 릿지 회귀 헤드를 학습
+score(answers)는 답변 5개를 한 배치 forward 한 번으로 점수화 (500+ 토큰 생성 대비 수백 배 빠름)
+점수 척도는 app/services/Big5AnalyzerService.ts의 Big5Scores(1~10)와 같음
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+import numpy as np
+import torch
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+sys.path.insert(0, DATA_DIR)
+
+from big5_labels import BIG5_TRAITS, TRAIT_LEVELS, parse_trait_levels, parse_user_answers
+from heldout import is_heldout, item_key
+from jsonl_io import iter_jsonl
+from benchmark import DEFAULT_OUTPUT_DIR, environment_info, write_results
+from model_loader import DEFAULT_MODEL, DTYPES, default_device, load_model_and_tokenizer
+
+DEFAULT_HEAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "trait_head")
+DEFAULT_ALPHA = 10.0
+DEFAULT_LAYER = -1
+
+# TRAIT_LEVELS → 1~10점 (앱의 getLevelDescription 구간: 8 이상 매우 높음, 6 이상 높음, 4 이상 보통)
+LEVEL_SCORES = {
+    "매우 높음": 9.0,
+    "높음": 7.5,
+    "중간-높음": 6.5,
+    "중간": 5.0,
+    "중간-낮음": 3.5,
+    "낮음": 2.5,
+    "매우 낮음": 1.0,
+}
+
+Answers = Union[str, Dict[str, str]]
+
+
+def score_to_level(score: float) -> str:
+    """가장 가까운 수준"""
+    return min(TRAIT_LEVELS, key=lambda level: abs(LEVEL_SCORES[level] - score))
+
+
+def trait_texts(answers: Answers) -> List[str]:
+    """특성 순서(BIG5_TRAITS)대로 헤드에 넣을 답변 문장
+
+    '1. Openness: '...'' 형식 문자열이면 특성별로 나누고, 나눌 수 없는 특성은 전체 문장을 사용
+    """
+    if isinstance(answers, str):
+        parsed = parse_user_answers(answers)
+        return [parsed.get(trait, answers) for trait in BIG5_TRAITS]
+    return [answers.get(trait, "") or " ".join(answers.values()) for trait in BIG5_TRAITS]
+
+
+def load_labeled_items(filenames: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """(답변, 특성별 점수, held-out 여부) — 사용자 답변 기준 중복 제거, 수준을 읽을 수 없는 특성은 라벨 없음(None)"""
+    filenames = filenames or sorted(glob.glob(os.path.join(DATA_DIR, "*.jsonl")))
+    items: Dict[str, Dict[str, Any]] = {}
+    for filename in filenames:
+        for item in iter_jsonl(filename):
+            messages = item.get("messages") or []
+            if len(messages) != 3:
+                continue
+            key = item_key(item)
+            levels = parse_trait_levels(messages[2]["content"])
+            labels = {trait: LEVEL_SCORES.get(levels.get(trait)) for trait in BIG5_TRAITS}
+            if key in items:
+                # 같은 답변이 여러 파일에 있으면 읽을 수 있는 라벨을 보충
+                for trait, score in labels.items():
+                    if items[key]["labels"][trait] is None:
+                        items[key]["labels"][trait] = score
+                continue
+            items[key] = {"id": key, "answers": messages[1]["content"], "labels": labels, "heldout": is_heldout(item)}
+    return [items[key] for key in sorted(items)]
+
+
+@torch.no_grad()
+def pooled_features(model: Any, tokenizer: Any, texts: List[str], layer: int = DEFAULT_LAYER,
+                    batch_size: int = 32) -> np.ndarray:
+    """텍스트별 은닉 상태 평균 [len(texts), hidden] (패딩 제외)"""
+    device = next(model.parameters()).device
+    features = []
+    for start in range(0, len(texts), batch_size):
+        batch = tokenizer(texts[start:start + batch_size], return_tensors="pt", padding=True,
+                          add_special_tokens=False).to(device)
+        outputs = model.model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"],
+                              output_hidden_states=True)
+        hidden = outputs.hidden_states[layer].float()
+        mask = batch["attention_mask"][..., None].float()
+        features.append(((hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)).cpu().numpy())
+    return np.concatenate(features)
+
+
+class TraitHead:
+    """특성별 릿지 회귀 (공유 표준화 → 특성마다 가중치/절편)"""
+
+    def __init__(self, weight: np.ndarray, bias: np.ndarray, mean: np.ndarray, std: np.ndarray,
+                 meta: Dict[str, Any]):
+        self.weight = weight  # [5, hidden]
+        self.bias = bias      # [5]
+        self.mean = mean
+        self.std = std
+        self.meta = meta
+
+    @classmethod
+    def fit(cls, features: np.ndarray, labels: np.ndarray, alpha: float = DEFAULT_ALPHA,
+            meta: Optional[Dict[str, Any]] = None) -> "TraitHead":
+        """features [items, 5, hidden], labels [items, 5] (NaN = 라벨 없음)"""
+        flat = features.reshape(-1, features.shape[-1])
+        mean, std = flat.mean(axis=0), flat.std(axis=0) + 1e-6
+        weight = np.zeros((len(BIG5_TRAITS), features.shape[-1]), dtype=np.float32)
+        bias = np.full(len(BIG5_TRAITS), LEVEL_SCORES["중간"], dtype=np.float32)
+        counts = {}
+        for t, trait in enumerate(BIG5_TRAITS):
+            rows = ~np.isnan(labels[:, t])
+            counts[trait] = int(rows.sum())
+            if counts[trait] < 2:
+                continue  # 라벨이 모자라면 중간 점수 상수
+            x = (features[rows, t] - mean) / std
+            y = labels[rows, t]
+            bias[t] = y.mean()
+            # 표본 수 ≪ 차원이므로 쌍대형으로 풀기: w = Xᵀ(XXᵀ + αI)⁻¹(y - ȳ)
+            gram = x @ x.T + alpha * np.eye(len(x))
+            weight[t] = x.T @ np.linalg.solve(gram, y - bias[t])
+        return cls(weight, bias, mean, std, dict(meta or {}, alpha=alpha, train_counts=counts))
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """features [items, 5, hidden] → 점수 [items, 5] (1~10으로 자름)"""
+        x = (features - self.mean) / self.std
+        return np.clip(np.einsum("ith,th->it", x, self.weight) + self.bias, 1.0, 10.0)
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        np.savez(os.path.join(path, "head.npz"), weight=self.weight, bias=self.bias, mean=self.mean, std=self.std)
+        with open(os.path.join(path, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+
+    @classmethod
+    def load(cls, path: str) -> "TraitHead":
+        arrays = np.load(os.path.join(path, "head.npz"))
+        with open(os.path.join(path, "meta.json"), encoding='utf-8') as f:
+            meta = json.load(f)
+        return cls(arrays["weight"], arrays["bias"], arrays["mean"], arrays["std"], meta)
+
+
+def head_path(model_name: str, layer: int = DEFAULT_LAYER, head_dir: str = DEFAULT_HEAD_DIR) -> str:
+    return os.path.join(head_dir, f"{os.path.basename(os.path.normpath(model_name))}-L{layer}")
+
+
+class TraitScorer:
+    """모델 + 헤드 → score(answers)"""
+
+    def __init__(self, model: Any, tokenizer: Any, head: TraitHead):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.head = head
+        self.layer = head.meta.get("layer", DEFAULT_LAYER)
+
+    @classmethod
+    def load(cls, model_name: str = DEFAULT_MODEL, dtype: str = "float16", device: Optional[torch.device] = None,
+             path: Optional[str] = None, layer: int = DEFAULT_LAYER) -> "TraitScorer":
+        model, tokenizer, _ = load_model_and_tokenizer(model_name, dtype, device)
+        return cls(model, tokenizer, TraitHead.load(path or head_path(model_name, layer)))
+
+    def score_batch(self, answers_list: List[Answers]) -> List[Dict[str, float]]:
+        texts = [text for answers in answers_list for text in trait_texts(answers)]
+        features = pooled_features(self.model, self.tokenizer, texts, self.layer, batch_size=len(texts))
+        scores = self.head.predict(features.reshape(len(answers_list), len(BIG5_TRAITS), -1))
+        return [{trait: round(float(row[t]), 1) for t, trait in enumerate(BIG5_TRAITS)} for row in scores]
+
+    def score(self, answers: Answers) -> Dict[str, float]:
+        """답변(문자열 또는 특성별 dict) → 특성별 1~10점 (Big5Scores와 같은 키)"""
+        return self.score_batch([answers])[0]
+
+    def levels(self, answers: Answers) -> Dict[str, str]:
+        return {trait: score_to_level(score) for trait, score in self.score(answers).items()}
+
+
+# ---- 학습/평가 ----
+
+def item_features(model: Any, tokenizer: Any, items: List[Dict[str, Any]], layer: int) -> Tuple[np.ndarray, np.ndarray]:
+    """items → (특징 [items, 5, hidden], 라벨 [items, 5] NaN=없음)"""
+    texts = [text for item in items for text in trait_texts(item["answers"])]
+    features = pooled_features(model, tokenizer, texts, layer).reshape(len(items), len(BIG5_TRAITS), -1)
+    labels = np.array([[np.nan if item["labels"][trait] is None else item["labels"][trait] for trait in BIG5_TRAITS]
+                       for item in items], dtype=np.float32)
+    return features, labels
+
+
+def evaluate_head(head: TraitHead, features: np.ndarray, labels: np.ndarray) -> Dict[str, Any]:
+    """라벨 있는 특성만: 평균 절대 오차, 수준 정확/한 단계 이내 비율"""
+    predicted = head.predict(features)
+    rows, cols = np.nonzero(~np.isnan(labels))
+    if not len(rows):
+        return {"labels": 0}
+    errors = np.abs(predicted[rows, cols] - labels[rows, cols])
+    predicted_levels = [TRAIT_LEVELS.index(score_to_level(s)) for s in predicted[rows, cols]]
+    expected_levels = [TRAIT_LEVELS.index(score_to_level(s)) for s in labels[rows, cols]]
+    distance = np.abs(np.array(predicted_levels) - np.array(expected_levels))
+    return {"labels": int(len(rows)), "mae": float(errors.mean()),
+            "level_exact": float(np.mean(distance == 0)), "level_within_one": float(np.mean(distance <= 1))}
+
+
+def train_head(model: Any, tokenizer: Any, model_name: str, layer: int = DEFAULT_LAYER,
+               alpha: float = DEFAULT_ALPHA) -> Tuple[TraitHead, Dict[str, Any]]:
+    """held-out 분할(heldout.is_heldout, 학습 데이터셋·eval_suite와 같은 기준)을 제외하고 학습, held-out으로 평가"""
+    items = load_labeled_items()
+    train = [item for item in items if not item["heldout"]]
+    test = [item for item in items if item["heldout"]]
+
+    start_time = time.time()
+    train_x, train_y = item_features(model, tokenizer, train, layer)
+    head = TraitHead.fit(train_x, train_y, alpha, {"model": model_name, "layer": layer,
+                                                    "level_scores": LEVEL_SCORES})
+    metrics = {"train_items": len(train), "heldout_items": len(test), "train_sec": time.time() - start_time,
+               "train": evaluate_head(head, train_x, train_y)}
+    if test:
+        metrics["heldout"] = evaluate_head(head, *item_features(model, tokenizer, test, layer))
+    return head, metrics
+
+
+def compare_latency(scorer: TraitScorer, answers: str, max_new_tokens: int = 512, trials: int = 3) -> Dict[str, float]:
+    """score() 한 번 vs 리포트 생성(max_new_tokens 고정) 한 번의 지연"""
+    from final_100_datasets import SYSTEM_PROMPT
+    from token_cache import render_chatml
+
+    scorer.score(answers)  # warmup
+    start_time = time.perf_counter()
+    for _ in range(trials):
+        scorer.score(answers)
+    score_sec = (time.perf_counter() - start_time) / trials
+
+    prompt = render_chatml([{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": answers}],
+                           add_generation_prompt=True)
+    inputs = scorer.tokenizer(prompt, return_tensors="pt", add_special_tokens=False).to(scorer.model.device)
+    start_time = time.perf_counter()
+    with torch.no_grad():
+        scorer.model.generate(**inputs, max_new_tokens=max_new_tokens, min_new_tokens=max_new_tokens,
+                              do_sample=False, pad_token_id=scorer.tokenizer.eos_token_id)
+    generate_sec = time.perf_counter() - start_time
+    return {"score_ms": score_sec * 1000, "generate_sec": generate_sec, "speedup": generate_sec / score_sec}
+
+
+def main():
+    """메인 실행 함수"""
+
+    parser = argparse.ArgumentParser(description="Big5 특성 수준 추출 헤드")
+    parser.add_argument("command", choices=["train", "score"])
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float16")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--layer", type=int, default=DEFAULT_LAYER, help="풀링할 은닉 상태 층 (음수는 뒤에서부터)")
+    parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA, help="릿지 정규화 강도")
+    parser.add_argument("--head", default=None, help="헤드 저장 위치 (기본: build/trait_head/<모델>-L<층>)")
+    parser.add_argument("--answers", default="1. Openness: '새로운 것을 배우는 걸 좋아해요'\n"
+                                              "2. Conscientiousness: '계획을 세우고 지키는 게 중요해요'\n"
+                                              "3. Extraversion: '혼자 있는 시간이 편해요'\n"
+                                              "4. Agreeableness: '다른 사람을 돕는 게 즐거워요'\n"
+                                              "5. Neuroticism: '걱정이 많은 편이에요'")
+    parser.add_argument("--compare-generate", type=int, default=0, metavar="TOKENS",
+                        help="score: 같은 답변으로 TOKENS개 리포트 생성 지연과 비교")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    device = torch.device(args.device) if args.device else default_device()
+    path = args.head or head_path(args.model, args.layer)
+
+    if args.command == "train":
+        model, tokenizer, _ = load_model_and_tokenizer(args.model, args.dtype, device)
+        print(f"🚀 특성 헤드 학습 시작... ({args.model}, 층 {args.layer}, alpha {args.alpha})")
+        head, metrics = train_head(model, tokenizer, args.model, args.layer, args.alpha)
+        head.save(path)
+        print(f"📚 학습 {metrics['train_items']}개 (특성별 라벨 {head.meta['train_counts']}), "
+              f"{metrics['train_sec']:.1f}초")
+        for split in ("train", "heldout"):
+            result = metrics.get(split)
+            if result and result["labels"]:
+                print(f"  {split:<8} 라벨 {result['labels']:4d}개  MAE {result['mae']:.2f}  "
+                      f"수준 정확 {result['level_exact']:.1%}  한 단계 이내 {result['level_within_one']:.1%}")
+        print(f"📁 {path}")
+        return
+
+    scorer = TraitScorer.load(args.model, args.dtype, device, path)
+    scores = scorer.score(args.answers)
+    for trait, score in scores.items():
+        print(f"  {trait:<18} {score:4.1f}점  {score_to_level(score)}")
+    if args.compare_generate:
+        result = compare_latency(scorer, args.answers, args.compare_generate)
+        print(f"⚡ score {result['score_ms']:.1f}ms vs 리포트 생성 {result['generate_sec']:.2f}초 (x{result['speedup']:.0f})")
+        environment = environment_info(args.model, args.dtype, device)
+        paths = write_results([dict(result, generate_tokens=args.compare_generate, **scores)], environment,
+                              args.output_dir, "trait_head")
+        print(f"📁 결과: {paths['json']}")
+
+if __name__ == "__main__":
+    main()
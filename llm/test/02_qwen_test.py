@@ -4,48 +4,59 @@ Qwen2-1.5B 모델 기본 테스트
 모델 로딩 및 간단한 추론 테스트
 """
 
+import argparse
+import os
+import sys
 import torch
 import time
-from transformers import AutoTokenizer, AutoModelForCausalLM
 
-def test_qwen_model():
-    """Qwen2-1.5B 모델 테스트"""
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "inference"))
+
+from model_loader import DEFAULT_MODEL, DTYPES, attach, default_device, load_model_and_tokenizer, load_tokenizer, print_load_report
+from quantization import load_quantized_model, weight_bytes
+from streaming import TokenQueueStreamer, iter_report_events, stream_generate
+
+def test_qwen_model(model_name=DEFAULT_MODEL, dtype="float16", use_worker=False, quantize="none"):
+    """Qwen2-1.5B 모델 테스트 (상주 로더 사용, 콜드/웜 로드 시간 분리 측정, 선택적으로 CPU 양자화)"""
 
     print("📦 Qwen2-1.5B 모델 테스트")
     print("=" * 50)
 
     # 장치 설정
-    device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+    device = default_device()
     print(f"🔥 사용 장치: {device}")
 
     try:
         # 모델 정보
-        model_name = "Qwen/Qwen2-1.5B"
         print(f"📋 모델: {model_name}")
 
-        # 토크나이저 로드
-        print("\n🔤 토크나이저 로딩 중...")
-        start_time = time.time()
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        tokenizer_load_time = time.time() - start_time
-        print(f"✅ 토크나이저 로딩 완료: {tokenizer_load_time:.2f}초")
-
-        # 모델 로드
-        print("\n🤖 모델 로딩 중...")
-        start_time = time.time()
-
-        model = AutoModelForCausalLM.from_pretrained(
-            model_name,
-            torch_dtype=torch.float16,
-            device_map="auto",
-            trust_remote_code=True
-        )
-
-        model_load_time = time.time() - start_time
-        print(f"✅ 모델 로딩 완료: {model_load_time:.2f}초")
+        if use_worker:
+            # 상주 워커에 연결 (python ../inference/model_loader.py serve --model ...)
+            print("\n🔌 상주 워커 연결 중...")
+            start_time = time.time()
+            model = attach()
+            if model is None:
+                print("❌ 상주 워커를 찾을 수 없습니다. 먼저 model_loader.py serve를 실행하세요.")
+                return None, None, device
+            tokenizer, timings = load_tokenizer(model_name)
+            print(f"✅ 워커 연결 완료: {time.time() - start_time:.2f}초 (워커 로드 시간: {model.info()['timings']['model_sec']:.2f}초)")
+            print_load_report(timings)
+            # 입력/출력 텐서는 CPU에서 주고받음
+            device = torch.device("cpu")
+        else:
+            print("\n🤖 모델/토크나이저 로딩 중...")
+            if quantize != "none":
+                # int8/int4 커널은 CPU fp32 기준 (상주 캐시가 아닌 새 fp32 사본을 변환)
+                device = torch.device("cpu")
+                model, tokenizer, timings = load_quantized_model(model_name, quantize)
+                print_load_report(timings)
+                print(f"🗜️  {quantize} 양자화 완료: {timings['quantize_sec']:.2f}초 (가중치 {weight_bytes(model) / 1024**2:.1f}MB)")
+            else:
+                model, tokenizer, timings = load_model_and_tokenizer(model_name, dtype, device)
+                print_load_report(timings)
 
         # 모델 정보
-        total_params = sum(p.numel() for p in model.parameters())
+        total_params = model.num_parameters()
         print(f"📊 총 파라미터 수: {total_params:,}")
 
         return model, tokenizer, device
@@ -90,11 +101,8 @@ def test_basic_inference(model, tokenizer, device):
 
             inference_time = time.time() - start_time
 
-            # 결과 디코딩
-            response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-
-            # 생성된 텍스트만 추출
-            generated_text = response[len(prompt):].strip()
+            # 생성된 토큰만 디코딩
+            generated_text = tokenizer.decode(outputs[0, inputs["input_ids"].size(1):], skip_special_tokens=True).strip()
 
             print(f"⏱️  추론 시간: {inference_time:.2f}초")
             print(f"📄 생성 결과: {generated_text[:100]}...")
@@ -121,46 +129,37 @@ def test_big5_scenario(model, tokenizer, device):
     print(f"📏 프롬프트 길이: {len(big5_prompt)}자")
 
     try:
-        # 입력 토큰화
-        inputs = tokenizer(big5_prompt, return_tensors="pt").to(device)
-
         # 입력 토큰 수 확인
-        input_tokens = inputs["input_ids"].size(1)
+        input_tokens = len(tokenizer(big5_prompt)["input_ids"])
         print(f"🔤 입력 토큰 수: {input_tokens}")
 
-        # 추론 실행
+        # 스트리밍 추론 실행 (확정된 텍스트 조각을 도착하는 대로 출력)
+        print(f"\n📄 생성된 리포트:")
+        print("-" * 20)
         start_time = time.time()
-
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=150,  # 더 긴 응답
-                do_sample=True,
-                temperature=0.7,
-                pad_token_id=tokenizer.eos_token_id
-            )
+        streamer = TokenQueueStreamer()
+        parts = []
+        for event in iter_report_events(stream_generate(model, tokenizer, big5_prompt, streamer=streamer,
+                                                        max_new_tokens=150, do_sample=True, temperature=0.7)):
+            if event["type"] == "section":
+                continue
+            parts.append(event["text"])
+            print(event["text"], end="", flush=True)
+        print()
+        print("-" * 20)
 
         if device.type == "mps":
             torch.mps.synchronize()
 
         inference_time = time.time() - start_time
+        generated_text = "".join(parts).strip()
+        generated_tokens = streamer.generated_tokens
 
-        # 결과 디코딩
-        response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-
-        # 생성된 텍스트 추출
-        generated_text = response[len(big5_prompt):].strip()
-        generated_tokens = len(tokenizer.encode(generated_text))
-
+        print(f"⏱️  첫 토큰까지: {streamer.ttft * 1000:.0f}ms")
         print(f"⏱️  추론 시간: {inference_time:.2f}초")
         print(f"🔤 생성 토큰 수: {generated_tokens}")
         print(f"⚡ 토큰/초: {generated_tokens/inference_time:.1f}")
 
-        print(f"\n📄 생성된 리포트:")
-        print("-" * 20)
-        print(generated_text)
-        print("-" * 20)
-
         # 간단한 페르소나 검증
         forbidden_patterns = ["진단", "입니다", "확실합니다", "분명합니다"]
         persona_score = 1.0
@@ -171,6 +170,7 @@ def test_big5_scenario(model, tokenizer, device):
                 print(f"⚠️  금지 표현 발견: '{pattern}'")
 
         print(f"🎭 페르소나 점수: {persona_score:.1f}/1.0")
+        print("💡 배치/프롬프트 길이별 TTFT·토큰 간 지연 측정: python ../inference/benchmark.py")
 
         return True
 
@@ -207,11 +207,20 @@ def test_memory_usage():
 def main():
     """메인 테스트 함수"""
 
+    parser = argparse.ArgumentParser(description="Qwen2-1.5B 모델 테스트")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="모델 이름 또는 로컬 경로 (CPU 테스트: ../inference/build/tiny-qwen2)")
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float16")
+    parser.add_argument("--worker", action="store_true", help="상주 워커 프로세스의 모델 사용")
+    parser.add_argument("--quantize", choices=["none", "int8", "int4"], default="none", help="CPU 양자화 추론 경로")
+    args = parser.parse_args()
+    if args.worker and args.quantize != "none":
+        parser.error("--quantize는 로컬 로드에만 적용됩니다 (상주 워커 모델은 양자화하지 않음)")
+
     print("🚀 Qwen2-1.5B 모델 테스트 시작...")
     print()
 
     # 모델 테스트
-    model, tokenizer, device = test_qwen_model()
+    model, tokenizer, device = test_qwen_model(args.model, args.dtype, args.worker, args.quantize)
 
     if model is None or tokenizer is None:
         print("\n❌ 모델 로딩 실패. 테스트를 중단합니다.")
@@ -4,10 +4,14 @@ Big5 데이터셋 생성
 Big5 심리 분석을 위한 학습 데이터셋 생성
 """
 
-import json
+import os
+import sys
 import datetime
 from typing import List, Dict, Any
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
+from jsonl_io import write_jsonl
+
 class Big5DatasetCreator:
     """Big5 데이터셋 생성기"""
 
@@ -209,9 +213,7 @@ class Big5DatasetCreator:
 
     def save_dataset(self, dataset: List[Dict[str, Any]], filename: str) -> None:
         """데이터셋 저장"""
-        with open(filename, 'w', encoding='utf-8') as f:
-            for item in dataset:
-                f.write(json.dumps(item, ensure_ascii=False) + '\n')
+        write_jsonl(filename, dataset)
 
     def create_initial_dataset(self) -> str:
         """초기 데이터셋 생성"""
@@ -4,9 +4,13 @@
 이직 준비, 육아 병행, 창업, 은퇴 등 현실적인 상황 기반
 """
 
-import json
+import os
+import sys
 import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
+from jsonl_io import DatasetStats, iter_jsonl, write_jsonl, save_with_stats
 
 class RealLifeDatasetCreator:
     """실제 시나리오 기반 데이터셋 생성기"""
@@ -344,31 +348,23 @@ class RealLifeDatasetCreator:
 
     def save_dataset(self, dataset: List[Dict[str, Any]], filename: str) -> None:
         """데이터셋 저장"""
-        with open(filename, 'w', encoding='utf-8') as f:
-            for item in dataset:
-                f.write(json.dumps(item, ensure_ascii=False) + '\n')
-
-    def extend_existing_dataset(self, existing_file: str, new_scenarios: List[Dict[str, Any]]) -> str:
-        """기존 데이터셋에 새로운 시나리오 추가"""
+        write_jsonl(filename, dataset)
 
-        # 기존 데이터셋 읽기
-        existing_dataset = []
-        with open(existing_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    existing_dataset.append(json.loads(line))
+    def extend_existing_dataset(self, existing_file: str, new_scenarios: List[Dict[str, Any]]) -> Tuple[str, DatasetStats]:
+        """기존 데이터셋에 새로운 시나리오 추가 (저장과 통계를 한 번에 처리)"""
 
-        # 새로운 데이터 추가
-        for scenario in new_scenarios:
-            item = self.create_dataset_item(scenario["user_answers"], scenario["golden_report"])
-            existing_dataset.append(item)
+        def iter_extended() -> Iterator[Dict[str, Any]]:
+            # 기존 데이터셋을 스트리밍한 뒤 새로운 데이터 추가
+            yield from iter_jsonl(existing_file)
+            for scenario in new_scenarios:
+                yield self.create_dataset_item(scenario["user_answers"], scenario["golden_report"])
 
         # 업데이트된 데이터셋 저장
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         new_filename = f"big5_dataset_extended_{timestamp}.jsonl"
-        self.save_dataset(existing_dataset, new_filename)
+        stats = save_with_stats(new_filename, iter_extended())
 
-        return new_filename
+        return new_filename, stats
 
     def create_extended_dataset(self) -> str:
         """확장된 실제 시나리오 데이터셋 생성"""
@@ -410,27 +406,13 @@ class RealLifeDatasetCreator:
         scenarios = self.create_real_life_scenarios()
 
         # 기존 데이터셋에 추가
-        new_filename = self.extend_existing_dataset(target_file, scenarios)
+        new_filename, stats = self.extend_existing_dataset(target_file, scenarios)
 
         print(f"✅ 확장된 데이터셋 저장 완료: {new_filename}")
 
         # 데이터셋 통계
-        with open(new_filename, 'r', encoding='utf-8') as f:
-            total_items = sum(1 for line in f if line.strip())
-
-        # 평균 길이 계산을 위해 다시 읽어서 통계
-        total_chars = 0
-        with open(new_filename, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    item = json.loads(line)
-                    total_chars += len(item["messages"][2]["content"])
-
-        avg_chars = total_chars / total_items
-
-        print(f"📊 확장된 데이터셋 크기: {total_items}개 항목 (기존 5개 + 신규 8개)")
-        print(f"📏 평균 리포트 길이: {avg_chars:.0f}자")
-        print(f"📝 전체 텍스트 크기: {total_chars:,}자")
+        print(f"📊 확장된 데이터셋 크기: {stats.total_items}개 항목 (기존 5개 + 신규 8개)")
+        stats.print_summary()
 
         return new_filename
 
@@ -469,5 +451,4 @@ def main():
     print("\n" + "=" * 60)
 
 if __name__ == "__main__":
-    import os  # os 모듈 추가
     main()
\ No newline at end of file
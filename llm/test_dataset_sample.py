@@ -4,7 +4,11 @@
 빠른 파인튜닝 테스트 및 성능 벤치마킹용
 """
 
-import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+from jsonl_io import save_with_stats
 
 def create_test_dataset():
     """테스트용 10개 샘플 데이터셋 생성"""
@@ -77,19 +81,14 @@ def create_test_dataset():
                     ]
 
     # 테스트 데이터셋 저장
-    with open('/Volumes/eungu/projects/haru-on/llm/data/big5_test_10.jsonl', 'w', encoding='utf-8') as f:
-        for sample in test_samples:
-            f.write(json.dumps(sample, ensure_ascii=False) + '\n')
+    stats = save_with_stats('/Volumes/eungu/projects/haru-on/llm/data/big5_test_10.jsonl', test_samples)
 
     print("✅ 테스트용 10개 Big5 데이터셋 생성 완료")
     print(f"📁 저장 위치: /Volumes/eungu/projects/haru-on/llm/data/big5_test_10.jsonl")
-    print(f"📊 샘플 수: {len(test_samples)}개")
+    print(f"📊 샘플 수: {stats.total_items}개")
 
     # 데이터셋 정보 출력
-    total_chars = sum(len(sample["messages"][2]["content"]) for sample in test_samples)
-    avg_chars = total_chars / len(test_samples)
-    print(f"📏 평균 리포트 길이: {avg_chars:.0f}자")
-    print(f"📝 전체 텍스트 크기: {total_chars:,}자")
+    stats.print_summary()
 
 if __name__ == "__main__":
     create_test_dataset()
\ No newline at end of file